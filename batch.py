@@ -0,0 +1,148 @@
+__author__ = "Ellen Whalen"
+"""Scoring many positions at once with NumPy, for offline training and analysis. Positions are an (N, 8, 8) int8
+array holding X_PIECE, O_PIECE or EMPTY on each square, laid out like Board.grid. Every function here gives exactly
+what the matching Board, Game or engine code gives for each position. NumPy is only needed by this module."""
+
+import numpy as np
+from board import Board, DIM
+from engine import opponent_of
+
+EMPTY = 0
+X_PIECE = 1
+O_PIECE = -1
+PIECES = {"X": X_PIECE, "O": O_PIECE}
+
+# Bit i of a bitboard is square i, i.e. grid[i // DIM][i % DIM].
+_SQUARE_BITS = np.arange(DIM * DIM, dtype=np.uint64)
+_ROWS = np.arange(DIM).reshape(DIM, 1)
+_COLS = np.arange(DIM).reshape(1, DIM)
+
+
+def from_states(states: list[tuple]) -> np.ndarray:
+    """Turns Board.state() tuples into an (N, 8, 8) array of positions."""
+    x_bits = np.array([state[0] for state in states], dtype=np.uint64).reshape(-1, 1)
+    o_bits = np.array([state[1] for state in states], dtype=np.uint64).reshape(-1, 1)
+    x_pieces = (x_bits >> _SQUARE_BITS & 1).astype(np.int8)
+    o_pieces = (o_bits >> _SQUARE_BITS & 1).astype(np.int8)
+    return (x_pieces * X_PIECE + o_pieces * O_PIECE).reshape(-1, DIM, DIM)
+
+
+def from_boards(boards: list[Board]) -> np.ndarray:
+    """Turns boards into an (N, 8, 8) array of positions."""
+    return from_states([board.state() for board in boards])
+
+
+def to_states(positions: np.ndarray, turn: str = "X") -> list[tuple]:
+    """Turns an (N, 8, 8) array of positions back into Board.state() tuples, all with the same color to move."""
+    weights = (np.uint64(1) << _SQUARE_BITS).reshape(DIM, DIM)
+    x_bits = np.where(positions == X_PIECE, weights, np.uint64(0)).reshape(len(positions), -1).sum(axis=1)
+    o_bits = np.where(positions == O_PIECE, weights, np.uint64(0)).reshape(len(positions), -1).sum(axis=1)
+    return [(int(x), int(o), turn) for x, o in zip(x_bits, o_bits)]
+
+
+def piece_counts(positions: np.ndarray, color: str) -> np.ndarray:
+    """How many pieces of a color each position has, like Board.count_total."""
+    return (positions == PIECES[color]).sum(axis=(1, 2))
+
+
+def line_counts(positions: np.ndarray) -> dict:
+    """The number of pieces of either color on every row, column and diagonal of every position. "neg_diag" is
+    indexed by col - row + DIM - 1 and "pos_diag" by row + col, so each diagonal is numbered like its squares."""
+    occupied = (positions != EMPTY).astype(np.int16)
+    count = len(positions)
+    neg_diag = np.zeros((count, 2 * DIM - 1), dtype=np.int16)
+    pos_diag = np.zeros((count, 2 * DIM - 1), dtype=np.int16)
+    for offset in range(1 - DIM, DIM):
+        neg_diag[:, offset + DIM - 1] = np.trace(occupied, offset, axis1=1, axis2=2)
+        # Flipping the columns turns each row + col diagonal into a col - row one.
+        pos_diag[:, DIM - 1 - offset] = np.trace(occupied[:, :, ::-1], offset, axis1=1, axis2=2)
+    return {"row": occupied.sum(axis=2),
+            "col": occupied.sum(axis=1),
+            "neg_diag": neg_diag,
+            "pos_diag": pos_diag}
+
+
+def square_line_counts(positions: np.ndarray) -> dict:
+    """For every square of every position, the counts Board.count_pieces gives for a piece there: (N, 8, 8) arrays
+    under the same keys. They are only meaningful on squares with a piece on them."""
+    lines = line_counts(positions)
+    shape = positions.shape
+    return {"row_count": np.broadcast_to(lines["row"][:, :, None], shape),
+            "col_count": np.broadcast_to(lines["col"][:, None, :], shape),
+            "neg_diag_count": lines["neg_diag"][:, _COLS - _ROWS + DIM - 1],
+            "pos_diag_count": lines["pos_diag"][:, _ROWS + _COLS]}
+
+
+def _grow(pieces: np.ndarray) -> np.ndarray:
+    """Grows (N, 8, 8) boolean arrays by one square in all eight directions, like one step of Board's flood fill."""
+    padded = np.pad(pieces, ((0, 0), (1, 1), (1, 1)))
+    grown = np.zeros_like(pieces)
+    for row_offset in range(3):
+        for col_offset in range(3):
+            grown |= padded[:, row_offset:row_offset + DIM, col_offset:col_offset + DIM]
+    return grown
+
+
+def is_connected(positions: np.ndarray, color: str) -> np.ndarray:
+    """Whether all of a color's pieces form one group in each position, like Board.is_connected: a flood fill from
+    each position's first piece, run on every position at once until none of them grows."""
+    pieces = positions == PIECES[color]
+    flat = pieces.reshape(len(positions), -1)
+    has_pieces = flat.any(axis=1)
+    group = np.zeros_like(flat)
+    group[np.arange(len(positions)), flat.argmax(axis=1)] = True
+    group &= flat
+    group = group.reshape(pieces.shape)
+    while True:
+        grown = _grow(group) & pieces
+        if np.array_equal(grown, group):
+            break
+        group = grown
+    return has_pieces & (group == pieces).all(axis=(1, 2))
+
+
+def check_board(positions: np.ndarray) -> dict:
+    """Whether there is a win for black and/or white in each position, like Game.check_board."""
+    return {"x_win": is_connected(positions, "X"),
+            "o_win": is_connected(positions, "O")}
+
+
+def shape(positions: np.ndarray, color: str) -> np.ndarray:
+    """An (N, 4) array of what Board.shape gives for a color: four times its Euler number (from its 2x2 quad counts),
+    and the totals of its pieces' rows, columns and squared rows plus columns."""
+    pieces = (positions == PIECES[color]).astype(np.int64)
+    padded = np.pad(pieces, ((0, 0), (1, 1), (1, 1)))
+    top_left = padded[:, :-1, :-1]
+    top_right = padded[:, :-1, 1:]
+    bottom_left = padded[:, 1:, :-1]
+    bottom_right = padded[:, 1:, 1:]
+    quad = top_left + top_right + bottom_left + bottom_right
+    diagonal = (quad == 2) & (top_left == bottom_right)
+    euler = (quad == 1).sum(axis=(1, 2)) - (quad == 3).sum(axis=(1, 2)) - 2 * diagonal.sum(axis=(1, 2))
+    return np.stack([euler,
+                     (pieces * _ROWS).sum(axis=(1, 2)),
+                     (pieces * _COLS).sum(axis=(1, 2)),
+                     (pieces * (_ROWS * _ROWS + _COLS * _COLS)).sum(axis=(1, 2))], axis=1)
+
+
+def euler_number(positions: np.ndarray, color: str) -> np.ndarray:
+    return shape(positions, color)[:, 0] // 4
+
+
+def disconnection(positions: np.ndarray, color: str) -> np.ndarray:
+    """engine.disconnection for every position."""
+    count = piece_counts(positions, color).astype(np.int64)
+    totals = shape(positions, color)
+    euler, row_total, col_total, square_total = totals.T
+    groups = np.maximum(euler // 4, 1) - 1
+    moment = count * square_total - row_total * row_total - col_total * col_total
+    off_centre = (2 * row_total - (DIM - 1) * count) ** 2 + (2 * col_total - (DIM - 1) * count) ** 2
+    # Positions without pieces score 0; dividing by a count of 1 there keeps NumPy from warning.
+    safe_count = np.maximum(count, 1)
+    scores = 40 * groups + 10 * moment // safe_count + off_centre // (2 * safe_count * safe_count)
+    return np.where(count == 0, 0, scores)
+
+
+def evaluate(positions: np.ndarray, color: str) -> np.ndarray:
+    """engine.evaluate for every position."""
+    return disconnection(positions, opponent_of(color)) - disconnection(positions, color)
@@ -0,0 +1,391 @@
+__author__ = "Ellen Whalen"
+"""Benchmarks for the hot paths of the game."""
+
+import argparse
+import json
+import pickle
+import platform
+import random
+import statistics
+import sys
+import time
+from board import Board, DIM, decode_move
+from box import Box
+from engine import evaluate, evaluate_spread
+from game import Game
+from perft import perft
+from tables import Tables
+
+
+def time_per_call(function, calls: int) -> float:
+    """Calls function some number of times and returns the average time per call in seconds."""
+    start = time.perf_counter()
+    for i in range(calls):
+        function()
+    return (time.perf_counter() - start) / calls
+
+
+def benchmark(function, rounds: int = 20, iterations: int = 100) -> dict:
+    """Times function like pytest-benchmark does: `rounds` separate timings of `iterations` calls each, reported as
+    per-call statistics in microseconds."""
+    function()
+    times = []
+    for i in range(rounds):
+        start = time.perf_counter()
+        for j in range(iterations):
+            function()
+        times.append((time.perf_counter() - start) / iterations * 1e6)
+    mean = statistics.fmean(times)
+    return {"min_us": min(times),
+            "max_us": max(times),
+            "mean_us": mean,
+            "median_us": statistics.median(times),
+            "stddev_us": statistics.stdev(times) if rounds > 1 else 0.0,
+            "rounds": rounds,
+            "iterations": iterations,
+            "ops": 1e6 / mean}
+
+
+def random_positions(count: int, seed: int = 0, max_moves: int = 60, size: int = DIM) -> list[tuple]:
+    """Plays random games on a board of some size and returns positions from along the way, as Board.state()
+    tuples."""
+    generator = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        board = Board(size=size)
+        color = "X"
+        for i in range(generator.randrange(max_moves)):
+            moves = board.generate_moves(color)
+            if not moves:
+                break
+            board.make_move(generator.choice(moves))
+            color = "O" if color == "X" else "X"
+        positions.append(board.state())
+    return positions
+
+
+def dfs_connected(board: Board, color: str) -> bool:
+    """The connectivity check LinesOfAction.check_board used to do: count the pieces, find the first one, then run
+    a recursive dfs with a visited list and a Box per square. Kept as the baseline to compare against."""
+    count = board.count_total(color)
+    vertex = None
+    for i in range(DIM):
+        for j in range(DIM):
+            if vertex is None and board.grid[i][j] == color:
+                vertex = (i, j)
+    if vertex is None:
+        return False
+    visited = []
+
+    def dfs(vertex: tuple):
+        if vertex not in visited:
+            visited.append(vertex)
+            box = Box(vertex[0], vertex[1], DIM)
+            for i in box.row_range():
+                for j in box.col_range():
+                    if board.grid[i][j] == color:
+                        dfs((i, j))
+
+    dfs(vertex)
+    return len(visited) == count
+
+
+def table_dfs_connected(game: Game, color: str) -> bool:
+    """The same check with Game.dfs, which walks the neighbour table (see tables) instead of building a Box."""
+    vertex = game.simple_search(color)
+    if vertex is None:
+        return False
+    visited = []
+    game.dfs(vertex, visited)
+    return len(visited) == game.board.count_total(color)
+
+
+def deep_size(obj, seen: set = None) -> int:
+    """The memory an object takes up, counting everything it holds (through lists, tuples, dicts and slots) once.
+    Objects every board shares, like small ints, None, the one-letter piece strings and the board's Tables, aren't
+    counted."""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or obj is None or isinstance(obj, (bool, type, Tables)) \
+            or (isinstance(obj, int) and -5 <= obj <= 256) or (isinstance(obj, str) and obj in ("", "X", "O")):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_size(item, seen) for item in obj)
+    if hasattr(obj, "__dict__"):
+        size += deep_size(obj.__dict__, seen)
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            if hasattr(obj, name):
+                size += deep_size(getattr(obj, name), seen)
+    return size
+
+
+def bench_memory() -> dict:
+    """Measures one board in memory and pickled: the original layout (64 strings in nested lists), today's Board,
+    the same board once its grid view has been made, and its compact to_bytes() and to_fen() forms."""
+    grid = [[""] * DIM for i in range(DIM)]
+    for i in range(1, DIM - 1):
+        grid[0][i] = grid[DIM - 1][i] = "X"
+        grid[i][0] = grid[i][DIM - 1] = "O"
+    board = Board()
+    sizes = {"list_of_lists_bytes": deep_size(grid),
+             "list_of_lists_pickle": len(pickle.dumps(grid)),
+             "board_bytes": deep_size(board),
+             "board_pickle": len(pickle.dumps(board)),
+             "to_bytes": len(board.to_bytes()),
+             "to_fen": len(board.to_fen())}
+    board.grid
+    sizes["board_with_grid_bytes"] = deep_size(board)
+    sizes["copy_us"] = time_per_call(board.copy, 10000) * 1e6
+    sizes["from_bytes_us"] = time_per_call(lambda: Board.from_bytes(board.to_bytes()), 2000) * 1e6
+    return sizes
+
+
+def bench_terminal(positions: list[tuple]) -> dict:
+    """Times the win check for both colors on every position with the bitboard flood fill, with the old dfs, and
+    with the dfs over the neighbour table, after checking that they all agree."""
+    boards = [Board.from_state(state) for state in positions]
+    games = [Game(board) for board in boards]
+    for game in games:
+        for color in ("X", "O"):
+            connected = game.board.is_connected(color)
+            if connected != dfs_connected(game.board, color) or connected != table_dfs_connected(game, color):
+                raise AssertionError("The flood fill and dfs disagree on " + repr(game.board.state()))
+
+    def flood_fill():
+        for board in boards:
+            board.is_connected("X")
+            board.is_connected("O")
+
+    def dfs():
+        for board in boards:
+            dfs_connected(board, "X")
+            dfs_connected(board, "O")
+
+    def table_dfs():
+        for game in games:
+            table_dfs_connected(game, "X")
+            table_dfs_connected(game, "O")
+
+    flood_fill_seconds = time_per_call(flood_fill, 5) / len(boards)
+    dfs_seconds = time_per_call(dfs, 5) / len(boards)
+    table_dfs_seconds = time_per_call(table_dfs, 5) / len(boards)
+    return {"positions": len(boards),
+            "flood_fill_us": flood_fill_seconds * 1e6,
+            "dfs_us": dfs_seconds * 1e6,
+            "table_dfs_us": table_dfs_seconds * 1e6,
+            "speedup": dfs_seconds / flood_fill_seconds}
+
+
+def run_suite(positions: list[tuple], rounds: int = 20) -> dict:
+    """Times the hot paths over a set of positions. Each benchmark's time is for one call on one position."""
+    boards = [Board.from_state(state) for state in positions]
+    games = [Game(Board.from_state(state)) for state in positions]
+    pieces = []
+    moves = []
+    quiet_moves = []
+    for board in boards:
+        for square in range(DIM * DIM):
+            if (board.x_bits | board.o_bits) >> square & 1:
+                pieces.append((board, square // DIM, square % DIM))
+        move_list = board.generate_moves(board.turn)
+        if move_list:
+            moves.append((board, move_list[len(move_list) // 2]))
+        # move_piece can't put back a captured piece, so it's timed on moves to empty squares. The move back is made
+        # by the side that isn't on move, so it doesn't hand the turn back; it's timed on a copy so that the boards
+        # the other benchmarks use keep their turn.
+        for move in move_list:
+            (row, col), (new_row, new_col) = decode_move(move)
+            if board.grid[new_row][new_col] == "":
+                quiet_moves.append((board.copy(), row, col, new_row, new_col))
+                break
+
+    def find_moves():
+        for board, row, col in pieces:
+            board.find_moves(row, col)
+
+    def count_pieces():
+        for board, row, col in pieces:
+            board.count_pieces(row, col)
+
+    def generate_moves():
+        for board in boards:
+            board.generate_moves(board.turn)
+
+    def move_piece():
+        # Moving the piece there and back (and counting that as two calls) keeps the pieces where they were.
+        for board, row, col, new_row, new_col in quiet_moves:
+            board.move_piece(row, col, new_row, new_col)
+            board.move_piece(new_row, new_col, row, col)
+
+    def make_unmake():
+        for board, move in moves:
+            board.make_move(move)
+            board.unmake_move()
+
+    def check_board():
+        for game in games:
+            game.check_board()
+
+    def evaluate_shape():
+        for board in boards:
+            evaluate(board, board.turn)
+
+    def evaluate_pieces():
+        for board in boards:
+            evaluate_spread(board, board.turn)
+
+    results = {}
+    for name, function, count in (("find_moves", find_moves, len(pieces)),
+                                  ("count_pieces", count_pieces, len(pieces)),
+                                  ("generate_moves", generate_moves, len(boards)),
+                                  ("move_piece", move_piece, 2 * len(quiet_moves)),
+                                  ("make_unmake", make_unmake, len(moves)),
+                                  ("check_board", check_board, len(games)),
+                                  ("evaluate", evaluate_shape, len(boards)),
+                                  ("evaluate_spread", evaluate_pieces, len(boards))):
+        stats = benchmark(function, rounds, 1)
+        for stat in ("min_us", "max_us", "mean_us", "median_us", "stddev_us"):
+            stats[stat] /= count
+        stats["ops"] *= count
+        stats["calls_per_round"] = count
+        results[name] = stats
+    start = time.perf_counter()
+    leaves = perft(Board(), "X", 3)
+    seconds = time.perf_counter() - start
+    results["perft_3"] = {"leaves": leaves, "seconds": seconds, "ops": leaves / seconds}
+    return results
+
+
+def bench_sizes(sizes: list[int], count: int = 200, seed: int = 0, rounds: int = 5) -> dict:
+    """Times the hot paths on random positions for each board size, to show how their cost grows with the board.
+    Building a size's tables is timed too, since that's paid once per size per process."""
+    results = {}
+    for size in sizes:
+        start = time.perf_counter()
+        Tables(size)
+        tables_seconds = time.perf_counter() - start
+        boards = [Board.from_state(state, size=size) for state in random_positions(count, seed, 6 * size, size)]
+        moves = []
+        for board in boards:
+            move_list = board.generate_moves(board.turn)
+            if move_list:
+                moves.append((board, move_list[len(move_list) // 2]))
+
+        def generate_moves():
+            for board in boards:
+                board.generate_moves(board.turn)
+
+        def make_unmake():
+            for board, move in moves:
+                board.make_move(move)
+                board.unmake_move()
+
+        def is_connected():
+            for board in boards:
+                board.is_connected("X")
+                board.is_connected("O")
+
+        def evaluate_shape():
+            for board in boards:
+                evaluate(board, board.turn)
+
+        result = {"squares": size * size,
+                  "pieces": 4 * (size - 2),
+                  "tables_ms": tables_seconds * 1e3}
+        for name, function, calls in (("generate_moves", generate_moves, len(boards)),
+                                      ("make_unmake", make_unmake, len(moves)),
+                                      ("is_connected", is_connected, len(boards)),
+                                      ("evaluate", evaluate_shape, len(boards))):
+            result[name + "_us"] = benchmark(function, rounds, 1)["median_us"] / calls
+        start = time.perf_counter()
+        leaves = perft(Board(size=size), "X", 2)
+        result["perft_2_leaves_per_second"] = leaves / (time.perf_counter() - start)
+        results[size] = result
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Lists the benchmarks that got slower than the baseline by more than tolerance (0.2 is 20% slower)."""
+    regressions = []
+    for name, stats in results.items():
+        old = baseline.get(name)
+        if old is None or "ops" not in old:
+            continue
+        if stats["ops"] < old["ops"] / (1 + tolerance):
+            regressions.append(f"{name}: {stats['ops']:.0f} ops/s, was {old['ops']:.0f} ops/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the game's hot paths.")
+    parser.add_argument("--positions", type=int, default=500, help="number of random positions to time")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rounds", type=int, default=20, help="timing rounds per benchmark")
+    parser.add_argument("--json", default=None, help="write the results to this file")
+    parser.add_argument("--compare", default=None, help="a results file from an earlier run to check against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="how much slower than --compare counts as a regression (default 0.2, i.e. 20%%)")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[],
+                        help="also time these board sizes, e.g. --sizes 8 9 10 12")
+    args = parser.parse_args()
+    positions = random_positions(args.positions, args.seed)
+
+    terminal = bench_terminal(positions)
+    print(f"win check over {terminal['positions']} positions (both colors, per position):")
+    print(f"  flood fill {terminal['flood_fill_us']:8.1f} us")
+    print(f"  dfs        {terminal['dfs_us']:8.1f} us")
+    print(f"  table dfs  {terminal['table_dfs_us']:8.1f} us")
+    print(f"  speedup    {terminal['speedup']:8.1f}x")
+
+    memory = bench_memory()
+    print(f"one board: {memory['list_of_lists_bytes']} bytes as nested lists, {memory['board_bytes']} as a Board "
+          f"({memory['board_with_grid_bytes']} with its grid view), {memory['to_bytes']} as to_bytes(); pickled "
+          f"{memory['list_of_lists_pickle']} bytes as nested lists, {memory['board_pickle']} as a Board")
+    print(f"  copy() {memory['copy_us']:.2f} us, from_bytes() {memory['from_bytes_us']:.2f} us")
+
+    suite = run_suite(positions, args.rounds)
+    print(f"{'benchmark':<16} {'mean us':>9} {'min us':>9} {'stddev':>9} {'ops/s':>12}")
+    for name, stats in suite.items():
+        if "mean_us" in stats:
+            print(f"{name:<16} {stats['mean_us']:>9.2f} {stats['min_us']:>9.2f} {stats['stddev_us']:>9.2f} "
+                  f"{stats['ops']:>12.0f}")
+        else:
+            print(f"{name:<16} {stats['leaves']:>9} leaves in {stats['seconds']:.3f}s {stats['ops']:>12.0f}")
+
+    sizes = bench_sizes(args.sizes) if args.sizes else {}
+    if sizes:
+        print(f"{'size':<6} {'tables ms':>9} {'generate':>9} {'make+un':>9} {'connected':>9} {'evaluate':>9} "
+              f"{'perft 2/s':>10}  (us per call)")
+        for size, result in sizes.items():
+            print(f"{f'{size}x{size}':<6} {result['tables_ms']:>9.1f} {result['generate_moves_us']:>9.2f} "
+                  f"{result['make_unmake_us']:>9.2f} {result['is_connected_us']:>9.2f} {result['evaluate_us']:>9.2f} "
+                  f"{result['perft_2_leaves_per_second']:>10.0f}")
+
+    results = {"python": sys.version.split()[0],
+               "machine": platform.machine(),
+               "positions": args.positions,
+               "seed": args.seed,
+               "terminal": terminal,
+               "memory": memory,
+               "sizes": sizes,
+               "benchmarks": suite}
+    if args.json is not None:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.compare is not None:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(suite, baseline["benchmarks"], args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
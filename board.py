@@ -1,278 +1,716 @@
 __author__ = "Ellen Whalen"
 
-DIM = 8
-
-class Board: 
-    """A list representing the game board with black pieces as "X"'s and white pieces as "O"'s 
-    which can run some basic operations on itself."""
-    def __init__(self):
-        self._grid = []
-        for i in range(DIM):
-            self._grid.append([""] * DIM)
-        for i in range(1, 7):
-            self._grid[0][i] = "X"
-            self._grid[7][i] = "X"
-            self._grid[i][0] = "O"
-            self._grid[i][7] = "O"
-    
+import struct
+from cache import PositionCache
+from tables import DIM, MOMENT_MASK, MOMENT_SHIFT, Tables, quad_value, tables_for
+
+# Where each color's four times Euler number and moments are in Board._shape.
+SHAPE_OFFSETS = {"X": 0, "O": 2}
+
+
+def shape_totals(bits: int, dim: int = DIM) -> tuple:
+    """Works out from scratch what Board keeps up to date for one color: four times its Euler number (found by
+    classifying every 2x2 quad of squares, including the ones hanging off the edge of the board), and its packed
+    moments."""
+    def piece(row: int, col: int) -> int:
+        if 0 <= row < dim and 0 <= col < dim:
+            return bits >> (row * dim + col) & 1
+        return 0
+
+    euler = 0
+    for row in range(-1, dim):
+        for col in range(-1, dim):
+            euler += quad_value(piece(row, col), piece(row, col + 1), piece(row + 1, col), piece(row + 1, col + 1))
+    shapes = tables_for(dim).square_shapes
+    moments = 0
+    for square in range(dim * dim):
+        if bits >> square & 1:
+            moments += shapes[square][2]
+    return euler, moments
+
+
+def zobrist_key(x_bits: int, o_bits: int, turn: str, dim: int = DIM) -> int:
+    """Works out a position's Zobrist key from scratch; Board keeps its key up to date instead."""
+    tables = tables_for(dim)
+    key = tables.zobrist_o_to_move if turn == "O" else 0
+    while x_bits:
+        lowest = x_bits & -x_bits
+        x_bits ^= lowest
+        key ^= tables.zobrist_x[lowest.bit_length() - 1]
+    while o_bits:
+        lowest = o_bits & -o_bits
+        o_bits ^= lowest
+        key ^= tables.zobrist_o[lowest.bit_length() - 1]
+    return key
+
+
+def _fill(bits: int, group: int, tables: Tables) -> int:
+    """Grows group through the pieces in bits until it stops growing."""
+    dim = tables.dim
+    not_first_col = tables.not_first_col
+    not_last_col = tables.not_last_col
+    while True:
+        grown = group | (group >> 1) & not_last_col | (group << 1) & not_first_col
+        grown = (grown | grown >> dim | grown << dim) & bits
+        if grown == group:
+            return group
+        group = grown
+
+
+# Board.to_bytes() on the usual board: the two bitboards, then 1 if it's white's turn. Other sizes store each
+# bitboard in as many bytes as it needs.
+BOARD_BYTES = struct.Struct("<QQ?")
+
+# Moves from generate_moves are packed into one int: the origin square in the high 6 bits and the destination
+# square in the low 6 bits. Bigger boards use more bits (see Tables.move_shift).
+MOVE_SHIFT = tables_for(DIM).move_shift
+MOVE_MASK = tables_for(DIM).move_mask
+
+
+# What make_move records as captured: nothing, an "X" or an "O".
+CAPTURED_COLORS = ("", "X", "O")
+
+
+def encode_move(from_square: int, to_square: int, dim: int = DIM) -> int:
+    """Packs a move between two squares into one int: 12 bits on the usual board."""
+    return from_square << tables_for(dim).move_shift | to_square
+
+
+def decode_move(move: int, dim: int = DIM) -> tuple:
+    """Unpacks a move from generate_moves into ((row, col), (new_row, new_col))."""
+    tables = tables_for(dim)
+    return divmod(move >> tables.move_shift, dim), divmod(move & tables.move_mask, dim)
+
+
+def square_name(square: int, dim: int = DIM) -> str:
+    """Names a square like a chess board: columns are letters from "a", and rows are numbered up from the bottom,
+    so [0][0] is "a8" and [7][7] is "h1"."""
+    row, col = divmod(square, dim)
+    return chr(ord("a") + col) + str(dim - row)
+
+
+def move_name(move: int, dim: int = DIM) -> str:
+    """Names an encoded move by its two squares, like "b8-b6"."""
+    tables = tables_for(dim)
+    return square_name(move >> tables.move_shift, dim) + "-" + square_name(move & tables.move_mask, dim)
+
+
+def parse_square(name: str, dim: int = DIM) -> int:
+    """The square named by square_name, e.g. 0 for "a8"."""
+    if len(name) < 2 or not "a" <= name[0] < chr(ord("a") + dim) or not name[1:].isdigit() \
+            or not 1 <= int(name[1:]) <= dim:
+        raise ValueError(f"\"{name}\" isn't the name of a square.")
+    return (dim - int(name[1:])) * dim + ord(name[0]) - ord("a")
+
+
+def parse_move(name: str, dim: int = DIM) -> int:
+    """The encoded move named by move_name, e.g. "b8-b6"."""
+    squares = name.split("-")
+    if len(squares) != 2:
+        raise ValueError(f"\"{name}\" isn't the name of a move.")
+    return encode_move(parse_square(squares[0], dim), parse_square(squares[1], dim), dim)
+
+
+class _GridRow:
+    """One row of Board.grid. Reads and writes go straight through to the board's bitboards."""
+    __slots__ = ("_board", "_row")
+
+    def __init__(self, board, row: int):
+        self._board = board
+        self._row = row
+
+    def _square(self, col: int) -> int:
+        dim = self._board.size
+        if col < 0:
+            col += dim
+        if not 0 <= col < dim:
+            raise IndexError("grid column out of range")
+        return self._row * dim + col
+
+    def __getitem__(self, col: int) -> str:
+        return self._board._piece_at(self._square(col))
+
+    def __setitem__(self, col: int, color: str):
+        self._board._set_square(self._square(col), color)
+
+    def __len__(self):
+        return self._board.size
+
+    def __iter__(self):
+        dim = self._board.size
+        for col in range(dim):
+            yield self._board._piece_at(self._row * dim + col)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class _Grid:
+    """A list-of-lists style view of a Board, so that board.grid[row][col] keeps working."""
+    __slots__ = ("_rows",)
+
+    def __init__(self, board):
+        self._rows = tuple(_GridRow(board, row) for row in range(board.size))
+
+    def __getitem__(self, row: int) -> _GridRow:
+        return self._rows[row]
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __eq__(self, other):
+        return [list(row) for row in self] == [list(row) for row in other]
+
+    def __repr__(self):
+        return repr([list(row) for row in self])
+
+
+class Board:
+    """The game board with black pieces as "X"'s and white pieces as "O"'s which can run some basic operations on
+    itself. The position is stored as one bitboard per color; grid is a view of it as a list of lists.
+    The number of pieces on every row, column and diagonal is kept up to date as pieces move, and make_move and
+    unmake_move keep a stack of undo records so a line of play can be explored and taken back without copying.
+    Each position has a Zobrist key (including whose turn it is), which is also kept up to date as pieces move, and
+    which legal_moves uses to look positions up in an optional PositionCache.
+    For the search's evaluation, each color's Euler number (from its 2x2 quad counts) and the totals behind its
+    centre of mass and concentration are kept up to date too, so they cost the same however many pieces there are.
+    check_shape() recounts them from scratch to make sure.
+    Boards use __slots__ and build their grid view only when it's asked for, so a board is a few hundred bytes;
+    copy(), to_bytes() and to_fen() copy or save one without going square by square.
+    A board is size x size squares, 8 unless it's given another size, and looks everything that depends on the size
+    up in its Tables (see tables), which are built once per size and shared by every board that size."""
+    __slots__ = ("_x_bits", "_o_bits", "_line_counts", "_shape", "_undo", "_turn", "_key", "_cache", "_grid_view",
+                 "_tables")
+    _x_bits: int
+    _o_bits: int
+    _line_counts: bytearray
+    _shape: list[int]
+    _undo: list[int]
+    _turn: str
+    _key: int
+    _cache: PositionCache
+    _tables: Tables
+
+    def __init__(self, cache: PositionCache = None, size: int = DIM):
+        self._tables = tables_for(size)
+        # Black always moves first.
+        self._load(self._tables.start_x_bits, self._tables.start_o_bits, "X")
+        self._cache = cache
+        self._grid_view = None
+
+    @classmethod
+    def from_state(cls, state: tuple, cache: PositionCache = None, size: int = DIM):
+        """Builds a board from the (x_bits, o_bits, turn) tuple returned by state(). The tuple doesn't say how big
+        the board is, so a board that isn't 8x8 needs its size passed too."""
+        board = cls.__new__(cls)
+        board._tables = tables_for(size)
+        board._load(*state)
+        board._cache = cache
+        board._grid_view = None
+        return board
+
+    @classmethod
+    def from_bytes(cls, data: bytes, cache: PositionCache = None, size: int = DIM):
+        """Builds a board from the bytes returned by to_bytes()."""
+        if size == DIM:
+            x_bits, o_bits, o_to_move = BOARD_BYTES.unpack(data)
+        else:
+            width = tables_for(size).bitboard_bytes
+            if len(data) != 2 * width + 1:
+                raise ValueError(f"A {size}x{size} board is {2 * width + 1} bytes, not {len(data)}.")
+            x_bits = int.from_bytes(data[:width], "little")
+            o_bits = int.from_bytes(data[width:2 * width], "little")
+            o_to_move = data[-1]
+        return cls.from_state((x_bits, o_bits, "O" if o_to_move else "X"), cache, size)
+
+    @classmethod
+    def from_fen(cls, text: str, cache: PositionCache = None):
+        """Builds a board from the text returned by to_fen(). The board is as big as the text has rows."""
+        parts = text.split()
+        if len(parts) != 2 or parts[1] not in ("X", "O"):
+            raise ValueError(f"\"{text}\" isn't a board.")
+        rows = parts[0].split("/")
+        size = len(rows)
+        tables_for(size)
+        x_bits = 0
+        o_bits = 0
+        for row, row_text in enumerate(rows):
+            col = 0
+            empty = ""
+            for character in row_text + " ":
+                if character.isdigit():
+                    # Runs of empty squares can take more than one digit on big boards.
+                    empty += character
+                    continue
+                if empty:
+                    col += int(empty)
+                    empty = ""
+                if character in ("X", "O") and col < size:
+                    if character == "X":
+                        x_bits |= 1 << (row * size + col)
+                    else:
+                        o_bits |= 1 << (row * size + col)
+                    col += 1
+                elif character != " ":
+                    raise ValueError(f"\"{text}\" isn't a board.")
+            if col != size:
+                raise ValueError(f"Row {row + 1} of \"{text}\" doesn't have {size} squares.")
+        return cls.from_state((x_bits, o_bits, parts[1]), cache, size)
+
+    def state(self) -> tuple:
+        """Returns the position as a small (x_bits, o_bits, turn) tuple, which is cheap to pickle and send to other
+        processes. The undo stack isn't included."""
+        return self._x_bits, self._o_bits, self._turn
+
+    def to_bytes(self) -> bytes:
+        """Returns the position as bytes: both bitboards and whose turn it is. That's BOARD_BYTES.size (17) bytes on
+        the usual board."""
+        if self._tables.dim == DIM:
+            return BOARD_BYTES.pack(self._x_bits, self._o_bits, self._turn == "O")
+        width = self._tables.bitboard_bytes
+        return (self._x_bits.to_bytes(width, "little") + self._o_bits.to_bytes(width, "little")
+                + bytes((self._turn == "O",)))
+
+    def to_fen(self) -> str:
+        """Returns the position as text, like chess's FEN: the rows from the top separated by "/", with each piece
+        as "X" or "O" and each run of empty squares as its length, then whose turn it is. The start is
+        "1XXXXXX1/O6O/O6O/O6O/O6O/O6O/O6O/1XXXXXX1 X"."""
+        dim = self._tables.dim
+        rows = []
+        for row in range(dim):
+            row_text = ""
+            empty = 0
+            for col in range(dim):
+                piece = self._piece_at(row * dim + col)
+                if piece:
+                    if empty:
+                        row_text += str(empty)
+                    row_text += piece
+                    empty = 0
+                else:
+                    empty += 1
+            if empty:
+                row_text += str(empty)
+            rows.append(row_text)
+        return "/".join(rows) + " " + self._turn
+
+    def copy(self):
+        """Returns a copy of the position sharing this board's cache, without the undo stack. It copies a fixed
+        number of fields, however the game has gone."""
+        board = Board.__new__(Board)
+        board._x_bits = self._x_bits
+        board._o_bits = self._o_bits
+        board._line_counts = self._line_counts.copy()
+        board._shape = self._shape.copy()
+        board._undo = []
+        board._turn = self._turn
+        board._key = self._key
+        board._cache = self._cache
+        board._grid_view = None
+        board._tables = self._tables
+        return board
+
+    def __reduce__(self):
+        # Pickles as the bytes of to_bytes(); the cache and undo stack stay behind.
+        if self._tables.dim == DIM:
+            return Board.from_bytes, (self.to_bytes(),)
+        return Board.from_bytes, (self.to_bytes(), None, self._tables.dim)
+
+    def _load(self, x_bits: int, o_bits: int, turn: str):
+        """Sets up the position from two bitboards, recounting the lines, shape totals and Zobrist key from
+        scratch."""
+        if x_bits & o_bits:
+            raise ValueError("A square can't hold both an \"X\" and an \"O\".")
+        self._x_bits = x_bits
+        self._o_bits = o_bits
+        tables = self._tables
+        if (x_bits | o_bits) & ~tables.full_mask:
+            raise ValueError(f"A {tables.dim}x{tables.dim} board doesn't have that many squares.")
+        line_counts = bytearray(tables.line_total)
+        self._shape = [0] * 4
+        for bits, offset in ((x_bits, 0), (o_bits, 2)):
+            placed = 0
+            while bits:
+                lowest = bits & -bits
+                bits ^= lowest
+                square = lowest.bit_length() - 1
+                for line in tables.square_lines[square]:
+                    line_counts[line] += 1
+                self._reshape(placed, square, offset, 1)
+                placed |= lowest
+        self._line_counts = line_counts
+        self._turn = turn
+        self._key = zobrist_key(x_bits, o_bits, turn, tables.dim)
+        self._undo = []
+
     @property
     def grid(self):
         return self._grid
-    
+
+    @property
+    def _grid(self):
+        # Made the first time it's used, since most boards (in searches, caches and datasets) never need it.
+        if self._grid_view is None:
+            self._grid_view = _Grid(self)
+        return self._grid_view
+
+    @property
+    def size(self) -> int:
+        """How many squares wide (and tall) the board is."""
+        return self._tables.dim
+
+    @property
+    def tables(self) -> Tables:
+        return self._tables
+
+    @property
+    def x_bits(self) -> int:
+        return self._x_bits
+
+    @property
+    def o_bits(self) -> int:
+        return self._o_bits
+
+    @property
+    def turn(self) -> str:
+        """The color whose turn it is: the opponent of whichever color moved last."""
+        return self._turn
+
+    @property
+    def key(self) -> int:
+        """The position's Zobrist key."""
+        return self._key
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @cache.setter
+    def cache(self, cache: PositionCache):
+        self._cache = cache
+
+    def bits(self, color: str) -> int:
+        """Returns the bitboard for one color."""
+        if color == "X":
+            return self._x_bits
+        return self._o_bits
+
+    def shape(self, color: str) -> tuple:
+        """Returns four times a color's Euler number, and the totals of its pieces' rows, columns and squared rows
+        plus columns."""
+        offset = SHAPE_OFFSETS[color]
+        moments = self._shape[offset + 1]
+        return (self._shape[offset], moments & MOMENT_MASK, moments >> MOMENT_SHIFT & MOMENT_MASK,
+                moments >> 2 * MOMENT_SHIFT)
+
+    def euler_number(self, color: str) -> int:
+        """A color's number of groups minus its number of holes, counting diagonal neighbours as connected. A color
+        with no holes is connected when this is 1."""
+        return self._shape[SHAPE_OFFSETS[color]] // 4
+
+    def centre_of_mass(self, color: str) -> tuple:
+        """The average (row, col) of a color's pieces."""
+        count = self.count_total(color)
+        if count == 0:
+            raise ValueError("A color with no pieces has no centre of mass.")
+        euler, row_total, col_total, square_total = self.shape(color)
+        return row_total / count, col_total / count
+
+    def concentration(self, color: str) -> float:
+        """The average squared distance from a color's pieces to their centre of mass: small when they're packed
+        together."""
+        count = self.count_total(color)
+        if count == 0:
+            return 0.0
+        euler, row_total, col_total, square_total = self.shape(color)
+        return (count * square_total - row_total * row_total - col_total * col_total) / (count * count)
+
+    def check_shape(self):
+        """Recounts the Euler numbers, centres of mass and concentrations from scratch and raises AssertionError if
+        the counts kept up to date as pieces moved don't match. Only meant for debugging."""
+        dim = self._tables.dim
+        expected = list(shape_totals(self._x_bits, dim) + shape_totals(self._o_bits, dim))
+        if self._shape != expected:
+            raise AssertionError(f"The shape totals are {self._shape}, but should be {expected}.")
+
+    def _reshape(self, bits: int, square: int, offset: int, sign: int):
+        """Adds (sign 1) or removes (sign -1) a piece on square to or from the shape totals at offset, where bits holds
+        that color's other pieces."""
+        mask, deltas, moments = self._tables.square_shapes[square]
+        self._shape[offset] += sign * deltas[bits & mask]
+        self._shape[offset + 1] += sign * moments
+
+    def _piece_at(self, square: int) -> str:
+        if self._x_bits >> square & 1:
+            return "X"
+        if self._o_bits >> square & 1:
+            return "O"
+        return ""
+
+    def _set_square(self, square: int, color: str):
+        """Puts a piece of some color (or nothing, for "") on a square, whatever was there before."""
+        if color not in ("X", "O", ""):
+            raise ValueError("A square can only hold \"X\", \"O\" or \"\".")
+        tables = self._tables
+        bit = 1 << square
+        if self._x_bits & bit:
+            self._key ^= tables.zobrist_x[square]
+            self._reshape(self._x_bits, square, 0, -1)
+        elif self._o_bits & bit:
+            self._key ^= tables.zobrist_o[square]
+            self._reshape(self._o_bits, square, 2, -1)
+        if color == "X":
+            self._key ^= tables.zobrist_x[square]
+            self._reshape(self._x_bits, square, 0, 1)
+        elif color == "O":
+            self._key ^= tables.zobrist_o[square]
+            self._reshape(self._o_bits, square, 2, 1)
+        was_occupied = (self._x_bits | self._o_bits) & bit
+        if was_occupied and color == "":
+            for line in tables.square_lines[square]:
+                self._line_counts[line] -= 1
+        elif not was_occupied and color != "":
+            for line in tables.square_lines[square]:
+                self._line_counts[line] += 1
+        self._x_bits &= ~bit
+        self._o_bits &= ~bit
+        if color == "X":
+            self._x_bits |= bit
+        elif color == "O":
+            self._o_bits |= bit
+
     def count_pieces(self, row: int, col: int) -> dict:
         """Counts the number of pieces on a given piece's row, column, and both diagonals."""
-        if self.grid[row][col] == "":
+        square = row * self._tables.dim + col
+        if not (self._x_bits | self._o_bits) >> square & 1:
             raise ValueError("count_pieces should not be run on an empty square.")
-        
-        # initializing counts, a dict that will hold all of the counts
-        counts = {"row_count": 0,
-                 "col_count": 0,
-                 "neg_diag_count": 0,
-                 "pos_diag_count": 0}
-        
-        i = 0
-        while i < DIM:
-            if self.grid[row][i] != "":
-                counts["row_count"] += 1
-            i += 1
-
-        i = 0
-        while i < DIM:
-            if self.grid[i][col] != "":
-                counts["col_count"] += 1
-            i += 1
-            
-        i = row 
-        j = col
-        while i > 0 and j > 0:
-            # getting i and j to the "start" of the diagonal running from L-top to R-bottom (-x direction)
-            i -= 1
-            j -= 1
-        while i < DIM and j < DIM:
-            if self.grid[i][j] != "":
-                counts["neg_diag_count"] += 1
-            i += 1
-            j += 1
-
-        i = row
-        j = col
-        while i < DIM - 1 and j > 0:
-            # getting i and j to the "start" of the diagonal running from L-bottom to R-top (+x direction)
-            i += 1
-            j -= 1
-        while i >= 0 and j < DIM:
-            if self.grid[i][j] != "":
-                counts["pos_diag_count"] += 1
-            i -= 1
-            j += 1
-        return counts
+        row_line, col_line, neg_line, pos_line = self._tables.square_lines[square]
+        line_counts = self._line_counts
+        return {"row_count": line_counts[row_line],
+                "col_count": line_counts[col_line],
+                "neg_diag_count": line_counts[neg_line],
+                "pos_diag_count": line_counts[pos_line]}
 
     def move_piece(self, row: int, col: int, new_row: int, new_col: int):
         """Moves a piece from [row][col] to [new_row][new_col]."""
-        if self.grid[row][col] == "":
+        dim = self._tables.dim
+        self._move(row * dim + col, new_row * dim + new_col)
+
+    def make_move(self, move: int):
+        """Plays an encoded move (see encode_move) and remembers what it captured and whose turn it was, so
+        unmake_move can take it back."""
+        was_o_turn = self._turn == "O"
+        tables = self._tables
+        self._undo.append((move << 1 | was_o_turn) << 2
+                          | self._move(move >> tables.move_shift, move & tables.move_mask))
+
+    def unmake_move(self):
+        """Takes back the last move played with make_move, putting back any piece it captured."""
+        if not self._undo:
+            raise ValueError("There is no move to take back.")
+        record = self._undo.pop()
+        captured = record & 3
+        move = record >> 3
+        tables = self._tables
+        to_square = move & tables.move_mask
+        self._move(to_square, move >> tables.move_shift)
+        if captured:
+            self._set_square(to_square, CAPTURED_COLORS[captured])
+        self._set_turn("O" if record >> 2 & 1 else "X")
+
+    def pass_turn(self):
+        """Hands the turn to the other color without moving, for when a color has no legal moves."""
+        self._set_turn("O" if self._turn == "X" else "X")
+
+    def _set_turn(self, color: str):
+        if color != self._turn:
+            self._turn = color
+            self._key ^= self._tables.zobrist_o_to_move
+
+    def _move(self, from_square: int, to_square: int) -> int:
+        """Moves a piece between two squares, keeping the line counts and Zobrist key up to date and handing the
+        turn to the other color. Returns 0 if the destination was empty, 1 if an "X" was captured and 2 if an "O"
+        was captured."""
+        from_bit = 1 << from_square
+        to_bit = 1 << to_square
+        if from_bit == to_bit:
+            if not (self._x_bits | self._o_bits) & from_bit:
+                raise ValueError("Can't move a piece that doesn't exist.")
+            return 0
+        if self._x_bits & to_bit:
+            captured = 1
+        elif self._o_bits & to_bit:
+            captured = 2
+        else:
+            captured = 0
+        x_bits = self._x_bits
+        o_bits = self._o_bits
+        tables = self._tables
+        zobrist_x = tables.zobrist_x
+        zobrist_o = tables.zobrist_o
+        if self._x_bits & from_bit:
+            self._x_bits = (self._x_bits & ~from_bit) | to_bit
+            self._o_bits &= ~to_bit
+            key = self._key ^ zobrist_x[from_square] ^ zobrist_x[to_square]
+            if captured == 1:
+                key ^= zobrist_x[to_square]
+            elif captured == 2:
+                key ^= zobrist_o[to_square]
+            if self._turn == "X":
+                self._turn = "O"
+                key ^= tables.zobrist_o_to_move
+        elif self._o_bits & from_bit:
+            self._o_bits = (self._o_bits & ~from_bit) | to_bit
+            self._x_bits &= ~to_bit
+            key = self._key ^ zobrist_o[from_square] ^ zobrist_o[to_square]
+            if captured == 1:
+                key ^= zobrist_x[to_square]
+            elif captured == 2:
+                key ^= zobrist_o[to_square]
+            if self._turn == "O":
+                self._turn = "X"
+                key ^= tables.zobrist_o_to_move
+        else:
             raise ValueError("Can't move a piece that doesn't exist.")
-        color_type = self._grid[row][col]
-        self._grid[row][col] = ""
-        self._grid[new_row][new_col] = color_type
-    
+        self._key = key
+
+        # Take the captured piece off, then move the piece one square at a time, so every update sees the pieces
+        # that are really around it.
+        if captured == 1:
+            self._reshape(x_bits, to_square, 0, -1)
+            x_bits ^= to_bit
+        elif captured == 2:
+            self._reshape(o_bits, to_square, 2, -1)
+            o_bits ^= to_bit
+        if x_bits & from_bit:
+            bits = x_bits
+            offset = 0
+        else:
+            bits = o_bits
+            offset = 2
+        # This is _reshape twice over, written out because it runs on every move.
+        square_shapes = tables.square_shapes
+        mask, deltas, moments = square_shapes[from_square]
+        to_mask, to_deltas, to_moments = square_shapes[to_square]
+        shape = self._shape
+        shape[offset] += to_deltas[(bits ^ from_bit) & to_mask] - deltas[bits & mask]
+        shape[offset + 1] += to_moments - moments
+
+        # The piece leaves all four of its old lines. If it lands on an empty square it joins four new ones;
+        # on a capture the square stays occupied, so those lines keep the same count.
+        line_counts = self._line_counts
+        square_lines = tables.square_lines
+        for line in square_lines[from_square]:
+            line_counts[line] -= 1
+        if not captured:
+            for line in square_lines[to_square]:
+                line_counts[line] += 1
+        return captured
+
+    def is_connected(self, color: str) -> bool:
+        """Checks whether all of a color's pieces form one group, counting diagonal neighbours as connected."""
+        bits = self.bits(color)
+        if not bits:
+            return False
+        return _fill(bits, bits & -bits, self._tables) == bits
+
     def count_total(self, color: str) -> int:
-        count = 0
-        for i in range(DIM):
-            for j in range(DIM):
-                if self.grid[j][i] == color:
-                    count += 1
-        return count
+        return self.bits(color).bit_count()
+
+    def generate_moves(self, color: str) -> list[int]:
+        """Finds every possible move for one color in a single pass and returns them as encoded moves (see
+        encode_move), ordered by origin square and then in the same order as find_moves."""
+        if color == "X":
+            own, opponent = self._x_bits, self._o_bits
+        else:
+            own, opponent = self._o_bits, self._x_bits
+        line_counts = self._line_counts
+        move_table = self._tables.move_table
+        move_shift = self._tables.move_shift
+        moves = []
+        remaining = own
+        while remaining:
+            lowest = remaining & -remaining
+            remaining ^= lowest
+            square = lowest.bit_length() - 1
+            origin = square << move_shift
+            for line, steps in move_table[square]:
+                count = line_counts[line]
+                if count <= len(steps):
+                    destination, between = steps[count - 1]
+                    if not between & opponent and not own >> destination & 1:
+                        moves.append(origin | destination)
+        return moves
+
+    def legal_moves(self, color: str) -> tuple:
+        """The same moves as generate_moves, but looked up in (and saved to) the board's cache if it has one."""
+        cache = self._cache
+        if cache is None:
+            return tuple(self.generate_moves(color))
+        cache_key = (self._key, color)
+        moves = cache.get(cache_key)
+        if moves is None:
+            moves = tuple(self.generate_moves(color))
+            cache.put(cache_key, moves)
+        return moves
 
     def find_moves(self, row: int, col: int) -> list[tuple]:
         """Finds possible moves for a piece and returns them as a list of tuples (row, col)."""
-        if self.grid[row][col] == "":
-            raise ValueError("Can't find moves for a piece that doesn't exist.")
-        color = self.grid[row][col]
-        if color == "X":
-            opponent = "O"
+        dim = self._tables.dim
+        square = row * dim + col
+        bit = 1 << square
+        if self._x_bits & bit:
+            own, opponent = self._x_bits, self._o_bits
+        elif self._o_bits & bit:
+            own, opponent = self._o_bits, self._x_bits
         else:
-            opponent = "X"
-        counts = self.count_pieces(row, col)
+            raise ValueError("Can't find moves for a piece that doesn't exist.")
+        line_counts = self._line_counts
+
+        moves = []
+        for line, steps in self._tables.move_table[square]:
+            count = line_counts[line]
+            # A piece moves exactly as many squares as there are pieces on its line, and it can jump over its own
+            # pieces but not the opponent's, and can't land on its own piece.
+            if count <= len(steps):
+                destination, between = steps[count - 1]
+                if not between & opponent and not own >> destination & 1:
+                    moves.append(divmod(destination, dim))
+        return moves
 
+    def _find_line_moves(self, row: int, col: int, color: str, opponent: str, count: int, first_direction: int):
+        """Finds possible moves for a piece along the two directions of one line, starting at first_direction."""
+        own_bits = self.bits(color)
+        opponent_bits = self.bits(opponent)
         moves = []
-        moves += self.find_row_moves(row, col, color, opponent, counts["row_count"])
-        moves += self.find_col_moves(row, col, color, opponent, counts["col_count"])
-        moves += self.find_neg_diag_moves(row, col, color, opponent, counts["neg_diag_count"])
-        moves += self.find_pos_diag_moves(row, col, color, opponent, counts["pos_diag_count"])
+        dim = self._tables.dim
+        rays = self._tables.rays[row * dim + col]
+        for direction in (first_direction, first_direction + 1):
+            steps = rays[direction]
+            if count <= len(steps):
+                destination, between = steps[count - 1]
+                if not between & opponent_bits and not own_bits >> destination & 1:
+                    moves.append(divmod(destination, dim))
         return moves
-    
+
     def find_row_moves(self, row: int, col: int, color: str, opponent: str, count: int) -> list[tuple]:
         """Finds possible moves for a piece along its row."""
-        moves = []
+        return self._find_line_moves(row, col, color, opponent, count, 0)
 
-        can_move = True
-        i = 1
-        col_check = col + 1
-        while col_check < DIM and i < count and can_move:
-            if self.grid[row][col_check] == opponent:
-                can_move = False
-            i += 1
-            col_check += 1
-
-        # LOTS of logic that gets repeated in all of these "find_[something]_moves" methods, so i'll explain it once here.
-        # if the loop was able to get all the way to the distance the piece would need to travel,
-        if i == count:    
-            # if the reason the while loop ended WASN'T because col_check overspills bounds,
-            if col_check < DIM:     
-                # if the spot the piece would land on is the same color as itself,
-                if self.grid[row][col_check] == color:
-                    can_move = False    # the piece can't move there.
-            # otherwise if col_check DID overspill bounds,
-            else:   
-                can_move = False    # the piece can't move there. (obviously)
-            # if the piece can STILL move to that space,
-            if can_move:
-                # add that move to the array of possible moves.
-                moves += [(row, col_check)]
-        
-        can_move = True
-        i = 1
-        col_check = col - 1
-        while col_check > 0 and i < count and can_move:
-            if self.grid[row][col_check] == opponent:
-                can_move = False
-            i += 1
-            col_check -= 1
-
-        if i == count:
-            if col_check >= 0:
-                if self.grid[row][col_check] == color:
-                    can_move = False
-            else:
-                can_move = False
-            if can_move:
-                moves += [(row, col_check)]
-        return moves
-    
     def find_col_moves(self, row: int, col: int, color: str, opponent: str, count: int):
         """Finds possible moves for a piece along its column."""
-        moves = []
-        can_move = True
-        i = 1
-        row_check = row + 1
-        while row_check < DIM and i < count and can_move:
-            if self.grid[row_check][col] == opponent:
-                can_move = False
-            i += 1
-            row_check += 1
-
-        if i == count:
-            if row_check < DIM:
-                if self.grid[row_check][col] == color:
-                    can_move = False
-            else:
-                can_move = False
-            if can_move:
-                moves += [(row_check, col)]
-        
-        can_move = True
-        i = 1
-        row_check = row - 1
-        while row_check > 0 and i < count and can_move:
-            if self.grid[row_check][col] == opponent:
-                can_move = False
-            i += 1
-            row_check -= 1
-        
-        if i == count:
-            if row_check >= 0:
-                if self.grid[row_check][col] == color:
-                    can_move = False
-            else:
-                can_move = False
-            if can_move:
-                moves += [(row_check, col)]
-        return moves
-    
+        return self._find_line_moves(row, col, color, opponent, count, 2)
+
     def find_neg_diag_moves(self, row: int, col: int, color: str, opponent: str, count: int):
         """Finds possible moves for a piece along its diagonal going from the upper left to lower right."""
-        moves = []
-        can_move = True
-        i = 1
-        col_check = col + 1
-        row_check = row + 1
-        while col_check < DIM and row_check < DIM and i < count and can_move:
-            if self.grid[row_check][col_check] == opponent:
-                can_move = False
-            i += 1
-            col_check += 1
-            row_check += 1
-
-        if i == count:
-            if col_check < DIM and row_check < DIM:
-                if self.grid[row_check][col_check] == color:
-                    can_move = False
-            else:
-                can_move = False
-            if can_move:
-                moves += [(row_check, col_check)]
-        
-        can_move = True
-        i = 1
-        col_check = col - 1
-        row_check = row - 1
-        while col_check > 0 and row_check > 0 and i < count and can_move:
-            if self.grid[row_check][col_check] == opponent:
-                can_move = False
-            i += 1
-            col_check -= 1
-            row_check -= 1
-        
-        if i == count:
-            if col_check >= 0 and row_check >= 0:
-                if self.grid[row_check][col_check] == color:
-                    can_move = False
-            else:
-                can_move = False
-            if can_move:
-                moves += [(row_check, col_check)]
-        return moves
-    
+        return self._find_line_moves(row, col, color, opponent, count, 4)
+
     def find_pos_diag_moves(self, row: int, col: int, color: str, opponent: str, count: int):
         """Finds possible moves for a piece along the diagonal going from its lower left to upper right."""
-        moves = []
-        can_move = True
-        i = 1
-        col_check = col + 1
-        row_check = row - 1
-        while col_check < DIM and row_check > 0 and i < count and can_move:
-            if self.grid[row_check][col_check] == opponent:
-                can_move = False
-            i += 1
-            col_check += 1
-            row_check -= 1
-
-        if i == count:
-            if col_check < DIM and row_check >= 0:
-                if self.grid[row_check][col_check] == color:
-                    can_move = False
-            else:
-                can_move = False
-            if can_move:
-                moves += [(row_check, col_check)]
-        
-        can_move = True
-        i = 1
-        col_check = col - 1
-        row_check = row + 1
-        while col_check > 0 and row_check < DIM and i < count and can_move:
-            if self.grid[row_check][col_check] == opponent:
-                can_move = False
-            i += 1
-            col_check -= 1
-            row_check += 1
-        
-        if i == count:
-            if col_check >= 0 and row_check < DIM:
-                if self.grid[row_check][col_check] == color:
-                    can_move = False
-            else:
-                can_move = False
-            if can_move:
-                moves += [(row_check, col_check)]
-        return moves
+        return self._find_line_moves(row, col, color, opponent, count, 6)
@@ -0,0 +1,217 @@
+__author__ = "Ellen Whalen"
+"""An opening book: how often each move was played from each position in the opening, and how it went, stored in
+a binary file that's memory-mapped and binary-searched, so any number of processes can share it without loading
+it.
+
+A book file starts with a HEADER (MAGIC, flags and the number of entries), then holds fixed-size ENTRY records
+(Zobrist key, encoded move, games, points) sorted by key and then move. Points are 2 for each win and 1 for each
+draw, from the point of view of the color making the move. In a CANONICAL book, positions and moves are stored in
+their canonical form (see symmetry), so all the rotations and reflections of a position share their entries."""
+
+import argparse
+import mmap
+import os
+import struct
+from board import Board, zobrist_key
+from game import DRAW, is_pass
+from records import GameRecord, read_games
+from symmetry import canonical_move, canonical_state, inverse, transform_move
+
+MAGIC = b"LOB\x01"
+HEADER = struct.Struct("<4sIQ")
+CANONICAL = 1
+ENTRY = struct.Struct("<QHII")
+KEY = struct.Struct("<Q")
+
+
+class BookBuilder:
+    """Adds up the moves played in the first max_moves moves of recorded games (and any deep searches added with
+    add_analysis), then writes them out as a book file. With canonical, the book stores canonical positions and
+    moves."""
+
+    def __init__(self, max_moves: int = 16, canonical: bool = False):
+        self._max_moves = max_moves
+        self._canonical = canonical
+        # (key, move) -> [games, points]
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add_position(self, board: Board, move: int, games: int, points: int):
+        """Adds games played with a move from the position on board."""
+        if self._canonical:
+            state = board.state()
+            self.add(zobrist_key(*canonical_state(state)[0]), canonical_move(state, move), games, points)
+        else:
+            self.add(board.key, move, games, points)
+
+    def add(self, key: int, move: int, games: int, points: int):
+        """Adds games played with a move from the position with this key, which must already be canonical in a
+        canonical book."""
+        entry = self._entries.get((key, move))
+        if entry is None:
+            self._entries[(key, move)] = [games, points]
+        else:
+            entry[0] += games
+            entry[1] += points
+
+    def add_record(self, record: GameRecord):
+        """Adds the opening of one finished game. Unfinished games are skipped, since they have no result."""
+        if record.result is None:
+            return
+        board = record.start_board()
+        for move in record.moves[:self._max_moves]:
+            if is_pass(move):
+                board.pass_turn()
+                continue
+            if record.result == DRAW:
+                points = 1
+            elif record.result == board.turn:
+                points = 2
+            else:
+                points = 0
+            self.add_position(board, move, 1, points)
+            board.make_move(move)
+
+    def add_games(self, path: str) -> int:
+        """Adds every game in a game archive (see records) and returns how many there were."""
+        count = 0
+        for record in read_games(path):
+            self.add_record(record)
+            count += 1
+        return count
+
+    def add_analysis(self, board: Board, move: int, weight: int = 10):
+        """Adds a move found by a deep search from the position on board, counted as weight won games."""
+        self.add_position(board, move, weight, 2 * weight)
+
+    def write(self, path: str, min_games: int = 1) -> int:
+        """Writes the book, leaving out moves played fewer than min_games times, and returns how many entries it
+        has."""
+        entries = sorted((key, move, games, points) for (key, move), (games, points) in self._entries.items()
+                         if games >= min_games)
+        with open(path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, CANONICAL if self._canonical else 0, len(entries)))
+            for key, move, games, points in entries:
+                file.write(ENTRY.pack(key, move, min(games, 0xFFFFFFFF), min(points, 0xFFFFFFFF)))
+        return len(entries)
+
+
+class OpeningBook:
+    """A book file, memory-mapped for lookups. Opening it reads nothing but the header; each lookup is a binary
+    search that touches a handful of pages, which the operating system shares between processes. Canonical books
+    are looked up by canonical position, and their moves turned back to fit the board."""
+
+    def __init__(self, path: str, min_games: int = 1):
+        self._file = open(path, "rb")
+        if os.path.getsize(path) < HEADER.size:
+            self._file.close()
+            raise ValueError(f"{path} isn't an opening book.")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._flags, self._count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or len(self._map) != HEADER.size + self._count * ENTRY.size:
+            self.close()
+            raise ValueError(f"{path} isn't an opening book.")
+        self._min_games = min_games
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def is_canonical(self) -> bool:
+        return bool(self._flags & CANONICAL)
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _key_at(self, index: int) -> int:
+        return KEY.unpack_from(self._map, HEADER.size + index * ENTRY.size)[0]
+
+    def lookup(self, key: int) -> list[tuple]:
+        """Returns (move, games, points) for every move in the book from the position with this Zobrist key."""
+        low = 0
+        high = self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        moves = []
+        while low < self._count:
+            entry_key, move, games, points = ENTRY.unpack_from(self._map, HEADER.size + low * ENTRY.size)
+            if entry_key != key:
+                break
+            moves.append((move, games, points))
+            low += 1
+        return moves
+
+    def choose(self, board: Board, color: str = None) -> int:
+        """Picks the book move for color (by default, whoever's turn it is): of the legal moves played at least
+        min_games times, the one with the best average points, then the most played. Returns 0 if the position
+        isn't in the book."""
+        if color is None:
+            color = board.turn
+        best = None
+        best_rank = None
+        if color == board.turn:
+            legal = set(board.generate_moves(color))
+            if self.is_canonical:
+                state, transform, swapped = canonical_state(board.state())
+                back = inverse(transform)
+                entries = [(transform_move(move, back), games, points)
+                           for move, games, points in self.lookup(zobrist_key(*state))]
+            else:
+                entries = self.lookup(board.key)
+            for move, games, points in entries:
+                # Checking the move is legal guards against two positions sharing a key.
+                if games >= self._min_games and move in legal:
+                    rank = (points / games, games)
+                    if best_rank is None or rank > best_rank:
+                        best = move
+                        best_rank = rank
+        if best is None:
+            self._misses += 1
+            return 0
+        self._hits += 1
+        return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an opening book from game archives.")
+    parser.add_argument("book", help="the book file to write")
+    parser.add_argument("archives", nargs="+", help="game archives to read (see records)")
+    parser.add_argument("--max-moves", type=int, default=16, help="how many moves of each game go in the book")
+    parser.add_argument("--min-games", type=int, default=2, help="leave out moves played fewer times than this")
+    parser.add_argument("--canonical", action="store_true",
+                        help="store each position once for all its rotations and reflections")
+    args = parser.parse_args()
+    builder = BookBuilder(args.max_moves, args.canonical)
+    games = 0
+    for path in args.archives:
+        games += builder.add_games(path)
+    entries = builder.write(args.book, args.min_games)
+    print(f"{games} games, {len(builder)} moves seen, {entries} entries written "
+          f"({os.path.getsize(args.book)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+__author__ = "Ellen Whalen"
+"""PositionCache class."""
+
+import sys
+from collections import OrderedDict
+
+
+class PositionCache:
+    """A fixed-size cache for results worked out from a position (legal moves, win checks, ...), keyed by the
+    position's Zobrist key. When it's full, the least recently used entry is thrown out to make room."""
+    _capacity: int
+    _entries: OrderedDict
+    _hits: int
+    _misses: int
+    _evictions: int
+
+    def __init__(self, capacity: int = 1 << 16):
+        if capacity < 1:
+            raise ValueError("A PositionCache needs room for at least one entry.")
+        self._capacity = capacity
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    @property
+    def evictions(self):
+        return self._evictions
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """Looks up a key, counting it as a hit or a miss. A hit makes the entry the most recently used one."""
+        entries = self._entries
+        if key in entries:
+            self._hits += 1
+            entries.move_to_end(key)
+            return entries[key]
+        self._misses += 1
+        return default
+
+    def put(self, key, value):
+        """Stores a value, throwing out the least recently used entry if the cache is already full."""
+        entries = self._entries
+        if key in entries:
+            entries.move_to_end(key)
+        elif len(entries) >= self._capacity:
+            entries.popitem(last=False)
+            self._evictions += 1
+        entries[key] = value
+
+    def clear(self):
+        """Empties the cache and resets its statistics."""
+        self._entries.clear()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def hit_rate(self) -> float:
+        lookups = self._hits + self._misses
+        if lookups == 0:
+            return 0.0
+        return self._hits / lookups
+
+    def memory_estimate(self) -> int:
+        """Roughly how many bytes the cache is holding on to, counting its table, keys and values (but not
+        anything shared between values, like small ints)."""
+        total = sys.getsizeof(self._entries)
+        for key, value in self._entries.items():
+            total += sys.getsizeof(key) + sys.getsizeof(value)
+        return total
+
+    def stats(self) -> dict:
+        """Returns the cache's hit/miss statistics, for sizing it to a workload."""
+        return {"capacity": self._capacity,
+                "size": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": self.hit_rate()}
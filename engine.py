@@ -0,0 +1,449 @@
+__author__ = "Ellen Whalen"
+"""A computer player for Lines of Action: negamax alpha-beta search with iterative deepening."""
+
+import time
+from board import Board, DIM
+from tables import MAX_DIM, tables_for
+
+# Scores are from the point of view of the side to move. A win found n moves from the root scores WIN_SCORE - n,
+# so quicker wins are preferred, and anything past WIN_THRESHOLD is a forced win or loss.
+WIN_SCORE = 100000
+WIN_THRESHOLD = WIN_SCORE - 1000
+INFINITY = WIN_SCORE + 1
+MAX_PLY = 128
+# How deep a search may go, and how long search() thinks for when it's given no depth, time or node limit.
+MAX_DEPTH = 64
+DEFAULT_TIME_LIMIT = 1.0
+
+# Transposition table entry flags: the stored score is exact, a lower bound or an upper bound.
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+
+def _build_min_spread():
+    """For every number of pieces, the smallest possible sum of distances to their centre, i.e. when they are all
+    packed as tightly as they can be. Used to measure how spread out a color's pieces are."""
+    min_spread = [0]
+    total = 0
+    ring = 0
+    in_ring = 1
+    placed = 0
+    for n in range(1, MAX_DIM * MAX_DIM + 1):
+        if placed == in_ring:
+            ring += 1
+            in_ring = 8 * ring
+            placed = 0
+        total += ring
+        placed += 1
+        min_spread.append(total)
+    return tuple(min_spread)
+
+
+MIN_SPREAD = _build_min_spread()
+
+
+def opponent_of(color: str) -> str:
+    if color == "X":
+        return "O"
+    return "X"
+
+
+def spread(bits: int, dim: int = DIM) -> int:
+    """How far a color's pieces are from being packed together: the sum of their distances to their centre of mass,
+    minus the smallest that sum could be for that many pieces."""
+    count = bits.bit_count()
+    if count == 0:
+        return 0
+    tables = tables_for(dim)
+    square_rows = tables.square_rows
+    square_cols = tables.square_cols
+    row_total = 0
+    col_total = 0
+    remaining = bits
+    while remaining:
+        lowest = remaining & -remaining
+        remaining ^= lowest
+        square = lowest.bit_length() - 1
+        row_total += square_rows[square]
+        col_total += square_cols[square]
+    centre_row = round(row_total / count)
+    centre_col = round(col_total / count)
+    total = 0
+    remaining = bits
+    while remaining:
+        lowest = remaining & -remaining
+        remaining ^= lowest
+        square = lowest.bit_length() - 1
+        total += max(abs(square_rows[square] - centre_row), abs(square_cols[square] - centre_col))
+    return total - MIN_SPREAD[count]
+
+
+def disconnection(board: Board, color: str) -> int:
+    """How far a color looks from joining up all its pieces, from the totals the board keeps up to date as pieces
+    move, so it costs the same however many pieces there are: how many more groups it has than one (by its Euler
+    number), how spread out its pieces are around their centre of mass, and how far that centre is from the middle
+    of the board."""
+    count = board.count_total(color)
+    if count == 0:
+        return 0
+    euler, row_total, col_total, square_total = board.shape(color)
+    groups = max(euler // 4, 1) - 1
+    # count times the sum of the pieces' squared distances from their centre of mass.
+    moment = count * square_total - row_total * row_total - col_total * col_total
+    # 4 * count * count times the squared distance from the centre of mass to the middle of the board.
+    edge = board.size - 1
+    off_centre = (2 * row_total - edge * count) ** 2 + (2 * col_total - edge * count) ** 2
+    return 40 * groups + 10 * moment // count + off_centre // (2 * count * count)
+
+
+def evaluate(board: Board, color: str) -> int:
+    """Scores a position for one color: the further the opponent is from connecting compared to this color, the
+    better."""
+    return disconnection(board, opponent_of(color)) - disconnection(board, color)
+
+
+def evaluate_spread(board: Board, color: str) -> int:
+    """The evaluation used before the board kept shape totals: how spread out the opponent is compared to this
+    color, recounted piece by piece."""
+    own = board.bits(color)
+    opponent = board.bits(opponent_of(color))
+    return 10 * (spread(opponent, board.size) - spread(own, board.size))
+
+
+def order_root_moves(board: Board, color: str) -> list[int]:
+    """Orders a color's moves from best to worst by the static evaluation of the position each one leads to."""
+    scores = {}
+    for move in board.generate_moves(color):
+        board.make_move(move)
+        scores[move] = evaluate(board, color)
+        board.unmake_move()
+    return sorted(scores, key=scores.__getitem__, reverse=True)
+
+
+class TranspositionTable:
+    """A fixed-size table of search results keyed by Zobrist key. Each key has exactly one slot (key modulo the
+    table size), and a new result only replaces an old one for a different position if it was searched as deep."""
+    _slots: list
+    _mask: int
+
+    def __init__(self, size_bits: int = 18):
+        self._slots = [None] * (1 << size_bits)
+        self._mask = (1 << size_bits) - 1
+
+    def __len__(self):
+        return len(self._slots)
+
+    def probe(self, key: int):
+        """Returns (depth, flag, score, move) for a position, or None if it isn't in the table."""
+        entry = self._slots[key & self._mask]
+        if entry is not None and entry[0] == key:
+            return entry[1:]
+        return None
+
+    def store(self, key: int, depth: int, flag: int, score: int, move: int):
+        index = key & self._mask
+        entry = self._slots[index]
+        if entry is None or entry[0] == key or entry[1] <= depth:
+            self._slots[index] = (key, depth, flag, score, move)
+
+    def clear(self):
+        self._slots = [None] * len(self._slots)
+
+
+class SearchResult:
+    """What a search found: the best move (encoded, see board.encode_move), its score, the deepest search that
+    finished, and how many nodes were searched in how long. iterations holds (depth, move, score) for every depth
+    that finished. A move from the opening book comes with depth 0 and from_book set."""
+
+    def __init__(self, move: int, score: int, depth: int, nodes: int, elapsed: float, iterations: list = None,
+                 from_book: bool = False):
+        self._move = move
+        self._score = score
+        self._depth = depth
+        self._nodes = nodes
+        self._elapsed = elapsed
+        if iterations is None:
+            iterations = []
+        self._iterations = iterations
+        self._from_book = from_book
+
+    @property
+    def move(self):
+        return self._move
+
+    @property
+    def score(self):
+        return self._score
+
+    @property
+    def depth(self):
+        return self._depth
+
+    @property
+    def nodes(self):
+        return self._nodes
+
+    @property
+    def elapsed(self):
+        return self._elapsed
+
+    @property
+    def iterations(self):
+        return self._iterations
+
+    @property
+    def from_book(self):
+        return self._from_book
+
+    @property
+    def nps(self) -> float:
+        """Nodes searched per second."""
+        if self._elapsed <= 0:
+            return 0.0
+        return self._nodes / self._elapsed
+
+    def __repr__(self):
+        return (f"SearchResult(move={self._move}, score={self._score}, depth={self._depth}, nodes={self._nodes}, "
+                f"nps={self.nps:.0f})")
+
+
+class Engine:
+    """Searches positions with negamax alpha-beta and iterative deepening. Moves are tried in the order: the
+    transposition table's best move, captures, the two killer moves for the ply, then by history score. The
+    transposition table, killers and history are kept between searches. With an opening book (see book), positions
+    in the book are answered from it without searching."""
+    _table: TranspositionTable
+    _killers: list
+    _history: dict
+    _nodes: int
+    _stopped: bool
+
+    def __init__(self, table: TranspositionTable = None, should_stop=None, book=None):
+        if table is None:
+            table = TranspositionTable()
+        self._table = table
+        self._book = book
+        # An optional function that's checked along with the time and node limits, so another thread can cancel a
+        # search (even one that hasn't started yet).
+        self._should_stop = should_stop
+        self._killers = [[0, 0] for i in range(MAX_PLY)]
+        self._history = {}
+        self._nodes = 0
+        self._stopped = False
+        self._deadline = None
+        self._node_limit = None
+
+    @property
+    def table(self):
+        return self._table
+
+    @property
+    def book(self):
+        return self._book
+
+    def stop(self):
+        """Asks a running search to stop as soon as it can. The search still returns its best move so far."""
+        self._stopped = True
+
+    def search(self, board: Board, color: str = None, max_depth: int = 64, time_limit: float = None,
+               node_limit: int = None, root_moves: list[int] = None) -> SearchResult:
+        """Finds the best move for color (by default, whoever's turn it is), searching one ply deeper at a time until
+        max_depth, the time limit (in seconds) or the node limit runs out. The first ply is always finished, so there
+        is always a move to play. If root_moves is given, only those moves are considered at the root, and the book
+        isn't used. The board is left exactly as it was."""
+        if color is None:
+            color = board.turn
+        start = time.perf_counter()
+        # Opening books only hold positions on the usual board.
+        if self._book is not None and root_moves is None and board.size == DIM:
+            move = self._book.choose(board, color)
+            if move:
+                return SearchResult(move, 0, 0, 0, time.perf_counter() - start, from_book=True)
+        self._nodes = 0
+        self._stopped = False
+        self._deadline = None if time_limit is None else start + time_limit
+        self._node_limit = node_limit
+        for killers in self._killers:
+            killers[0] = killers[1] = 0
+
+        if root_moves is None:
+            moves = board.generate_moves(color)
+        else:
+            moves = list(root_moves)
+        if not moves:
+            return SearchResult(0, 0, 0, 0, time.perf_counter() - start)
+        best_move = moves[0]
+        best_score = 0
+        depth_reached = 0
+        iterations = []
+        for depth in range(1, max_depth + 1):
+            move, score = self._search_root(board, color, moves, best_move, depth)
+            if self._stopped and depth > 1:
+                break
+            best_move, best_score, depth_reached = move, score, depth
+            iterations.append((depth, move, score))
+            if abs(score) > WIN_THRESHOLD:
+                # A forced win or loss has been found, so searching deeper won't change the answer.
+                break
+            if self._out_of_budget():
+                break
+        return SearchResult(best_move, best_score, depth_reached, self._nodes, time.perf_counter() - start, iterations)
+
+    def _out_of_budget(self) -> bool:
+        if self._node_limit is not None and self._nodes >= self._node_limit:
+            return True
+        if self._should_stop is not None and self._should_stop():
+            return True
+        return self._deadline is not None and time.perf_counter() >= self._deadline
+
+    def _search_root(self, board: Board, color: str, moves: list[int], first_move: int, depth: int) -> tuple:
+        """Searches every root move to some depth, trying first_move first, and returns (best move, score)."""
+        opponent = opponent_of(color)
+        ordered = [first_move] + [move for move in moves if move != first_move]
+        alpha = -INFINITY
+        best_move = first_move
+        for move in ordered:
+            board.make_move(move)
+            score = -self._negamax(board, opponent, depth - 1, -INFINITY, -alpha, 1, depth > 1)
+            board.unmake_move()
+            if self._stopped and depth > 1:
+                break
+            if score > alpha:
+                alpha = score
+                best_move = move
+        return best_move, alpha
+
+    def _order_moves(self, board: Board, moves: list[int], color: str, table_move: int, ply: int) -> list[int]:
+        opponent_bits = board.bits(opponent_of(color))
+        move_mask = board.tables.move_mask
+        killers = self._killers[ply]
+        history = self._history
+        scores = {}
+        for move in moves:
+            if move == table_move:
+                score = 1 << 40
+            elif opponent_bits >> (move & move_mask) & 1:
+                score = 1 << 30
+            elif move == killers[0] or move == killers[1]:
+                score = 1 << 29
+            else:
+                score = history.get(move, 0)
+            scores[move] = score
+        return sorted(moves, key=scores.__getitem__, reverse=True)
+
+    def _negamax(self, board: Board, color: str, depth: int, alpha: int, beta: int, ply: int,
+                 can_stop: bool) -> int:
+        self._nodes += 1
+        if can_stop and self._nodes & 1023 == 0 and self._out_of_budget():
+            self._stopped = True
+        if self._stopped and can_stop:
+            return 0
+
+        # Wins are only checked once a round is over, i.e. after white has moved, and if both colors are
+        # connected at that point it's a draw.
+        if color == "X":
+            x_connected = board.is_connected("X")
+            o_connected = board.is_connected("O")
+            if x_connected and o_connected:
+                return 0
+            if x_connected:
+                return WIN_SCORE - ply
+            if o_connected:
+                return ply - WIN_SCORE
+
+        if depth <= 0 or ply >= MAX_PLY - 1:
+            return evaluate(board, color)
+
+        opponent = opponent_of(color)
+        # The table is only used when color is the board's side to move, which it always is unless someone passed.
+        use_table = color == board.turn
+        table_move = 0
+        original_alpha = alpha
+        if use_table:
+            entry = self._table.probe(board.key)
+            if entry is not None:
+                entry_depth, flag, score, table_move = entry
+                if entry_depth >= depth:
+                    score = _score_from_table(score, ply)
+                    if flag == EXACT:
+                        return score
+                    if flag == LOWER and score > alpha:
+                        alpha = score
+                    elif flag == UPPER and score < beta:
+                        beta = score
+                    if alpha >= beta:
+                        return score
+
+        moves = board.generate_moves(color)
+        if not moves:
+            # A color with no moves passes.
+            return -self._negamax(board, opponent, depth - 1, -beta, -alpha, ply + 1, can_stop)
+
+        opponent_bits = board.bits(opponent)
+        best_score = -INFINITY
+        best_move = 0
+        for move in self._order_moves(board, moves, color, table_move, ply):
+            board.make_move(move)
+            score = -self._negamax(board, opponent, depth - 1, -beta, -alpha, ply + 1, can_stop)
+            board.unmake_move()
+            if self._stopped and can_stop:
+                return 0
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if not opponent_bits >> (move & board.tables.move_mask) & 1:
+                            killers = self._killers[ply]
+                            if killers[0] != move:
+                                killers[1] = killers[0]
+                                killers[0] = move
+                            self._history[move] = self._history.get(move, 0) + depth * depth
+                        break
+
+        if use_table:
+            if best_score <= original_alpha:
+                flag = UPPER
+            elif best_score >= beta:
+                flag = LOWER
+            else:
+                flag = EXACT
+            self._table.store(board.key, depth, flag, _score_to_table(best_score, ply), best_move)
+        return best_score
+
+
+def _score_to_table(score: int, ply: int) -> int:
+    """Win scores count plies from the root, but the table needs them counted from the position being stored."""
+    if score > WIN_THRESHOLD:
+        return score + ply
+    if score < -WIN_THRESHOLD:
+        return score - ply
+    return score
+
+
+def _score_from_table(score: int, ply: int) -> int:
+    if score > WIN_THRESHOLD:
+        return score - ply
+    if score < -WIN_THRESHOLD:
+        return score + ply
+    return score
+
+
+def default_budget(max_depth: int, time_limit: float, node_limit: int) -> tuple:
+    """The (max_depth, time_limit) to search with: without a depth, time or node limit, a search stops after
+    DEFAULT_TIME_LIMIT seconds rather than going on until MAX_DEPTH."""
+    if max_depth is None:
+        if time_limit is None and node_limit is None:
+            time_limit = DEFAULT_TIME_LIMIT
+        max_depth = MAX_DEPTH
+    return max_depth, time_limit
+
+
+def search(board: Board, color: str = None, max_depth: int = None, time_limit: float = None,
+           node_limit: int = None) -> SearchResult:
+    """Finds the best move on a position with a fresh Engine. See Engine.search, except that with no limits at all
+    it thinks for DEFAULT_TIME_LIMIT seconds."""
+    max_depth, time_limit = default_budget(max_depth, time_limit, node_limit)
+    return Engine().search(board, color, max_depth, time_limit, node_limit)
@@ -0,0 +1,185 @@
+__author__ = "Ellen Whalen"
+"""Class for the rules of one game of Lines Of Action, without any graphics."""
+
+from board import Board, DIM, encode_move
+from cache import PositionCache
+from tables import tables_for
+
+# What Game.result can be once the game is over.
+X_WINS = "X"
+O_WINS = "O"
+DRAW = "draw"
+
+
+def is_pass(move: int, dim: int = DIM) -> bool:
+    """Checks whether a move in Game.history is a pass, which is recorded as a move from a square to itself."""
+    tables = tables_for(dim)
+    return move >> tables.move_shift == move & tables.move_mask
+
+
+class Game:
+    """Runs one game of Lines of Action: whose turn it is, which moves are legal, playing them, and checking for wins
+    at the end of every round (black moves, then white, then the board is checked). Nothing here needs a window, so
+    it can be used from tests, scripts and worker processes. Without a board, the game starts on a new one of the
+    given size."""
+    _board: Board
+    _is_black_turn: bool
+    _result: str
+    _history: list[int]
+    _move_map: dict
+    _move_map_key: int
+
+    def __init__(self, board: Board = None, size: int = DIM):
+        if board is None:
+            board = Board(cache=PositionCache(4096), size=size)
+        self._board = board
+        self._is_black_turn = board.turn == "X"
+        self._result = None
+        self._history = []
+        self._move_map = None
+        self._move_map_key = None
+
+    @property
+    def board(self):
+        return self._board
+
+    @property
+    def is_black_turn(self):
+        return self._is_black_turn
+
+    @property
+    def turn(self) -> str:
+        """The color whose turn it is."""
+        if self._is_black_turn:
+            return "X"
+        return "O"
+
+    @property
+    def result(self):
+        """None while the game is going, then X_WINS, O_WINS or DRAW."""
+        return self._result
+
+    @property
+    def is_over(self) -> bool:
+        return self._result is not None
+
+    @property
+    def history(self):
+        """Every move played so far, encoded (see board.encode_move). A pass is recorded as a move from a square to
+        itself."""
+        return self._history
+
+    def legal_moves(self) -> tuple:
+        """Every legal move for the color whose turn it is, encoded."""
+        return self.board.legal_moves(self.turn)
+
+    def move_map(self) -> dict:
+        """Every legal move for the color whose turn it is, as {(row, col): {(new_row, new_col), ...}}, with one
+        entry per piece that can move. It's worked out once per turn, so selecting pieces and checking moves are
+        just lookups; an empty map means the color can't move."""
+        key = (self.board.key, self._is_black_turn)
+        if self._move_map_key != key:
+            move_map = {}
+            tables = self.board.tables
+            for move in self.legal_moves():
+                origin = divmod(move >> tables.move_shift, tables.dim)
+                destination = divmod(move & tables.move_mask, tables.dim)
+                if origin in move_map:
+                    move_map[origin].add(destination)
+                else:
+                    move_map[origin] = {destination}
+            self._move_map = move_map
+            self._move_map_key = key
+        return self._move_map
+
+    def is_legal(self, row: int, col: int, new_row: int, new_col: int) -> bool:
+        if self.is_over:
+            return False
+        return (new_row, new_col) in self.move_map().get((row, col), ())
+
+    def play_move(self, row: int, col: int, new_row: int, new_col: int):
+        """Moves a piece for the color whose turn it is, then hands the turn over. If that ends a round, the board is
+        checked for wins."""
+        if self.is_over:
+            raise ValueError("The game is already over.")
+        if not self.is_legal(row, col, new_row, new_col):
+            raise ValueError("That isn't a legal move.")
+        self.board.move_piece(row, col, new_row, new_col)
+        dim = self.board.size
+        self._history.append(encode_move(row * dim + col, new_row * dim + new_col, dim))
+        self._end_turn()
+
+    def play(self, move: int):
+        """Plays an encoded move (see board.encode_move)."""
+        tables = self.board.tables
+        from_square = move >> tables.move_shift
+        to_square = move & tables.move_mask
+        self.play_move(tables.square_rows[from_square], tables.square_cols[from_square],
+                       tables.square_rows[to_square], tables.square_cols[to_square])
+
+    def _end_turn(self):
+        color = self.turn
+        self._is_black_turn = not self._is_black_turn
+        if color == "O":
+            # White has moved, so the round is over.
+            wins = self.check_board()
+            if wins["x_win"] and wins["o_win"]:
+                self._result = DRAW
+            elif wins["x_win"]:
+                self._result = X_WINS
+            elif wins["o_win"]:
+                self._result = O_WINS
+        if not self.is_over and not self.board.generate_moves(self.turn):
+            if not self.board.generate_moves(color):
+                # Neither color can move, so nobody can win.
+                self._result = DRAW
+            else:
+                # A color with no legal moves has to pass.
+                square = (self.board.bits(self.turn) & -self.board.bits(self.turn)).bit_length() - 1
+                self._history.append(encode_move(square, square, self.board.size))
+                self.board.pass_turn()
+                self._end_turn()
+
+    def check_board(self):
+        """Checks the board to see if any end condition is met, then returns whether there is a win for black and/or white."""
+        cache = self.board.cache
+        if cache is not None:
+            wins = cache.get((self.board.key, "wins"))
+            if wins is not None:
+                return dict(wins)
+        # One flood fill per color over the bitboards, instead of counting the pieces and running dfs from the first
+        # one simple_search finds.
+        x_win = self.board.is_connected("X")
+        o_win = self.board.is_connected("O")
+        wins = {"x_win": x_win,
+                "o_win": o_win}
+        if cache is not None:
+            cache.put((self.board.key, "wins"), dict(wins))
+        return wins
+
+    def simple_search(self, color):
+        """Searches the board until it finds the right color piece."""
+        i = 0
+        while i < self.board.size:
+            j = 0
+            while j < self.board.size:
+                if self.board.grid[i][j] == color:
+                    vertex = (i, j)
+                    return vertex
+                j += 1
+            i += 1
+
+    def dfs(self, vertex: tuple, visited: list):
+        """Depth-first search for pieces of some particular color on the board."""
+        grid = self.board.grid
+        color = grid[vertex[0]][vertex[1]]
+        if color == "":
+            raise ValueError("Can't search on a piece that doesn't exist.")
+        if vertex not in visited:
+            visited.append(vertex)
+            tables = self.board.tables
+            for square in tables.neighbours[vertex[0] * tables.dim + vertex[1]]:
+                i = tables.square_rows[square]
+                j = tables.square_cols[square]
+                if grid[i][j] == color:
+                    self.dfs((i, j), visited)
@@ -1,188 +1,219 @@
-
 __author__ = "Ellen Whalen"
-"""Class for the game functions of Lines Of Action."""
+"""Class for the graphical front-end of Lines Of Action. The rules live in game.Game; graphics is only imported
+once a window is actually needed, so importing this file never opens one."""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from board import DIM
+from book import OpeningBook
+from engine import Engine
+from game import Game, is_pass
+from ponder import Ponderer
+from profiling import add_arguments, run_profiled
+from records import GameWriter
+
+
+def _graphics():
+    """Imports the graphics module the first time it's needed."""
+    import graphics
+    return graphics
 
-import graphics as g
-from box import Box
-from board import Board
 
 class LinesOfAction:
-    """An object which runs one game of Lines of Action, finding and executing moves, controlling graphics, 
-    and checking for wins."""
-    _round: bool
-    _board: Board
-    _win: g.GraphWin
+    """An object which runs one game of Lines of Action in a window, letting players click to move and showing the
+    board. The game itself (moves, turns and wins) is run by a Game. If computer_color is "X" or "O", the computer
+    plays that color, thinking for think_time seconds a move, and ponders its replies while the human thinks. With a
+    record_path, the finished game is appended to that game archive (see records). With a book_path, the computer
+    plays from that opening book (see book) while it can. Without a game, a new one is started on a board of the
+    given size."""
+    _game: Game
 
-    def __init__(self):
-        self._is_black_turn = True
-        self._round = True
-        self._board = Board()
-        self._win = g.GraphWin("Lines of Action", 800, 800, autoflush=False)
-        self._win.setBackground("mediumseagreen")
-        self._win.setCoords(0, DIM, DIM, 0)
+    def __init__(self, game: Game = None, computer_color: str = None, think_time: float = 2.0,
+                 record_path: str = None, book_path: str = None, size: int = DIM):
+        if game is None:
+            game = Game(size=size)
+        if record_path is not None and game.board.size != DIM:
+            raise ValueError(f"Only {DIM}x{DIM} games can be recorded.")
+        self._game = game
+        self._computer_color = computer_color
+        self._think_time = think_time
+        self._record_path = record_path
+        self._engine = None
+        self._ponderer = None
+        if computer_color is not None:
+            self._engine = Engine(book=OpeningBook(book_path) if book_path is not None else None)
+            self._ponderer = Ponderer(self._engine.table, think_time)
+        self._win = None
+        self._squares = None
+        self._pieces = None
+        self._square_fills = None
+        self._shown_x = 0
+        self._shown_o = 0
+        # The legal moves for each turn are worked out on a background thread, started as soon as the last move is
+        # played so that it overlaps with redrawing the board.
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._move_map_future = None
+
+    @property
+    def game(self):
+        return self._game
+
+    @property
+    def ponderer(self):
+        return self._ponderer
 
     @property
     def is_black_turn(self):
-        return self._is_black_turn
+        return self._game.is_black_turn
     
     @property
     def board(self):
-        return self._board
+        return self._game.board
     
     @property 
     def win(self):
+        """The game's window, which is opened the first time it's used."""
+        if self._win is None:
+            g = _graphics()
+            self._win = g.GraphWin("Lines of Action", 800, 800, autoflush=False)
+            self._win.setBackground("mediumseagreen")
+            self._win.setCoords(0, self.board.size, self.board.size, 0)
         return self._win
     
     def draw_board(self):
-        """Draws the board in its initial state."""
+        """Draws the board in its initial state. Every square gets one rectangle and one circle, which are kept for
+        the whole game and recoloured, drawn or undrawn in place, so the canvas never grows."""
+        g = _graphics()
+        dim = self.board.size
+        self._squares = []
+        self._pieces = []
+        for i in range(dim):
+            square_row = []
+            piece_row = []
+            for j in range(dim):
+                rect = g.Rectangle(g.Point(j + 1, i + 1), g.Point(j, i))
+                rect.setFill("mediumseagreen")
+                rect.draw(self.win)
+                square_row.append(rect)
+                piece_row.append(g.Circle(g.Point(j + 0.5, i + 0.5), 0.25))
+            self._squares.append(square_row)
+            self._pieces.append(piece_row)
         # Drawing all of the gridlines
-        for i in range(DIM):
-            line = g.Line(g.Point(0, i), g.Point(DIM, i))
+        for i in range(dim):
+            line = g.Line(g.Point(0, i), g.Point(dim, i))
             line.draw(self.win)
-            line = g.Line(g.Point(i, 0), g.Point(i, DIM))
+            line = g.Line(g.Point(i, 0), g.Point(i, dim))
             line.draw(self.win)
-        # Drawing all of the pieces
-        for i in range(DIM):
-            for j in range(DIM):
-                if self.board.grid[i][j] == "X":
-                    circle = g.Circle(g.Point(j + 0.5, i + 0.5), 0.25)
-                    circle.setFill("black")
-                    circle.draw(self.win)
-                if self.board.grid[i][j] == "O":
-                    circle = g.Circle(g.Point(j + 0.5, i + 0.5), 0.25)
-                    circle.setFill("white")
-                    circle.draw(self.win)
+        # What each square is currently showing, so only the squares that change get redrawn.
+        self._square_fills = [["mediumseagreen"] * dim for i in range(dim)]
+        self._shown_x = 0
+        self._shown_o = 0
+        self._redraw_pieces()
         self.win.update()
 
+    def _fill_square(self, row: int, col: int, fill: str):
+        """Recolours one square's background, if it isn't that colour already."""
+        if self._square_fills[row][col] != fill:
+            self._squares[row][col].setFill(fill)
+            self._square_fills[row][col] = fill
+
+    def _redraw_pieces(self):
+        """Brings the pieces on screen up to date with the board, touching only the squares that changed."""
+        x_bits = self.board.x_bits
+        o_bits = self.board.o_bits
+        changed = (x_bits ^ self._shown_x) | (o_bits ^ self._shown_o)
+        while changed:
+            lowest = changed & -changed
+            changed ^= lowest
+            square = lowest.bit_length() - 1
+            circle = self._pieces[square // self.board.size][square % self.board.size]
+            was_shown = (self._shown_x | self._shown_o) & lowest
+            if x_bits & lowest:
+                circle.setFill("black")
+            elif o_bits & lowest:
+                circle.setFill("white")
+            else:
+                circle.undraw()
+                continue
+            if not was_shown:
+                circle.draw(self.win)
+        self._shown_x = x_bits
+        self._shown_o = o_bits
+
     def show_possible_moves(self, moves: list[tuple]):
         """Displays possible moves as light green squares."""
-        length = len(moves)
-        for i in range(length):
-            row = moves[i][0]
-            col = moves[i][1]
-            # Changing background colors
-            rect = g.Rectangle(g.Point(col + 1, row + 1), g.Point(col, row))
-            rect.setFill("greenyellow")
-            rect.draw(self.win)
-            # Redrawing pieces on top
-            if self.board.grid[row][col] != "":
-                color_type = self.board.grid[row][col]
-                if color_type == "X":
-                    color = "black"
-                else:
-                    color = "white"
-                circle = g.Circle(g.Point(col + 0.5, row + 0.5), 0.25)
-                circle.setFill(color)
-                circle.draw(self.win)
+        for row, col in moves:
+            self._fill_square(row, col, "greenyellow")
         self.win.update()
     
     def select_piece(self, row: int, col: int, moves: list[tuple]):
         """Selects a piece, checks its possible moves and displays them."""
         # Changes the background behind the selected piece to a lighter shade of green.
-        rect = g.Rectangle(g.Point(col + 1, row + 1), g.Point(col, row))
-        rect.setFill("palegreen")
-        rect.draw(self.win)
-
-        # Redraws the piece on top of it.
-        color_type = self.board.grid[row][col]
-        if color_type == "X":
-            color = "black"
-        else:
-            color = "white"
-        circle = g.Circle(g.Point(col + 0.5, row + 0.5), 0.25)
-        circle.setFill(color)
-        circle.draw(self.win)
-
+        self._fill_square(row, col, "palegreen")
         self.show_possible_moves(moves)
-        self.win.update()
     
     def deselect_piece(self, row: int, col: int, moves: list[tuple]):
         """Deselects a piece which has previously been selected."""
-
-        # Turns the square of the selected piece back to the normal shade of green.
-        rect = g.Rectangle(g.Point(col + 1, row + 1), g.Point(col, row))
-        rect.setFill("mediumseagreen")
-        rect.draw(self.win)
-        color_type = self.board.grid[row][col]
-        if color_type == "X":
-            color = "black"
-        else:
-            color = "white"
-        
-        # Redraws the piece on top of the square.
-        circle = g.Circle(g.Point(col + 0.5, row + 0.5), 0.25)
-        circle.setFill(color)
-        circle.draw(self.win)
-
-        # Redraws the rest of the board.
-        length = len(moves)
-        for i in range(length):
-            row = moves[i][0]
-            col = moves[i][1]
-            rect = g.Rectangle(g.Point(col + 1, row + 1), g.Point(col, row))
-            rect.setFill("mediumseagreen")
-            rect.draw(self.win)
-            if self.board.grid[row][col] != "":
-                color_type = self.board.grid[row][col]
-                if color_type == "X":
-                    color = "black"
-                else:
-                    color = "white"
-                circle = g.Circle(g.Point(col + 0.5, row + 0.5), 0.25)
-                circle.setFill(color)
-                circle.draw(self.win)   
+        # Turns the squares of the selected piece and its moves back to the normal shade of green.
+        self._fill_square(row, col, "mediumseagreen")
+        for move_row, move_col in moves:
+            self._fill_square(move_row, move_col, "mediumseagreen")
         self.win.update()
 
     def show_move(self):
         """Called after a piece is moved. Updates the board to show that move."""
-        for i in range(DIM):
-            for j in range(DIM):
-                if self.board.grid[i][j] == "X":
-                    circle = g.Circle(g.Point(j + 0.5, i + 0.5), 0.25)
-                    circle.setFill("black")
-                    circle.draw(self.win)
-                elif self.board.grid[i][j] == "O":
-                    circle = g.Circle(g.Point(j + 0.5, i + 0.5), 0.25)
-                    circle.setFill("white")
-                    circle.draw(self.win)
-                else:
-                    rect = g.Rectangle(g.Point(j + 1, i + 1), g.Point(j, i))
-                    rect.setFill("mediumseagreen")
-                    rect.draw(self.win)
+        self._redraw_pieces()
         self.win.update()
 
     def play_game(self):
-        """Controls the gameplay, letting the correct pieces move and calling checks for wins."""
+        """Controls the gameplay, letting the correct pieces move and reporting the result once the game ends."""
         self.draw_board()
-        game_running = True
-        while game_running:
-            self._round = True
-            if self.is_black_turn:
-                self.take_turn("X")
-            if not self.is_black_turn:
-                self.take_turn("O")
-
-            if not self._round:
-                # Every time a round ends, check to see if either/both win conditions are met and respond accordingly.
-                win_conditions = self.check_board()
-                if win_conditions["x_win"] and win_conditions["o_win"]:
-                    print("---THE GAME HAS ENDED---")
-                    print("It's a draw!")
-                    game_running = False
-                elif win_conditions["x_win"]:
-                    print("---THE GAME HAS ENDED---")
-                    print("Black wins!")
-                    game_running = False
-                elif win_conditions["o_win"]:
-                    print("---THE GAME HAS ENDED---")
-                    print("White wins!")
-                    game_running = False
+        self._prepare_turn()
+        while not self.game.is_over:
+            if self.game.turn == self._computer_color:
+                self.computer_turn()
+            else:
+                self.take_turn(self.game.turn)
+        self._executor.shutdown()
+        if self._ponderer is not None:
+            self._ponderer.stop()
+            stats = self._ponderer.stats()
+            print(f"Pondering: {stats['hits']} hits, {stats['misses']} misses, {stats['nodes']} nodes searched.")
+        if self._record_path is not None:
+            self.record_game(self._record_path)
+        print("---THE GAME HAS ENDED---")
+        if self.game.result == "draw":
+            print("It's a draw!")
+        elif self.game.result == "X":
+            print("Black wins!")
+        else:
+            print("White wins!")
         self.win.getMouse()
         self.win.close()
 
+    def record_game(self, path: str):
+        """Appends the game so far to a game archive, noting who played each color."""
+        players = {color: "computer" if color == self._computer_color else "human" for color in ("X", "O")}
+        with GameWriter(path) as writer:
+            writer.write_game(self.game, {"black": players["X"], "white": players["O"]})
+
+    def _prepare_turn(self):
+        """Starts working out the legal moves for the coming turn in the background, if it's a human's turn. The
+        computer's turn changes the board while it searches, so nothing may be reading the board then."""
+        if self.game.turn == self._computer_color:
+            self._move_map_future = None
+        else:
+            self._move_map_future = self._executor.submit(self.game.move_map)
+
     def take_turn(self, color: str):
         """Allows one turn to be taken for either color of a piece."""
-        moves = []
+        if self._move_map_future is None:
+            self._prepare_turn()
+        move_map = self._move_map_future.result()
+        if self._ponderer is not None:
+            # Let the computer think about its replies while the human decides.
+            self._ponderer.start(self.board, color)
+        moves = ()
         click = self.win.getMouse()
         # Getting the row and column info from the getMouse object (click)
         row = int(click.getY())
@@ -190,8 +221,8 @@ class LinesOfAction:
         # Functions as an if statement, but needs to be a while because the player can select one piece,
         # then another piece, etc
         while self.board.grid[row][col] == color:
-            # Calculating possible moves
-            moves = self.board.find_moves(row, col)
+            # Looking up possible moves
+            moves = move_map.get((row, col), ())
             # Selecting the piece based on said moves
             self.select_piece(row, col, moves)
             x_selected = (row, col)
@@ -202,75 +233,64 @@ class LinesOfAction:
             row = int(click.getY())
             col = int(click.getX())
 
-        # Checking the possible move (user's click) against all possible moves
-        possible_move = (row, col)
-        i = 0
-        has_not_moved = True
-        while i < len(moves) and has_not_moved: 
-            if possible_move == moves[i]:
-                self.board.move_piece(x_selected[0], x_selected[1], moves[i][0], moves[i][1])
-                self.show_move()
-                has_not_moved = False
-                # Inverting the turn
-                self._is_black_turn = not self._is_black_turn
-                if color == "O":
-                    # If it was white's turn, the round is now over since white has moved.
-                    self._round = False
-            i += 1
-        
-    def check_board(self):
-        """Checks the board to see if any end condition is met, then returns whether there is a win for black and/or white."""
-        x_win = False
-        o_win = False
-        x_count = self.board.count_total("X")
-        o_count = self.board.count_total("O")
+        # Checking the possible move (user's click) against the selected piece's possible moves
+        if (row, col) in moves:
+            self.game.play_move(x_selected[0], x_selected[1], row, col)
+            self._after_move(color)
 
-        # search for an x and an o on the board. we only need to get the first two we come upon.
-        x_vertex = self.simple_search("X")
-        o_vertex = self.simple_search("O")
+    def computer_turn(self):
+        """Lets the computer play its move, straight away if it already pondered a reply to the human's move."""
+        if self._move_map_future is not None:
+            # The search makes and unmakes moves on the board, so the background thread has to be done with it.
+            self._move_map_future.result()
+            self._move_map_future = None
+        result = self._ponderer.take(self.board.key)
+        if result is None:
+            result = self._engine.search(self.board, self._computer_color, time_limit=self._think_time)
+        self.game.play(result.move)
+        self._after_move(self._computer_color)
 
-        x_visited = []
-        o_visited = []
-        # dfs based on a starting vertex given by simple_search
-        self.dfs(x_vertex, x_visited)
-        self.dfs(o_vertex, o_visited)
-        
+    def _after_move(self, color: str):
+        """Gets everything ready for the next turn after color has moved."""
+        self._prepare_turn()
+        self.show_move()
+        if is_pass(self.game.history[-1], self.board.size):
+            # The other color had no legal moves, so the game passed its turn.
+            if color == "O":
+                print("Black has no legal moves and passes.")
+            else:
+                print("White has no legal moves and passes.")
+
+    def check_board(self):
+        """Checks the board to see if any end condition is met, then returns whether there is a win for black and/or white."""
+        return self.game.check_board()
 
-        if len(x_visited) == x_count:
-            x_win = True
-        if len(o_visited) == o_count:
-            o_win = True
-        return {"x_win": x_win,
-                "o_win": o_win}
-        
     def simple_search(self, color):
         """Searches the board until it finds the right color piece."""
-        i = 0
-        while i < DIM:
-            j = 0
-            while j < DIM:
-                if self.board.grid[i][j] == color:
-                    vertex = (i, j)
-                    return vertex
-                j += 1
-            i += 1
+        return self.game.simple_search(color)
 
     def dfs(self, vertex: tuple, visited: list):
         """Depth-first search for pieces of some particular color on the board."""
-        if self.board.grid[vertex[0]][vertex[1]] == "":
-            raise ValueError("Can't search on a piece that doesn't exist.")
-        if vertex not in visited:
-            visited.append(vertex)
-            box = Box(vertex[0], vertex[1], DIM)
-            for i in box.row_range():
-                for j in box.col_range():
-                    # self.board.grid[vertex[0]][vertex[1]] returns the color of the piece we want to run dfs on.
-                    if self.board.grid[i][j] == self.board.grid[vertex[0]][vertex[1]]:
-                        self.dfs((i, j), visited)
-        
+        self.game.dfs(vertex, visited)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play Lines of Action.")
+    parser.add_argument("--computer", choices=["X", "O"], default=None,
+                        help="let the computer play black (X) or white (O)")
+    parser.add_argument("--think-time", type=float, default=2.0, help="seconds the computer thinks per move")
+    parser.add_argument("--record", default=None, help="append the finished game to this game archive")
+    parser.add_argument("--book", default=None, help="an opening book for the computer")
+    parser.add_argument("--size", type=int, default=DIM, help="how many squares wide the board is")
+    add_arguments(parser)
+    args = parser.parse_args()
+    game = LinesOfAction(computer_color=args.computer, think_time=args.think_time, record_path=args.record,
+                         book_path=args.book, size=args.size)
+    if args.profile is None:
+        game.play_game()
+    else:
+        run_profiled(game.play_game, args.profile, args.profile_output)
 
-DIM = 8     # I'm using this as a constant not because it should change, but because it's easier to read.
 
-# !!!!!!YOU NEED TO COMMENT OUT THE FOLLOWING TWO LINES FOR THE TESTS ON THIS FILE TO RUN!!!!!!
-my_game = LinesOfAction()
-my_game.play_game()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+__author__ = "Ellen Whalen"
+"""A load test for the game server (see server): many clients play games against it at once, and it reports how
+long each request took to answer, as percentiles, and how many games and moves a second the server got through.
+Human players are played by the clients, picking random legal moves."""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from server import HUMAN, GameServer
+
+
+class Connection:
+    """One client connection to the server, sending one request at a time."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader = reader
+        self._writer = writer
+        self._next_id = 0
+
+    @classmethod
+    async def open(cls, host: str = "127.0.0.1", port: int = 8765, path: str = None):
+        """Connects to a server on a TCP host and port, or on the Unix socket at path."""
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def request(self, op: str, **fields) -> dict:
+        """Sends a request and waits for its reply, raising ValueError if it went wrong."""
+        self._next_id += 1
+        message = {"id": self._next_id, "op": op, **fields}
+        self._writer.write(json.dumps(message).encode() + b"\n")
+        await self._writer.drain()
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("The server closed the connection.")
+        reply = json.loads(line)
+        if not reply["ok"]:
+            raise ValueError(reply["error"])
+        return reply
+
+    async def close(self):
+        self._writer.close()
+        await self._writer.wait_closed()
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """The value that fraction of the (sorted) values are at or below, by the nearest-rank method."""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(fraction * len(values) + 0.5) - 1))
+    return values[index]
+
+
+def summarize(latencies: dict, games: int, moves: int, elapsed: float) -> dict:
+    """Works out throughput and latency percentiles, in milliseconds, overall and for each op."""
+    summary = {"games": games,
+               "moves": moves,
+               "seconds": elapsed,
+               "games_per_second": games / elapsed if elapsed > 0 else 0.0,
+               "moves_per_second": moves / elapsed if elapsed > 0 else 0.0,
+               "latency_ms": {}}
+    every = sorted(latency for op_latencies in latencies.values() for latency in op_latencies)
+    for op, values in [("all", every)] + sorted(latencies.items()):
+        values = sorted(values)
+        summary["latency_ms"][op] = {"requests": len(values),
+                                     "p50": percentile(values, 0.5) * 1e3,
+                                     "p90": percentile(values, 0.9) * 1e3,
+                                     "p99": percentile(values, 0.99) * 1e3,
+                                     "max": (values[-1] if values else 0.0) * 1e3}
+    return summary
+
+
+async def run_load_test(games: int, clients: int, black: str = HUMAN, white: str = "engine:depth=1",
+                        size: int = 8, seed: int = 0, max_moves: int = 300, host: str = "127.0.0.1",
+                        port: int = 8765, path: str = None) -> dict:
+    """Plays games on the server from clients connections at once, until games games have been played, and
+    returns the summary from summarize."""
+    latencies = {}
+    counts = {"games": 0, "moves": 0}
+    next_game = iter(range(games))
+
+    async def timed(connection: Connection, op: str, **fields) -> dict:
+        start = time.perf_counter()
+        reply = await connection.request(op, **fields)
+        latencies.setdefault(op, []).append(time.perf_counter() - start)
+        return reply
+
+    async def client():
+        connection = await Connection.open(host, port, path)
+        try:
+            for n in next_game:
+                generator = random.Random(seed + n)
+                state = await timed(connection, "new", black=black, white=white, size=size, seed=seed + n)
+                moves = len(state["moves"])
+                while state["result"] is None and moves < max_moves:
+                    if "legal" in state:
+                        state = await timed(connection, "move", game=state["game"],
+                                            move=generator.choice(state["legal"]))
+                    else:
+                        state = await timed(connection, "play", game=state["game"])
+                    moves += max(len(state["moves"]), 1)
+                await timed(connection, "close", game=state["game"])
+                counts["games"] += 1
+                counts["moves"] += moves
+        finally:
+            await connection.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for i in range(clients)))
+    return summarize(latencies, counts["games"], counts["moves"], time.perf_counter() - start)
+
+
+async def _serve_and_test(args) -> dict:
+    """Starts a server in this process, on a free port, and load tests it."""
+    executor = ThreadPoolExecutor(args.workers) if args.threads else ProcessPoolExecutor(args.workers)
+    server = GameServer(executor)
+    await server.start("127.0.0.1", 0)
+    try:
+        host, port = server.address[:2]
+        return await run_load_test(args.games, args.clients, args.black, args.white, args.size, args.seed,
+                                   args.max_moves, host, port)
+    finally:
+        await server.close()
+        executor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the game server.")
+    parser.add_argument("--games", type=int, default=100, help="how many games to play in all")
+    parser.add_argument("--clients", type=int, default=20, help="how many clients play at once")
+    parser.add_argument("--black", default=HUMAN, help="\"human\" (random moves from the client) or a player spec")
+    parser.add_argument("--white", default="engine:depth=1", help="the same, for white")
+    parser.add_argument("--size", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-moves", type=int, default=300, help="stop a game after this many moves")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="connect to the server on this Unix socket")
+    parser.add_argument("--serve", action="store_true", help="start a server in this process and test that")
+    parser.add_argument("--workers", type=int, default=None, help="with --serve, engine workers")
+    parser.add_argument("--threads", action="store_true", help="with --serve, search on threads, not processes")
+    parser.add_argument("--json", default=None, help="write the summary to this file")
+    args = parser.parse_args()
+    if args.serve:
+        summary = asyncio.run(_serve_and_test(args))
+    else:
+        summary = asyncio.run(run_load_test(args.games, args.clients, args.black, args.white, args.size, args.seed,
+                                            args.max_moves, args.host, args.port, args.unix))
+    print(f"{summary['games']} games, {summary['moves']} moves in {summary['seconds']:.2f}s: "
+          f"{summary['games_per_second']:.2f} games/s, {summary['moves_per_second']:.1f} moves/s")
+    print(f"{'op':<8} {'requests':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for op, row in summary["latency_ms"].items():
+        print(f"{op:<8} {row['requests']:>9} {row['p50']:>9.2f} {row['p90']:>9.2f} {row['p99']:>9.2f} "
+              f"{row['max']:>9.2f}")
+    if args.json is not None:
+        with open(args.json, "w") as file:
+            json.dump(summary, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+__author__ = "Ellen Whalen"
+"""A Monte Carlo Tree Search player for Lines of Action."""
+
+import math
+import random
+import time
+from board import Board
+from engine import opponent_of
+
+# Playout results, from black's point of view.
+X_WIN = 1.0
+DRAW = 0.5
+O_WIN = 0.0
+
+
+def round_result(board: Board):
+    """Checks for a win the way LinesOfAction.check_board does at the end of a round: returns X_WIN, O_WIN or DRAW
+    if the game is over, or None if it isn't."""
+    x_connected = board.is_connected("X")
+    o_connected = board.is_connected("O")
+    if x_connected and o_connected:
+        return DRAW
+    if x_connected:
+        return X_WIN
+    if o_connected:
+        return O_WIN
+    return None
+
+
+class Node:
+    """One position in the search tree. total is the sum of the playout results from the point of view of the
+    color that moved into this position."""
+    __slots__ = ("move", "parent", "key", "color", "children", "untried", "visits", "total", "result")
+
+    def __init__(self, move: int, parent, key: int, color: str, untried: list[int], result):
+        self.move = move
+        self.parent = parent
+        self.key = key
+        # The color to move in this position.
+        self.color = color
+        self.children = []
+        self.untried = untried
+        self.visits = 0
+        self.total = 0.0
+        # X_WIN, O_WIN or DRAW if the game is over here, or None.
+        self.result = result
+
+
+class MCTSResult:
+    """What a search found: the best move (encoded, see board.encode_move), how often it was visited and how well
+    its playouts went, and how many playouts were run in how long."""
+
+    def __init__(self, move: int, visits: int, win_rate: float, playouts: int, elapsed: float):
+        self._move = move
+        self._visits = visits
+        self._win_rate = win_rate
+        self._playouts = playouts
+        self._elapsed = elapsed
+
+    @property
+    def move(self):
+        return self._move
+
+    @property
+    def visits(self):
+        return self._visits
+
+    @property
+    def win_rate(self):
+        return self._win_rate
+
+    @property
+    def playouts(self):
+        return self._playouts
+
+    @property
+    def elapsed(self):
+        return self._elapsed
+
+    @property
+    def playouts_per_second(self) -> float:
+        if self._elapsed <= 0:
+            return 0.0
+        return self._playouts / self._elapsed
+
+    def __repr__(self):
+        return (f"MCTSResult(move={self._move}, visits={self._visits}, win_rate={self._win_rate:.3f}, "
+                f"playouts={self._playouts}, playouts_per_second={self.playouts_per_second:.0f})")
+
+
+class MCTSPlayer:
+    """Chooses moves with UCT Monte Carlo Tree Search. Every time the tree grows by one position, batch_size random
+    games are played out from it, all on the one board with make_move/unmake_move, so no Board is made per playout.
+    The tree is kept between searches: if the next position searched is already in it (usually two plies down, after
+    this player's move and the opponent's reply), that part of the tree is reused."""
+    _exploration: float
+    _batch_size: int
+    _max_playout_length: int
+    _random: random.Random
+    _root: Node
+
+    def __init__(self, exploration: float = 1.4, batch_size: int = 8, max_playout_length: int = 200,
+                 seed: int = None):
+        self._exploration = exploration
+        self._batch_size = batch_size
+        self._max_playout_length = max_playout_length
+        self._random = random.Random(seed)
+        self._root = None
+
+    @property
+    def root(self):
+        return self._root
+
+    def reseed(self, seed: int):
+        """Starts the random playouts over from seed, and forgets the tree, so the next search depends on nothing
+        searched before it."""
+        self._random.seed(seed)
+        self._root = None
+
+    def search(self, board: Board, color: str = None, time_limit: float = None,
+               playout_limit: int = None) -> MCTSResult:
+        """Finds a move for color (by default, whoever's turn it is) by running playouts until the time limit (in
+        seconds) or playout limit runs out. With neither, it stops after 1000 playouts. The board is left exactly as
+        it was."""
+        if color is None:
+            color = board.turn
+        if time_limit is None and playout_limit is None:
+            playout_limit = 1000
+        start = time.perf_counter()
+        deadline = None if time_limit is None else start + time_limit
+        root = self._reuse_root(board.key, color)
+        if root is None:
+            root = Node(0, None, board.key, color, board.generate_moves(color), None)
+        self._root = root
+        if not root.untried and not root.children:
+            return MCTSResult(0, 0, 0.0, 0, time.perf_counter() - start)
+
+        playouts = 0
+        while True:
+            playouts += self._grow(board, root)
+            if playout_limit is not None and playouts >= playout_limit:
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        best = max(root.children, key=lambda child: child.visits)
+        return MCTSResult(best.move, best.visits, best.total / best.visits, playouts, time.perf_counter() - start)
+
+    def _reuse_root(self, key: int, color: str):
+        """Looks for the position being searched among the last root and its children and grandchildren."""
+        old_root = self._root
+        if old_root is None:
+            return None
+        candidates = [old_root]
+        for child in old_root.children:
+            candidates.append(child)
+            candidates += child.children
+        for node in candidates:
+            if node.key == key and node.color == color and node.result is None:
+                node.parent = None
+                return node
+        return None
+
+    def _grow(self, board: Board, root: Node) -> int:
+        """Runs one selection, expansion, playout and backpropagation step and returns how many playouts it ran."""
+        node = root
+        depth = 0
+        # Selection: walk down through fully expanded positions.
+        while not node.untried and node.children and node.result is None:
+            node = self._select_child(node)
+            board.make_move(node.move)
+            depth += 1
+
+        # Expansion: add one new position, unless the game is already over here.
+        if node.untried and node.result is None:
+            move = node.untried.pop(self._random.randrange(len(node.untried)))
+            board.make_move(move)
+            depth += 1
+            next_color = opponent_of(node.color)
+            result = None
+            if next_color == "X":
+                result = round_result(board)
+            moves = [] if result is not None else board.generate_moves(next_color)
+            child = Node(move, node, board.key, next_color, moves, result)
+            node.children.append(child)
+            node = child
+
+        # Playouts, or the known result if the game is over.
+        if node.result is not None:
+            playouts = 1
+            total = node.result
+        else:
+            playouts = self._batch_size
+            total = 0.0
+            for i in range(playouts):
+                total += self.playout(board, node.color)
+
+        for i in range(depth):
+            board.unmake_move()
+
+        # Backpropagation: total is from black's point of view, and each node scores for the color that moved in.
+        while node is not None:
+            node.visits += playouts
+            if node.color == "O":
+                node.total += total
+            else:
+                node.total += playouts - total
+            node = node.parent
+        return playouts
+
+    def _select_child(self, node: Node) -> Node:
+        log_visits = math.log(node.visits)
+        exploration = self._exploration
+        best = None
+        best_value = -1.0
+        for child in node.children:
+            value = child.total / child.visits + exploration * math.sqrt(log_visits / child.visits)
+            if value > best_value:
+                best = child
+                best_value = value
+        return best
+
+    def playout(self, board: Board, color: str) -> float:
+        """Plays random moves from a position, starting with color, until a round ends with a win or draw (or the
+        playout gets too long, which counts as a draw). Returns X_WIN, O_WIN or DRAW, and puts the board back the
+        way it was."""
+        choice = self._random.choice
+        made = 0
+        result = DRAW
+        passes = 0
+        while made < self._max_playout_length:
+            moves = board.generate_moves(color)
+            if moves:
+                board.make_move(choice(moves))
+                made += 1
+                passes = 0
+            else:
+                passes += 1
+                if passes == 2:
+                    break
+            color = opponent_of(color)
+            if color == "X":
+                round_over = round_result(board)
+                if round_over is not None:
+                    result = round_over
+                    break
+        for i in range(made):
+            board.unmake_move()
+        return result
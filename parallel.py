@@ -0,0 +1,150 @@
+__author__ = "Ellen Whalen"
+"""Searching one position on several cores at once, by splitting the root moves between worker processes."""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from board import Board, decode_move
+from engine import Engine, SearchResult, default_budget, order_root_moves
+
+# Each worker process keeps one Engine, so its transposition table and history carry over from one search to the
+# next, like they would for a single-core search.
+_worker_engine = None
+
+
+def _search_worker(state: tuple, size: int, color: str, root_moves: list[int], max_depth: int, time_limit: float,
+                   node_limit: int) -> tuple:
+    """Runs in a worker process: searches some of the root moves and returns (iterations, nodes)."""
+    global _worker_engine
+    if _worker_engine is None:
+        _worker_engine = Engine()
+    board = Board.from_state(state, size=size)
+    result = _worker_engine.search(board, color, max_depth, time_limit, node_limit, root_moves)
+    return result.iterations, result.nodes
+
+
+def split_moves(moves: list[int], parts: int) -> list[list[int]]:
+    """Deals moves out round-robin into at most `parts` groups, so each group gets a share of the moves that were
+    ordered first (which are usually the best ones)."""
+    parts = max(1, min(parts, len(moves)))
+    return [moves[i::parts] for i in range(parts)]
+
+
+def combine_results(results: list[tuple], elapsed: float) -> SearchResult:
+    """Combines the (iterations, nodes) results from every worker. Scores are only comparable at the same depth,
+    so the answer comes from the deepest depth that every worker finished."""
+    depth = min(iterations[-1][0] for iterations, nodes in results if iterations)
+    best_move = 0
+    best_score = None
+    for iterations, nodes in results:
+        for iteration_depth, move, score in iterations:
+            if iteration_depth == depth and (best_score is None or score > best_score):
+                best_move = move
+                best_score = score
+    nodes = sum(nodes for iterations, nodes in results)
+    return SearchResult(best_move, best_score, depth, nodes, elapsed, [(depth, best_move, best_score)])
+
+
+class ParallelSearcher:
+    """Searches positions on a pool of worker processes. The root moves are ordered by a quick static evaluation,
+    dealt out between the workers, and each worker searches its share with iterative deepening under the same
+    budget.
+
+    More workers means each one has fewer root moves to get through, so in the same time they get deeper; that is
+    how move-time strength scales with cores. It scales best when there are at least a few root moves per worker
+    (the opening has 36), and shows up as a higher depth for the same time_limit, or a shorter time for the same
+    max_depth. Use speedup_curve (or `python parallel.py`) to measure it on a given machine."""
+    _workers: int
+    _executor: ProcessPoolExecutor
+
+    def __init__(self, workers: int = None):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self._workers = workers
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+
+    @property
+    def workers(self):
+        return self._workers
+
+    def search(self, board: Board, color: str = None, max_depth: int = 64, time_limit: float = None,
+               node_limit: int = None) -> SearchResult:
+        """Finds the best move for color (by default, whoever's turn it is). Works like Engine.search, except that
+        node_limit is shared out between the workers."""
+        if color is None:
+            color = board.turn
+        start = time.perf_counter()
+        moves = order_root_moves(board, color)
+        if not moves:
+            return SearchResult(0, 0, 0, 0, time.perf_counter() - start)
+        groups = split_moves(moves, self._workers)
+        if node_limit is not None:
+            node_limit = max(1, node_limit // len(groups))
+        state = board.state()
+        futures = [self._executor.submit(_search_worker, state, board.size, color, group, max_depth, time_limit, node_limit)
+                   for group in groups]
+        results = [future.result() for future in futures]
+        return combine_results(results, time.perf_counter() - start)
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def parallel_search(board: Board, color: str = None, max_depth: int = None, time_limit: float = None,
+                    node_limit: int = None, workers: int = None) -> SearchResult:
+    """Finds the best move on a position with a throwaway pool of workers. See ParallelSearcher.search, except that
+    with no limits at all it thinks for engine.DEFAULT_TIME_LIMIT seconds."""
+    max_depth, time_limit = default_budget(max_depth, time_limit, node_limit)
+    with ParallelSearcher(workers) as searcher:
+        return searcher.search(board, color, max_depth, time_limit, node_limit)
+
+
+def speedup_curve(board: Board, depth: int, worker_counts: list[int]) -> list[dict]:
+    """Times a fixed-depth search of a position with each number of workers, and works out the speedup compared to
+    one worker. Each pool is warmed up before timing, so process start-up isn't counted."""
+    rows = []
+    base_time = None
+    for workers in worker_counts:
+        with ParallelSearcher(workers) as searcher:
+            searcher.search(board, max_depth=1)
+            start = time.perf_counter()
+            result = searcher.search(board, max_depth=depth)
+            elapsed = time.perf_counter() - start
+        if base_time is None:
+            base_time = elapsed
+        rows.append({"workers": workers,
+                     "seconds": elapsed,
+                     "speedup": base_time / elapsed,
+                     "nodes": result.nodes,
+                     "nps": result.nodes / elapsed,
+                     "move": decode_move(result.move),
+                     "score": result.score})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parallel search's speedup curve.")
+    parser.add_argument("--depth", type=int, default=4, help="search depth to time")
+    parser.add_argument("--workers", type=int, nargs="+", default=None,
+                        help="worker counts to try (default: 1, 2, 4, ... up to the number of cores)")
+    args = parser.parse_args()
+    worker_counts = args.workers
+    if worker_counts is None:
+        worker_counts = [1]
+        while worker_counts[-1] * 2 <= (os.cpu_count() or 1):
+            worker_counts.append(worker_counts[-1] * 2)
+    print(f"{'workers':>8} {'seconds':>9} {'speedup':>8} {'nodes':>10} {'nps':>10}")
+    for row in speedup_curve(Board(), args.depth, worker_counts):
+        print(f"{row['workers']:>8} {row['seconds']:>9.3f} {row['speedup']:>8.2f} {row['nodes']:>10} "
+              f"{row['nps']:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+__author__ = "Ellen Whalen"
+"""Perft: counting every sequence of legal moves to some depth, to check (and time) move generation."""
+
+import argparse
+import time
+from board import Board, move_name
+from engine import opponent_of
+
+# Positions with known perft counts for depths 1, 2 and 3. The counts were worked out with the original
+# square-by-square find_moves, so they check the bitboard move generation against it. The positions are
+# Board.state() tuples.
+STORED_POSITIONS = {
+    "start": ((0x7e0000000000007e, 0x0081818181818100, "X"), (36, 1244, 44952)),
+    "middle": ((0x520012000000404e, 0x01c001a0a1048100, "X"), (34, 1431, 47519)),
+    "late": ((0x4220000030404048, 0x0841040401020000, "O"), (31, 1232, 37395)),
+}
+
+
+def perft(board: Board, color: str, depth: int) -> int:
+    """Counts the positions reached after every sequence of depth legal moves, starting with color. Wins aren't
+    checked, so games don't end early; a color with no legal moves passes."""
+    if depth == 0:
+        return 1
+    moves = board.generate_moves(color)
+    opponent = opponent_of(color)
+    if not moves:
+        return perft(board, opponent, depth - 1)
+    if depth == 1:
+        return len(moves)
+    total = 0
+    for move in moves:
+        board.make_move(move)
+        total += perft(board, opponent, depth - 1)
+        board.unmake_move()
+    return total
+
+
+def divide(board: Board, color: str, depth: int) -> dict:
+    """Splits perft up by the first move, returning {move name: count}, for tracking down which move's subtree has
+    the wrong count."""
+    counts = {}
+    opponent = opponent_of(color)
+    for move in board.generate_moves(color):
+        board.make_move(move)
+        counts[move_name(move)] = perft(board, opponent, depth - 1)
+        board.unmake_move()
+    return counts
+
+
+def check_stored_positions(max_depth: int = 3) -> list[tuple]:
+    """Runs perft on every stored position up to max_depth and returns (name, depth, expected, counted, seconds)
+    for each."""
+    rows = []
+    for name, (state, expected) in STORED_POSITIONS.items():
+        board = Board.from_state(state)
+        for depth in range(1, min(max_depth, len(expected)) + 1):
+            start = time.perf_counter()
+            counted = perft(board, state[2], depth)
+            rows.append((name, depth, expected[depth - 1], counted, time.perf_counter() - start))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count leaf nodes of the move tree to check move generation.")
+    parser.add_argument("depth", type=int, nargs="?", default=3)
+    parser.add_argument("--position", choices=sorted(STORED_POSITIONS), default=None,
+                        help="only run this stored position (and print a divide for it)")
+    args = parser.parse_args()
+    if args.position is not None:
+        state = STORED_POSITIONS[args.position][0]
+        board = Board.from_state(state)
+        counts = divide(board, state[2], args.depth)
+        for name in sorted(counts):
+            print(f"{name} {counts[name]}")
+        print(f"total {sum(counts.values())}")
+        return
+    failed = False
+    for name, depth, expected, counted, seconds in check_stored_positions(args.depth):
+        status = "ok" if expected == counted else "WRONG"
+        failed = failed or expected != counted
+        print(f"{name:>8} depth {depth}: {counted:>8} (expected {expected:>8}) {status:>5} "
+              f"{counted / max(seconds, 1e-9):>10.0f} leaves/s")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
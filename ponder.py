@@ -0,0 +1,115 @@
+__author__ = "Ellen Whalen"
+"""Pondering: letting the computer player think on the human's time."""
+
+import threading
+from board import Board
+from engine import Engine, TranspositionTable, opponent_of, order_root_moves
+
+
+class Ponderer:
+    """While the human is thinking, searches the computer's reply to each of the human's likely moves on a
+    background thread, most likely first. The searches share the computer's transposition table, so even a reply
+    that wasn't pondered to the end gets a head start. take() hands over the pondered reply, if the human played
+    one of the moves that was pondered."""
+    _table: TranspositionTable
+    _time_per_move: float
+    _max_depth: int
+    _results: dict
+    _hits: int
+    _misses: int
+    _nodes: int
+
+    def __init__(self, table: TranspositionTable, time_per_move: float = 1.0, max_depth: int = 64):
+        self._table = table
+        self._time_per_move = time_per_move
+        self._max_depth = max_depth
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._results = {}
+        self._position_key = None
+        self._hits = 0
+        self._misses = 0
+        self._nodes = 0
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    @property
+    def nodes(self):
+        """How many nodes have been searched while pondering, in total."""
+        return self._nodes
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def hit_rate(self) -> float:
+        if self._hits + self._misses == 0:
+            return 0.0
+        return self._hits / (self._hits + self._misses)
+
+    def stats(self) -> dict:
+        return {"hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self.hit_rate(),
+                "nodes": self._nodes}
+
+    def start(self, board: Board, human_color: str):
+        """Starts pondering the position on board, with human_color to move, unless that position has already been
+        pondered since the last take(). The board isn't touched; the background thread works on its own copy."""
+        if self._position_key == board.key:
+            return
+        self.stop()
+        self._stop_event.clear()
+        self._position_key = board.key
+        with self._lock:
+            self._results = {}
+        self._thread = threading.Thread(target=self._ponder, args=(board.state(), board.size, human_color),
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Cancels pondering and waits for the background thread to finish."""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+    def take(self, key: int):
+        """Stops pondering and returns the pondered SearchResult for the position with this Zobrist key (the position
+        after the human's move), or None if it wasn't pondered. Counts as a ponder hit or miss, unless nothing was
+        pondered since the last take(), like before the computer's first move as black."""
+        self.stop()
+        if self._position_key is None:
+            return None
+        self._position_key = None
+        with self._lock:
+            result = self._results.get(key)
+        if result is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+        return result
+
+    def _ponder(self, state: tuple, size: int, human_color: str):
+        board = Board.from_state(state, size=size)
+        computer_color = opponent_of(human_color)
+        engine = Engine(self._table, should_stop=self._stop_event.is_set)
+        for move in order_root_moves(board, human_color):
+            if self._stop_event.is_set():
+                break
+            board.make_move(move)
+            result = engine.search(board, computer_color, self._max_depth, self._time_per_move)
+            self._nodes += result.nodes
+            # A search cut short by stop() still holds its last finished depth, but if that's only the first ply
+            # it isn't worth keeping.
+            if result.depth > 1 or not self._stop_event.is_set():
+                with self._lock:
+                    self._results[board.key] = result
+            board.unmake_move()
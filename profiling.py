@@ -0,0 +1,300 @@
+__author__ = "Ellen Whalen"
+"""Finding out where a game or an analysis run spends its time.
+
+Call counters: enable() wraps the hot paths listed in TARGETS so that each one counts its calls and the time spent
+in it, and disable() puts the original methods back. Nothing is wrapped until enable() is called, so the counters
+cost nothing while they're off. snapshot() returns the numbers, and dump_json() and dump_csv() save them.
+
+Recursive methods (Game.dfs and Engine._negamax, whose calls are the search's nodes) count every call but only
+time the outermost one, so their time isn't counted twice. Each thread keeps track of its own outermost call, so
+calls made from two threads at once, like the background move generation in LinesOfAction, are both timed and
+share the same totals.
+
+Whole runs: run_profiled() runs a function under the counters, cProfile or a simple sampling profiler, and saves
+the report. add_arguments() adds --profile and --profile-output to a command line for it, and running this file
+profiles headless games between two players (see tournament.parse_player)."""
+
+import argparse
+import cProfile
+import csv
+import functools
+import importlib
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+
+# (module, class, method) for every method the counters wrap. The rendering methods only run with a window open.
+TARGETS = (("board", "Board", "find_moves"),
+           ("board", "Board", "count_pieces"),
+           ("board", "Board", "move_piece"),
+           ("board", "Board", "make_move"),
+           ("board", "Board", "unmake_move"),
+           ("board", "Board", "generate_moves"),
+           ("game", "Game", "check_board"),
+           ("game", "Game", "dfs"),
+           ("engine", "Engine", "search"),
+           ("engine", "Engine", "_negamax"),
+           ("mcts", "MCTSPlayer", "search"),
+           ("lines_of_action", "LinesOfAction", "draw_board"),
+           ("lines_of_action", "LinesOfAction", "show_possible_moves"),
+           ("lines_of_action", "LinesOfAction", "select_piece"),
+           ("lines_of_action", "LinesOfAction", "deselect_piece"),
+           ("lines_of_action", "LinesOfAction", "show_move"),
+           ("lines_of_action", "LinesOfAction", "_redraw_pieces"))
+
+MODES = ("counters", "cprofile", "sampling")
+CSV_FIELDS = ("name", "calls", "seconds", "mean_us")
+
+# name -> [calls, seconds], for every method wrapped since the last reset().
+_stats = {}
+# (class, method name) -> the original method, for every method wrapped right now.
+_originals = {}
+
+
+def _wrap(name: str, method):
+    """Wraps a method so that it adds to the stats for name."""
+    stats = _stats.setdefault(name, [0, 0.0])
+    perf_counter = time.perf_counter
+    # Whether each thread is already inside the method, so only its outermost call is timed.
+    running = threading.local()
+    # Adding to the totals is a read and then a write, so two threads adding at once could lose one of them.
+    lock = threading.Lock()
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with lock:
+            stats[0] += 1
+        if getattr(running, "inside", False):
+            return method(*args, **kwargs)
+        running.inside = True
+        start = perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            elapsed = perf_counter() - start
+            with lock:
+                stats[1] += elapsed
+            running.inside = False
+
+    return wrapper
+
+
+def enable(targets=TARGETS):
+    """Starts counting calls to the targets (see TARGETS). Targets that are already being counted are left alone."""
+    for module_name, class_name, method_name in targets:
+        cls = getattr(importlib.import_module(module_name), class_name)
+        if (cls, method_name) not in _originals:
+            method = cls.__dict__[method_name]
+            _originals[(cls, method_name)] = method
+            setattr(cls, method_name, _wrap(f"{class_name}.{method_name}", method))
+
+
+def disable():
+    """Puts back every method enable() wrapped. The counts so far are kept until reset()."""
+    for (cls, method_name), method in _originals.items():
+        setattr(cls, method_name, method)
+    _originals.clear()
+
+
+def is_enabled() -> bool:
+    return bool(_originals)
+
+
+def reset():
+    """Zeroes the counts."""
+    for stats in _stats.values():
+        stats[0] = 0
+        stats[1] = 0.0
+
+
+def snapshot() -> dict:
+    """Returns {name: {"calls", "seconds", "mean_us"}} for every method counted so far, slowest first."""
+    rows = {}
+    for name, (calls, seconds) in sorted(_stats.items(), key=lambda item: -item[1][1]):
+        rows[name] = {"calls": calls,
+                      "seconds": seconds,
+                      "mean_us": seconds / calls * 1e6 if calls else 0.0}
+    return rows
+
+
+def dump_json(path: str, rows: dict = None):
+    """Saves a snapshot (by default, a new one) as JSON."""
+    with open(path, "w") as file:
+        json.dump(snapshot() if rows is None else rows, file, indent=2)
+
+
+def dump_csv(path: str, rows: dict = None):
+    """Saves a snapshot (by default, a new one) as CSV, one row per method."""
+    rows = snapshot() if rows is None else rows
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, CSV_FIELDS)
+        writer.writeheader()
+        for name, row in rows.items():
+            writer.writerow({"name": name, **row})
+
+
+def format_snapshot(rows: dict) -> str:
+    lines = [f"{'method':<34} {'calls':>10} {'seconds':>10} {'mean us':>10}"]
+    for name, row in rows.items():
+        if row["calls"]:
+            lines.append(f"{name:<34} {row['calls']:>10} {row['seconds']:>10.3f} {row['mean_us']:>10.2f}")
+    return "\n".join(lines)
+
+
+class SamplingProfiler:
+    """Looks at what one thread is running every interval seconds, from a background thread, and counts how often
+    each function was running (self) and how often it was anywhere on the stack (total). It slows the profiled
+    thread down far less than cProfile, at the cost of only seeing a sample."""
+
+    def __init__(self, interval: float = 0.001, thread_id: int = None):
+        self._interval = interval
+        self._thread_id = threading.get_ident() if thread_id is None else thread_id
+        self._self_counts = {}
+        self._total_counts = {}
+        self._samples = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._switch_interval = None
+
+    @property
+    def samples(self):
+        return self._samples
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        # The sampling thread only runs when the profiled thread lets go of the GIL, which by default it does every
+        # 5 ms, so that's shortened to the sampling interval while sampling.
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch_interval, self._interval))
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            sys.setswitchinterval(self._switch_interval)
+
+    def _run(self):
+        while not self._stop_event.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            self._samples += 1
+            seen = set()
+            top = True
+            while frame is not None:
+                code = frame.f_code
+                name = f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}({code.co_name})"
+                if top:
+                    self._self_counts[name] = self._self_counts.get(name, 0) + 1
+                    top = False
+                if name not in seen:
+                    seen.add(name)
+                    self._total_counts[name] = self._total_counts.get(name, 0) + 1
+                frame = frame.f_back
+
+    def results(self) -> dict:
+        """Returns {function: {"self", "total"}}, as fractions of all samples, most often running first."""
+        samples = self._samples or 1
+        return {name: {"self": self._self_counts.get(name, 0) / samples, "total": total / samples}
+                for name, total in sorted(self._total_counts.items(),
+                                          key=lambda item: (-self._self_counts.get(item[0], 0), -item[1]))}
+
+    def report(self, limit: int = 25) -> str:
+        lines = [f"{self._samples} samples, every {self._interval * 1000:g} ms",
+                 f"{'self':>7} {'total':>7}  function"]
+        for name, row in list(self.results().items())[:limit]:
+            lines.append(f"{row['self']:>7.1%} {row['total']:>7.1%}  {name}")
+        return "\n".join(lines)
+
+
+def run_profiled(function, mode: str, output: str = None):
+    """Runs function() under a profiler, prints a report, saves it to output if given, and returns what function
+    returned. mode is "counters" (enable() around the run; output is JSON, or CSV if it ends in .csv), "cprofile"
+    (output is a pstats file for snakeviz or pstats) or "sampling" (output is JSON)."""
+    if mode not in MODES:
+        raise ValueError(f"\"{mode}\" isn't a way to profile; try one of {', '.join(MODES)}.")
+    if mode == "counters":
+        was_enabled = is_enabled()
+        reset()
+        enable()
+        try:
+            result = function()
+        finally:
+            if not was_enabled:
+                disable()
+        rows = snapshot()
+        print(format_snapshot(rows))
+        if output is not None:
+            if output.endswith(".csv"):
+                dump_csv(output, rows)
+            else:
+                dump_json(output, rows)
+    elif mode == "cprofile":
+        profiler = cProfile.Profile()
+        result = profiler.runcall(function)
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(25)
+        print(text.getvalue())
+        if output is not None:
+            profiler.dump_stats(output)
+    else:
+        with SamplingProfiler() as profiler:
+            result = function()
+        print(profiler.report())
+        if output is not None:
+            with open(output, "w") as file:
+                json.dump({"samples": profiler.samples, "functions": profiler.results()}, file, indent=2)
+    return result
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Adds --profile and --profile-output to a command line, for run_profiled."""
+    parser.add_argument("--profile", choices=MODES, default=None,
+                        help="profile the run with call counters, cProfile or a sampling profiler")
+    parser.add_argument("--profile-output", default=None,
+                        help="save the profile here (JSON or .csv for counters, a pstats file for cprofile, JSON "
+                             "for sampling)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile headless games between two computer players.")
+    parser.add_argument("mode", choices=MODES)
+    parser.add_argument("--first", default="engine:depth=2", help="a player spec (see tournament.py)")
+    parser.add_argument("--second", default="greedy", help="the other player spec")
+    parser.add_argument("--games", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="where to save the profile")
+    args = parser.parse_args()
+    from tournament import parse_player, play_game
+    for spec in (args.first, args.second):
+        parse_player(spec)
+
+    def games():
+        results = []
+        for n in range(args.games):
+            black, white = (args.first, args.second) if n % 2 == 0 else (args.second, args.first)
+            results.append(play_game(black, white, args.seed + 2 * n))
+        return results
+
+    start = time.perf_counter()
+    results = run_profiled(games, args.mode, args.output)
+    moves = sum(result["moves"] for result in results)
+    print(f"{len(results)} games, {moves} moves in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+__author__ = "Ellen Whalen"
+"""Recording games: a compact binary archive format, a readable move notation, and readers that stream games back
+out of an archive without loading all of it.
+
+An archive starts with MAGIC and then holds one record after another. Each record is a GAME_HEADER (the result,
+some flags, the number of moves and the length of the metadata), then the metadata as UTF-8 JSON, then, only for
+games that didn't start from the usual position, the start position as two 64-bit bitboards, and finally each move
+as a 2-byte little-endian board.encode_move number. A pass is a move from a square to itself, like in
+Game.history."""
+
+import json
+import mmap
+import os
+import struct
+from board import Board, move_name, parse_move
+from game import DRAW, O_WINS, X_WINS, Game, is_pass
+
+MAGIC = b"LOA\x01"
+GAME_HEADER = struct.Struct("<BBHH")
+START_POSITION = struct.Struct("<QQ")
+MOVE = struct.Struct("<H")
+
+# How a game's result is stored, and the other way around.
+RESULT_CODES = {None: 0, X_WINS: 1, O_WINS: 2, DRAW: 3}
+RESULTS = {code: result for result, code in RESULT_CODES.items()}
+
+# Header flags: the game started from a position of its own, and (within that) white moved first.
+CUSTOM_START = 1
+O_STARTS = 2
+
+PASS_NAME = "pass"
+
+
+def _play(board: Board, move: int):
+    if is_pass(move):
+        board.pass_turn()
+    else:
+        board.make_move(move)
+
+
+class GameRecord:
+    """One recorded game: its moves (encoded, see board.encode_move), its result (None if it wasn't finished, or
+    X_WINS, O_WINS or DRAW), a dict of metadata (players, dates, anything JSON can hold), and the position it started
+    from as a Board.state() tuple, or None for the usual start."""
+
+    def __init__(self, moves: list[int], result: str = None, metadata: dict = None, start: tuple = None):
+        if result not in RESULT_CODES:
+            raise ValueError(f"{result!r} isn't a game result.")
+        self._moves = list(moves)
+        self._result = result
+        self._metadata = {} if metadata is None else dict(metadata)
+        self._start = start
+
+    @classmethod
+    def from_game(cls, game: Game, metadata: dict = None, start: tuple = None):
+        """Records a Game that started from start (a Board.state() tuple), or from the usual position."""
+        return cls(game.history, game.result, metadata, start)
+
+    @property
+    def moves(self):
+        return self._moves
+
+    @property
+    def result(self):
+        return self._result
+
+    @property
+    def metadata(self):
+        return self._metadata
+
+    @property
+    def start(self):
+        return self._start
+
+    def __len__(self):
+        return len(self._moves)
+
+    def __eq__(self, other):
+        if not isinstance(other, GameRecord):
+            return NotImplemented
+        return (self._moves == other._moves and self._result == other._result
+                and self._metadata == other._metadata and self._start == other._start)
+
+    def __repr__(self):
+        return f"GameRecord({len(self._moves)} moves, result={self._result!r})"
+
+    def start_board(self) -> Board:
+        if self._start is None:
+            return Board()
+        return Board.from_state(self._start)
+
+    def replay(self):
+        """Plays the game through on a Board, yielding (move, board) after each move. It's the same board every
+        time, moved on in place, so take board.state() to keep a position."""
+        board = self.start_board()
+        for move in self._moves:
+            _play(board, move)
+            yield move, board
+
+    def final_board(self) -> Board:
+        board = self.start_board()
+        for move in self._moves:
+            _play(board, move)
+        return board
+
+    def notation(self) -> str:
+        """The moves in readable notation, like "b8-b6 a2-c2 pass ...", followed by the result if there is one."""
+        names = [PASS_NAME if is_pass(move) else move_name(move) for move in self._moves]
+        if self._result is not None:
+            names.append(self._result)
+        return " ".join(names)
+
+    def to_bytes(self) -> bytes:
+        metadata = json.dumps(self._metadata, separators=(",", ":")).encode() if self._metadata else b""
+        flags = 0
+        start = b""
+        if self._start is not None:
+            flags |= CUSTOM_START
+            if self._start[2] == "O":
+                flags |= O_STARTS
+            start = START_POSITION.pack(self._start[0], self._start[1])
+        header = GAME_HEADER.pack(RESULT_CODES[self._result], flags, len(self._moves), len(metadata))
+        return header + metadata + start + struct.pack(f"<{len(self._moves)}H", *self._moves)
+
+
+def parse_notation(text: str, metadata: dict = None, start: tuple = None) -> GameRecord:
+    """Reads a game back out of GameRecord.notation(). A pass is written as a move from a square to itself, so
+    passes read back as a move from the first square of the board."""
+    words = text.split()
+    result = None
+    if words and words[-1] in (X_WINS, O_WINS, DRAW):
+        result = words.pop()
+    moves = [0 if word == PASS_NAME else parse_move(word) for word in words]
+    return GameRecord(moves, result, metadata, start)
+
+
+def read_record(buffer, offset: int) -> tuple:
+    """Reads one record out of a bytes-like object (bytes, a memoryview or an mmap) starting at offset, and returns
+    (record, offset of the next record)."""
+    result_code, flags, move_count, metadata_length = GAME_HEADER.unpack_from(buffer, offset)
+    offset += GAME_HEADER.size
+    metadata = None
+    if metadata_length:
+        metadata = json.loads(bytes(buffer[offset:offset + metadata_length]))
+        offset += metadata_length
+    start = None
+    if flags & CUSTOM_START:
+        x_bits, o_bits = START_POSITION.unpack_from(buffer, offset)
+        start = (x_bits, o_bits, "O" if flags & O_STARTS else "X")
+        offset += START_POSITION.size
+    moves = struct.unpack_from(f"<{move_count}H", buffer, offset)
+    offset += MOVE.size * move_count
+    if result_code not in RESULTS:
+        raise ValueError(f"A game record can't have result code {result_code}.")
+    return GameRecord(moves, RESULTS[result_code], metadata, start), offset
+
+
+class GameWriter:
+    """Appends games to an archive file, writing MAGIC first if the file is new. Use it as a context manager, or
+    call close() when done."""
+
+    def __init__(self, path: str):
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._games = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def games(self):
+        """How many games this writer has written."""
+        return self._games
+
+    def write(self, record: GameRecord):
+        self._file.write(record.to_bytes())
+        self._games += 1
+
+    def write_game(self, game: Game, metadata: dict = None, start: tuple = None):
+        """Records a Game, usually once it's over."""
+        self.write(GameRecord.from_game(game, metadata, start))
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def _check_magic(magic: bytes, path: str):
+    if magic != MAGIC:
+        raise ValueError(f"{path} isn't a game archive.")
+
+
+def iter_games(buffer):
+    """Yields every GameRecord in an archive that's already in memory (or mapped into it)."""
+    _check_magic(bytes(buffer[:len(MAGIC)]), "That buffer")
+    offset = len(MAGIC)
+    while offset < len(buffer):
+        record, offset = read_record(buffer, offset)
+        yield record
+
+
+def read_games(path: str, use_mmap: bool = True):
+    """Yields every GameRecord in an archive file, one at a time, so the whole file never has to be held as Python
+    objects. With use_mmap the file is mapped into memory and the operating system pages it in as it's read;
+    otherwise it's read record by record."""
+    if use_mmap:
+        if os.path.getsize(path) == 0:
+            raise ValueError(f"{path} isn't a game archive.")
+        with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield from iter_games(mapped)
+        return
+    with open(path, "rb") as file:
+        _check_magic(file.read(len(MAGIC)), path)
+        while True:
+            header = file.read(GAME_HEADER.size)
+            if not header:
+                return
+            result_code, flags, move_count, metadata_length = GAME_HEADER.unpack(header)
+            length = metadata_length + MOVE.size * move_count
+            if flags & CUSTOM_START:
+                length += START_POSITION.size
+            record, offset = read_record(header + file.read(length), 0)
+            yield record
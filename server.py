@@ -0,0 +1,351 @@
+__author__ = "Ellen Whalen"
+"""A game server: many games of Lines of Action at once, human against engine or engine against engine, played
+over TCP or a Unix socket from one asyncio process. The rules and win checks are Game's. Engine moves are worked
+out on an executor (a pool of processes by default), so a slow search never holds up the other games.
+
+The protocol is JSON lines. Each request is one JSON object on one line, with an "op" and, if the client likes, an
+"id" that's copied into the reply. Every reply is one line too: {"id": ..., "ok": true, ...}, or
+{"id": ..., "ok": false, "error": "..."}. Replies on one connection can come back in any order when requests
+overlap, so clients that send more than one request at a time should use ids. The ops are:
+
+    new    {"black": "human", "white": "engine:depth=2", "size": 8, "seed": 0}, where each player is "human" or a
+           player spec (see tournament.parse_player). Any engine moves up to the first human turn are played before
+           the reply, which holds the new game's "game" id and its state.
+    move   {"game": id, "move": "b8-b6"}: plays a human move, then the engine's replies, and returns the state.
+    play   {"game": id}: plays engine moves until a human's turn or the end of the game, and returns the state.
+    state  {"game": id}
+    close  {"game": id}: forgets a game.
+    stats  how many games are open and have been played, and how long the searches took.
+
+A game's state is its "game" id, "size", the board as "fen" (see Board.to_fen), "turn", "result" (None until it's
+over, then "X", "O" or "draw"), "moves" (the moves this request played, by name, with "pass" for a pass), and,
+when it's a human's turn, "legal" (every legal move, by name)."""
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from board import DIM, Board, move_name, parse_move
+from game import Game, is_pass
+from tournament import Player, parse_player
+
+HUMAN = "human"
+PASS_NAME = "pass"
+
+# Each executor thread or process keeps one Player per spec, so an engine's tables carry over between its moves.
+# The player is reseeded for every move, so random and MCTS players make the same moves in a game with the same seed,
+# whichever worker they land on.
+_local = threading.local()
+
+
+def choose_move(spec: str, state: tuple, size: int, seed: int) -> tuple:
+    """Runs on the executor: picks the move a player spec makes in a position, and returns (move, seconds taken)."""
+    start = time.perf_counter()
+    players = getattr(_local, "players", None)
+    if players is None:
+        players = _local.players = {}
+    player = players.get(spec)
+    if player is None:
+        player = players[spec] = Player(spec, seed)
+    player.reseed(seed)
+    move = player.choose_move(Board.from_state(state, size=size))
+    return move, time.perf_counter() - start
+
+
+class ServerGame:
+    """One game being played on the server: the Game, who plays each color, and a lock so that requests for the
+    same game are dealt with one at a time. The board has no position cache, to keep each game small."""
+    __slots__ = ("_id", "_game", "_players", "_seed", "_lock")
+
+    def __init__(self, game_id: int, black: str, white: str, size: int = DIM, seed: int = 0):
+        for spec in (black, white):
+            if spec != HUMAN:
+                parse_player(spec)
+        self._id = game_id
+        self._game = Game(Board(size=size))
+        self._players = {"X": black, "O": white}
+        self._seed = seed
+        self._lock = asyncio.Lock()
+
+    @property
+    def id(self):
+        return self._id
+
+    @property
+    def game(self):
+        return self._game
+
+    @property
+    def seed(self):
+        return self._seed
+
+    @property
+    def lock(self):
+        return self._lock
+
+    def player(self, color: str) -> str:
+        return self._players[color]
+
+    @property
+    def is_human_turn(self) -> bool:
+        return not self._game.is_over and self._players[self._game.turn] == HUMAN
+
+    def move_names(self, moves: list[int]) -> list[str]:
+        size = self._game.board.size
+        return [PASS_NAME if is_pass(move, size) else move_name(move, size) for move in moves]
+
+    def state(self, moves: list[int] = ()) -> dict:
+        """The game's state for a reply (see the module's docstring), with moves as the moves just played."""
+        board = self._game.board
+        state = {"game": self._id,
+                 "size": board.size,
+                 "fen": board.to_fen(),
+                 "turn": self._game.turn,
+                 "result": self._game.result,
+                 "moves": self.move_names(moves)}
+        if self.is_human_turn:
+            state["legal"] = self.move_names(self._game.legal_moves())
+        return state
+
+
+class GameServer:
+    """Hosts games for any number of connections. Engine moves are worked out on executor, which by default is a
+    pool of worker processes made when the server starts. At most max_games games can be open at once."""
+
+    def __init__(self, executor=None, max_games: int = 10000):
+        self._executor = executor
+        self._owns_executor = False
+        self._max_games = max_games
+        self._games = {}
+        self._next_id = 1
+        self._server = None
+        # The writer and task of every open connection, so close() can hang up on them.
+        self._connections = {}
+        self._requests = 0
+        self._started = 0
+        self._finished = 0
+        self._searches = 0
+        self._search_seconds = 0.0
+
+    @property
+    def games(self):
+        return self._games
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0, path: str = None):
+        """Starts listening on a TCP host and port (port 0 picks a free one), or on a Unix socket at path."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor()
+            self._owns_executor = True
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self.serve_connection, path)
+        else:
+            self._server = await asyncio.start_server(self.serve_connection, host, port)
+        return self._server
+
+    @property
+    def address(self):
+        """Where the server is listening: (host, port) for TCP, or the socket's path."""
+        return self._server.sockets[0].getsockname()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            # Hanging up makes each connection's reader see the end of its stream, so its task finishes cleanly.
+            for writer in list(self._connections):
+                writer.close()
+            await asyncio.gather(*self._connections.values(), return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+        if self._owns_executor:
+            self._executor.shutdown()
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Reads requests off one connection until it closes, answering each one as soon as it's done."""
+        write_lock = asyncio.Lock()
+        tasks = set()
+        self._connections[writer] = asyncio.current_task()
+
+        async def answer(line: bytes):
+            reply = await self.handle_line(line)
+            async with write_lock:
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.ensure_future(answer(line))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            del self._connections[writer]
+            writer.close()
+
+    async def handle_line(self, line: bytes) -> dict:
+        """Answers one line of the protocol."""
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {"id": None, "ok": False, "error": "That isn't JSON."}
+        if not isinstance(request, dict):
+            return {"id": None, "ok": False, "error": "A request has to be a JSON object."}
+        return await self.handle(request)
+
+    async def handle(self, request: dict) -> dict:
+        """Answers one request (see the module's docstring)."""
+        self._requests += 1
+        op = request.get("op")
+        handler = {"new": self._new, "move": self._move, "play": self._play, "state": self._state,
+                   "close": self._close, "stats": self._stats}.get(op)
+        try:
+            if handler is None:
+                raise ValueError(f"\"{op}\" isn't an op.")
+            reply = await handler(request)
+        except (ValueError, KeyError, TypeError) as error:
+            message = str(error) if isinstance(error, ValueError) else f"Bad request: {error!r}."
+            return {"id": request.get("id"), "ok": False, "error": message}
+        except Exception as error:
+            # Whatever else goes wrong, the client still gets a reply rather than waiting for one forever.
+            return {"id": request.get("id"), "ok": False, "error": f"The server couldn't answer that: {error!r}."}
+        reply["id"] = request.get("id")
+        reply["ok"] = True
+        return reply
+
+    @staticmethod
+    def _text(request: dict, field: str, default: str = None) -> str:
+        """A request's field that has to be a string, like a player spec or a move's name."""
+        value = request.get(field, default)
+        if not isinstance(value, str):
+            raise ValueError(f"\"{field}\" has to be a string.")
+        return value
+
+    def _find(self, request: dict) -> ServerGame:
+        server_game = self._games.get(request["game"])
+        if server_game is None:
+            raise ValueError(f"There's no game {request['game']}.")
+        return server_game
+
+    async def _play_engines(self, server_game: ServerGame) -> list[int]:
+        """Plays engine moves until it's a human's turn or the game is over, and returns the moves played."""
+        game = server_game.game
+        loop = asyncio.get_running_loop()
+        played = []
+        while not game.is_over and server_game.player(game.turn) != HUMAN:
+            length = len(game.history)
+            move, seconds = await loop.run_in_executor(self._executor, choose_move, server_game.player(game.turn),
+                                                       game.board.state(), game.board.size,
+                                                       server_game.seed + length)
+            self._searches += 1
+            self._search_seconds += seconds
+            game.play(move)
+            # Playing a move can also record passes for a color left with no moves.
+            played += game.history[length:]
+        return played
+
+    def _note_finished(self, server_game: ServerGame, was_over: bool):
+        if server_game.game.is_over and not was_over:
+            self._finished += 1
+
+    async def _new(self, request: dict) -> dict:
+        if len(self._games) >= self._max_games:
+            raise ValueError("The server is full.")
+        server_game = ServerGame(self._next_id, self._text(request, "black", HUMAN), self._text(request, "white", HUMAN),
+                                 int(request.get("size", DIM)), int(request.get("seed", 0)))
+        self._next_id += 1
+        # The game holds its place towards max_games while its first engine moves are played, but if they fail the
+        # client never learns its id, so it's forgotten again.
+        self._games[server_game.id] = server_game
+        try:
+            async with server_game.lock:
+                played = await self._play_engines(server_game)
+        except BaseException:
+            del self._games[server_game.id]
+            raise
+        self._started += 1
+        self._note_finished(server_game, False)
+        return server_game.state(played)
+
+    async def _move(self, request: dict) -> dict:
+        server_game = self._find(request)
+        async with server_game.lock:
+            game = server_game.game
+            if game.is_over:
+                raise ValueError("The game is already over.")
+            if not server_game.is_human_turn:
+                raise ValueError("It isn't a human's turn.")
+            move = parse_move(self._text(request, "move"), game.board.size)
+            length = len(game.history)
+            game.play(move)
+            played = game.history[length:]
+            played += await self._play_engines(server_game)
+            self._note_finished(server_game, False)
+            return server_game.state(played)
+
+    async def _play(self, request: dict) -> dict:
+        server_game = self._find(request)
+        async with server_game.lock:
+            was_over = server_game.game.is_over
+            played = await self._play_engines(server_game)
+            self._note_finished(server_game, was_over)
+            return server_game.state(played)
+
+    async def _state(self, request: dict) -> dict:
+        return self._find(request).state()
+
+    async def _close(self, request: dict) -> dict:
+        server_game = self._find(request)
+        del self._games[server_game.id]
+        return {"game": server_game.id}
+
+    async def _stats(self, request: dict) -> dict:
+        return {"games": len(self._games),
+                "started": self._started,
+                "finished": self._finished,
+                "requests": self._requests,
+                "searches": self._searches,
+                "search_seconds": self._search_seconds}
+
+
+async def serve(host: str, port: int, path: str = None, workers: int = None, threads: bool = False,
+                max_games: int = 10000):
+    """Runs a GameServer until it's cancelled."""
+    executor = ThreadPoolExecutor(workers) if threads else ProcessPoolExecutor(workers)
+    server = GameServer(executor, max_games)
+    await server.start(host, port, path)
+    print(f"Serving Lines of Action on {server.address}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+        executor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve games of Lines of Action over JSON lines.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=None, help="engine worker processes (default: one per core)")
+    parser.add_argument("--threads", action="store_true", help="run engine searches on threads, not processes")
+    parser.add_argument("--max-games", type=int, default=10000, help="how many games can be open at once")
+    args = parser.parse_args()
+    if args.unix is not None and os.path.exists(args.unix):
+        os.remove(args.unix)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers, args.threads, args.max_games))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+__author__ = "Ellen Whalen"
+"""Board symmetries: the eight rotations and reflections of the board, and canonical forms of positions under them,
+so that caches, opening books and datasets can store each family of equivalent positions once.
+
+Rows, columns and both diagonals are all still lines after any rotation or reflection, and neighbours are still
+neighbours, so a transformed position plays exactly like the original with every move transformed the same way.
+Swapping the colors is different: the board is only checked for wins once white has moved, so a position with the
+colors swapped can end a move earlier or later. canonical_state can swap colors too, for datasets that don't care
+about that, but it's off by default."""
+
+import argparse
+from board import Board, DIM, MOVE_MASK, MOVE_SHIFT, encode_move, zobrist_key
+from cache import PositionCache
+
+IDENTITY = 0
+# A transform is three bits: mirror the columns, mirror the rows, and (first of all) swap rows with columns.
+MIRROR_COLS = 1
+MIRROR_ROWS = 2
+TRANSPOSE = 4
+TRANSFORMS = tuple(range(8))
+
+_REVERSED_BYTES = bytes(int(f"{byte:08b}"[::-1], 2) for byte in range(256))
+
+
+def _transpose(bits: int) -> int:
+    """Swaps rows with columns, i.e. moves [i][j] to [j][i], with three delta swaps."""
+    t = 0x0F0F0F0F00000000 & (bits ^ (bits << 28))
+    bits ^= t ^ (t >> 28)
+    t = 0x3333000033330000 & (bits ^ (bits << 14))
+    bits ^= t ^ (t >> 14)
+    t = 0x5500550055005500 & (bits ^ (bits << 7))
+    bits ^= t ^ (t >> 7)
+    return bits
+
+
+def _check_state(state: tuple):
+    """Raises ValueError for a state with pieces off the 8x8 board, the only size symmetries are worked out for."""
+    if (state[0] | state[1]) >> DIM * DIM:
+        raise ValueError(f"Symmetries only work on the {DIM}x{DIM} board.")
+
+
+def transform_bits(bits: int, transform: int) -> int:
+    """Rotates or reflects a bitboard."""
+    if transform & TRANSPOSE:
+        bits = _transpose(bits)
+    if transform & MIRROR_ROWS:
+        bits = int.from_bytes(bits.to_bytes(DIM, "little"), "big")
+    if transform & MIRROR_COLS:
+        bits = int.from_bytes(bits.to_bytes(DIM, "little").translate(_REVERSED_BYTES), "little")
+    return bits
+
+
+def inverse(transform: int) -> int:
+    """The transform that undoes another. Mirrors undo themselves, but after a transpose, mirroring the rows undoes
+    mirroring the columns and the other way around."""
+    if transform & TRANSPOSE:
+        return TRANSPOSE | (transform & MIRROR_COLS) << 1 | (transform & MIRROR_ROWS) >> 1
+    return transform
+
+
+def _build_square_transforms():
+    """For every transform, where each square goes."""
+    tables = []
+    for transform in TRANSFORMS:
+        tables.append(tuple(transform_bits(1 << square, transform).bit_length() - 1 for square in range(DIM * DIM)))
+    return tuple(tables)
+
+
+SQUARE_TRANSFORMS = _build_square_transforms()
+
+
+def transform_square(square: int, transform: int) -> int:
+    return SQUARE_TRANSFORMS[transform][square]
+
+
+def transform_move(move: int, transform: int) -> int:
+    """Rotates or reflects an encoded move (see board.encode_move)."""
+    squares = SQUARE_TRANSFORMS[transform]
+    return encode_move(squares[move >> MOVE_SHIFT], squares[move & MOVE_MASK])
+
+
+def transform_moves(moves, transform: int) -> list[int]:
+    squares = SQUARE_TRANSFORMS[transform]
+    return [encode_move(squares[move >> MOVE_SHIFT], squares[move & MOVE_MASK]) for move in moves]
+
+
+def transform_state(state: tuple, transform: int) -> tuple:
+    """Rotates or reflects a Board.state() tuple."""
+    _check_state(state)
+    return transform_bits(state[0], transform), transform_bits(state[1], transform), state[2]
+
+
+def swap_colors(state: tuple) -> tuple:
+    """Swaps the colors of a Board.state() tuple, including whose turn it is. This is not an exact symmetry (see
+    the module's docstring)."""
+    return state[1], state[0], "X" if state[2] == "O" else "O"
+
+
+def canonical_state(state: tuple, with_colors: bool = False) -> tuple:
+    """Returns (canonical state, transform, swapped): the smallest of the position's eight rotations and
+    reflections, the transform that gives it, and whether the colors were swapped to get it (only ever with
+    with_colors). Every position in the same family gets the same canonical state, and moves in the original
+    position become moves in the canonical one with transform_move(move, transform)."""
+    _check_state(state)
+    x_bits, o_bits, turn = state
+    best = None
+    best_transform = IDENTITY
+    for transform in TRANSFORMS:
+        candidate = (transform_bits(x_bits, transform), transform_bits(o_bits, transform))
+        if best is None or candidate < best:
+            best = candidate
+            best_transform = transform
+    best_state = (best[0], best[1], turn)
+    if with_colors:
+        other, transform, unused = canonical_state(swap_colors(state))
+        if other[:2] < best_state[:2]:
+            return other, transform, True
+    return best_state, best_transform, False
+
+
+def canonical_transforms(state: tuple) -> list[int]:
+    """Every transform that takes a position to its canonical state. There's more than one when the position is
+    symmetrical, like the start."""
+    _check_state(state)
+    x_bits, o_bits, turn = state
+    candidates = [((transform_bits(x_bits, transform), transform_bits(o_bits, transform)), transform)
+                  for transform in TRANSFORMS]
+    best = min(candidates)[0]
+    return [transform for candidate, transform in candidates if candidate == best]
+
+
+def canonical_move(state: tuple, move: int) -> int:
+    """A move in a position, as a move in the position's canonical state. In a symmetrical position, moves that
+    mirror each other are the same canonical move."""
+    return min(transform_move(move, transform) for transform in canonical_transforms(state))
+
+
+def canonical_key(board: Board, with_colors: bool = False) -> int:
+    """The Zobrist key of a board's canonical state, shared by every position in its family. Only for 8x8 boards."""
+    if board.size != DIM:
+        raise ValueError(f"Symmetries only work on the {DIM}x{DIM} board.")
+    state, transform, swapped = canonical_state(board.state(), with_colors)
+    return zobrist_key(*state)
+
+
+def measure(states: list[tuple], cache_capacity: int = 1024) -> dict:
+    """Measures what canonicalization saves on a stream of positions: how many distinct positions there are with
+    and without it, and the hit rate of a PositionCache of cache_capacity entries fed the stream with either key."""
+    plain = set()
+    canonical = set()
+    with_colors = set()
+    plain_cache = PositionCache(cache_capacity)
+    canonical_cache = PositionCache(cache_capacity)
+    for state in states:
+        canonical_form = canonical_state(state)[0]
+        plain.add(state)
+        canonical.add(canonical_form)
+        with_colors.add(canonical_state(state, True)[0])
+        for cache, key in ((plain_cache, state), (canonical_cache, canonical_form)):
+            if cache.get(key) is None:
+                cache.put(key, True)
+    return {"positions": len(states),
+            "distinct": len(plain),
+            "distinct_canonical": len(canonical),
+            "distinct_with_colors": len(with_colors),
+            "saving": 1 - len(canonical) / len(plain) if plain else 0.0,
+            "cache_hit_rate": plain_cache.hit_rate(),
+            "canonical_cache_hit_rate": canonical_cache.hit_rate()}
+
+
+def search_tree_states(board: Board, depth: int) -> list[tuple]:
+    """Every position visited by a full search of some depth from a board, in the order a search visits them."""
+    states = [board.state()]
+    if depth > 0:
+        for move in board.generate_moves(board.turn):
+            board.make_move(move)
+            states += search_tree_states(board, depth - 1)
+            board.unmake_move()
+    return states
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how much symmetry canonicalization saves.")
+    parser.add_argument("--depth", type=int, default=3, help="depth of the search tree to measure from the start")
+    parser.add_argument("--cache", type=int, default=4096, help="entries in the simulated cache")
+    parser.add_argument("--archive", default=None, help="also measure every position in this game archive")
+    args = parser.parse_args()
+    streams = {f"search tree, depth {args.depth}": search_tree_states(Board(), args.depth)}
+    if args.archive is not None:
+        from records import read_games
+        states = []
+        for record in read_games(args.archive):
+            states += [board.state() for move, board in record.replay()]
+        streams[args.archive] = states
+    for name, states in streams.items():
+        result = measure(states, args.cache)
+        print(f"{name}: {result['positions']} positions, {result['distinct']} distinct, "
+              f"{result['distinct_canonical']} canonical ({result['saving']:.1%} fewer), "
+              f"{result['distinct_with_colors']} with colors swapped too")
+        print(f"  cache of {args.cache}: hit rate {result['cache_hit_rate']:.1%} plain, "
+              f"{result['canonical_cache_hit_rate']:.1%} canonical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+__author__ = "Ellen Whalen"
+"""Board geometry worked out once per board size: for every square its neighbours, its rays in the eight
+directions, the lines it lies on, and the other per-square tables Board keeps its totals with. Move generation,
+connectivity checks and evaluation index into these instead of working out ranges and line ends on every call.
+
+tables_for(dim) builds the tables for a dim x dim board the first time it's asked for and hands back the same
+Tables after that. The module-level constants are the tables for the usual 8x8 board."""
+
+import functools
+import random
+
+DIM = 8
+# The smallest and largest boards that can be built. Squares have to fit in a move's 8 bits (see Tables.move_shift)
+# and columns need a letter each.
+MIN_DIM = 4
+MAX_DIM = 16
+
+# Squares are numbered row * dim + col, and square n is bit n of a color's bitboard.
+# The eight directions a piece can move in, in the order find_moves has always reported them: along the row,
+# along the column, along the upper-left to lower-right diagonal and along the lower-left to upper-right diagonal.
+DIRECTIONS = ((0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (-1, -1), (-1, 1), (1, -1))
+
+# A color's moments are the totals of its pieces' rows, columns and squared rows plus columns, packed into one int
+# MOMENT_SHIFT bits apart, so one addition moves a piece. None of the totals can go negative, so they never borrow
+# from each other.
+MOMENT_SHIFT = 16
+MOMENT_MASK = (1 << MOMENT_SHIFT) - 1
+
+
+def quad_value(top_left: int, top_right: int, bottom_left: int, bottom_right: int) -> int:
+    """What one 2x2 quad of squares adds to four times a color's Euler number (its number of groups minus its number
+    of holes, counting diagonal neighbours as connected): +1 for a quad with one piece, -1 for three, -2 for two
+    diagonal pieces, and 0 for anything else."""
+    count = top_left + top_right + bottom_left + bottom_right
+    if count == 1:
+        return 1
+    if count == 3:
+        return -1
+    if count == 2 and top_left == bottom_right:
+        return -2
+    return 0
+
+
+def _build_line_masks(dim: int):
+    """Builds one bitboard mask for every row, column and diagonal on the board."""
+    row_masks = [0] * dim
+    col_masks = [0] * dim
+    neg_diag_masks = [0] * (2 * dim - 1)
+    pos_diag_masks = [0] * (2 * dim - 1)
+    for row in range(dim):
+        for col in range(dim):
+            bit = 1 << (row * dim + col)
+            row_masks[row] |= bit
+            col_masks[col] |= bit
+            neg_diag_masks[col - row + dim - 1] |= bit
+            pos_diag_masks[row + col] |= bit
+    return tuple(row_masks), tuple(col_masks), tuple(neg_diag_masks), tuple(pos_diag_masks)
+
+
+def _build_rays(dim: int):
+    """For every square and direction, builds a tuple of (destination, squares jumped over) pairs, one for every
+    distance a piece could travel, with the jumped-over squares stored as a bitboard mask."""
+    rays = []
+    for row in range(dim):
+        for col in range(dim):
+            square_rays = []
+            for d_row, d_col in DIRECTIONS:
+                steps = []
+                between = 0
+                i = row + d_row
+                j = col + d_col
+                while 0 <= i < dim and 0 <= j < dim:
+                    steps.append((i * dim + j, between))
+                    between |= 1 << (i * dim + j)
+                    i += d_row
+                    j += d_col
+                square_rays.append(tuple(steps))
+            rays.append(tuple(square_rays))
+    return tuple(rays)
+
+
+def _build_square_lines(dim: int):
+    """For every square, finds the indices of its row, column, and two diagonals in Board's line counts.
+    Rows come first, then columns, then upper-left to lower-right diagonals, then lower-left to upper-right ones."""
+    square_lines = []
+    for row in range(dim):
+        for col in range(dim):
+            square_lines.append((row,
+                                 dim + col,
+                                 2 * dim + col - row + dim - 1,
+                                 4 * dim - 1 + row + col))
+    return tuple(square_lines)
+
+
+def _build_neighbours(dim: int):
+    """For every square, the squares touching it (up to eight, fewer on the edges) from the top left to the bottom
+    right, and the same as a bitboard."""
+    neighbours = []
+    masks = []
+    for row in range(dim):
+        for col in range(dim):
+            squares = tuple((row + d_row) * dim + col + d_col for d_row in (-1, 0, 1) for d_col in (-1, 0, 1)
+                            if (d_row or d_col) and 0 <= row + d_row < dim and 0 <= col + d_col < dim)
+            neighbours.append(squares)
+            masks.append(sum(1 << square for square in squares))
+    return tuple(neighbours), tuple(masks)
+
+
+def _build_square_shapes(dim: int, neighbours: tuple, neighbour_masks: tuple):
+    """For every square: a mask of its neighbours, a dict from each arrangement of neighbours (the color's bits under
+    that mask) to how much four times the Euler number changes when a piece is put on the square (the change in value
+    of the four quads it shares), and what a piece there adds to its color's packed moments."""
+    shapes = []
+    for square in range(dim * dim):
+        row, col = divmod(square, dim)
+        offsets = [(neighbour // dim - row, neighbour % dim - col) for neighbour in neighbours[square]]
+        deltas = {}
+        for arrangement in range(1 << len(offsets)):
+            block = [[0] * 3 for i in range(3)]
+            bits = 0
+            for k, (row_offset, col_offset) in enumerate(offsets):
+                if arrangement >> k & 1:
+                    block[row_offset + 1][col_offset + 1] = 1
+                    bits |= 1 << ((row + row_offset) * dim + col + col_offset)
+            delta = 0
+            for middle in (0, 1):
+                block[1][1] = middle
+                sign = 1 if middle else -1
+                for i in (0, 1):
+                    for j in (0, 1):
+                        delta += sign * quad_value(block[i][j], block[i][j + 1], block[i + 1][j], block[i + 1][j + 1])
+            deltas[bits] = delta
+        shapes.append((neighbour_masks[square], deltas,
+                       row | col << MOMENT_SHIFT | (row * row + col * col) << 2 * MOMENT_SHIFT))
+    return tuple(shapes)
+
+
+def _build_zobrist_keys(dim: int):
+    """Builds one random 64-bit key per color per square, plus one for "O" being the side to move. The generator
+    is seeded so every process agrees on the keys, which lets keys be stored and compared between runs. Each size
+    gets its own seed, so positions on boards of different sizes don't share keys; the usual board keeps the seed
+    it has always had, so stored keys stay valid."""
+    generator = random.Random(0x10A if dim == DIM else 0x10A << 8 | dim)
+    x_keys = tuple(generator.getrandbits(64) for i in range(dim * dim))
+    o_keys = tuple(generator.getrandbits(64) for i in range(dim * dim))
+    return x_keys, o_keys, generator.getrandbits(64)
+
+
+def _build_start(dim: int):
+    """The starting bitboards: black along the top and bottom rows, white down the sides, leaving the corners
+    empty."""
+    x_bits = 0
+    o_bits = 0
+    for i in range(1, dim - 1):
+        x_bits |= 1 << (0 * dim + i)
+        x_bits |= 1 << ((dim - 1) * dim + i)
+        o_bits |= 1 << (i * dim + 0)
+        o_bits |= 1 << (i * dim + dim - 1)
+    return x_bits, o_bits
+
+
+class Tables:
+    """Every precomputed table for one size of board. Get them from tables_for, which builds each size once.
+    The tables are plain attributes rather than properties, since the hot loops read them on every call."""
+    __slots__ = ("dim", "squares", "row_masks", "col_masks", "neg_diag_masks", "pos_diag_masks", "rays",
+                 "square_lines", "line_total", "move_table", "neighbours", "neighbour_masks", "square_rows",
+                 "square_cols", "square_shapes", "zobrist_x", "zobrist_o", "zobrist_o_to_move", "full_mask",
+                 "not_first_col", "not_last_col", "start_x_bits", "start_o_bits", "move_shift", "move_mask",
+                 "bitboard_bytes")
+
+    def __init__(self, dim: int):
+        if not MIN_DIM <= dim <= MAX_DIM:
+            raise ValueError(f"A board has to be from {MIN_DIM} to {MAX_DIM} squares wide, not {dim}.")
+        self.dim = dim
+        self.squares = dim * dim
+        self.row_masks, self.col_masks, self.neg_diag_masks, self.pos_diag_masks = _build_line_masks(dim)
+        self.rays = _build_rays(dim)
+        self.square_lines = _build_square_lines(dim)
+        self.line_total = 6 * dim - 2
+        # For every square, each of its eight rays paired with the index of the line count that decides how far a
+        # piece moves along it, so move generation can walk one flat tuple per square.
+        self.move_table = tuple(tuple((self.square_lines[square][direction >> 1], self.rays[square][direction])
+                                      for direction in range(8))
+                                for square in range(self.squares))
+        self.neighbours, self.neighbour_masks = _build_neighbours(dim)
+        # Each square's row and column, to save a divmod.
+        self.square_rows = tuple(square // dim for square in range(self.squares))
+        self.square_cols = tuple(square % dim for square in range(self.squares))
+        self.square_shapes = _build_square_shapes(dim, self.neighbours, self.neighbour_masks)
+        self.zobrist_x, self.zobrist_o, self.zobrist_o_to_move = _build_zobrist_keys(dim)
+        # Masks for growing a group of pieces by one square in every direction with shifts: the whole board, and the
+        # board without its first or last column (so a shift sideways can't wrap around onto the next row).
+        self.full_mask = (1 << self.squares) - 1
+        self.not_first_col = self.full_mask & ~self.col_masks[0]
+        self.not_last_col = self.full_mask & ~self.col_masks[dim - 1]
+        self.start_x_bits, self.start_o_bits = _build_start(dim)
+        # An encoded move holds the origin square above move_shift bits and the destination below them. It's 6 bits
+        # on the usual board, as it's always been, and as many as the squares need on bigger ones.
+        self.move_shift = max(6, (self.squares - 1).bit_length())
+        self.move_mask = (1 << self.move_shift) - 1
+        # How many bytes one bitboard takes in Board.to_bytes().
+        self.bitboard_bytes = (self.squares + 7) // 8
+
+    def __repr__(self):
+        return f"Tables({self.dim})"
+
+
+@functools.lru_cache(maxsize=None)
+def tables_for(dim: int) -> Tables:
+    """The tables for a dim x dim board, built the first time they're asked for."""
+    return Tables(dim)
+
+
+_TABLES = tables_for(DIM)
+ROW_MASKS = _TABLES.row_masks
+COL_MASKS = _TABLES.col_masks
+NEG_DIAG_MASKS = _TABLES.neg_diag_masks
+POS_DIAG_MASKS = _TABLES.pos_diag_masks
+RAYS = _TABLES.rays
+SQUARE_LINES = _TABLES.square_lines
+LINE_TOTAL = _TABLES.line_total
+MOVE_TABLE = _TABLES.move_table
+NEIGHBOURS = _TABLES.neighbours
+NEIGHBOUR_MASKS = _TABLES.neighbour_masks
+SQUARE_ROWS = _TABLES.square_rows
+SQUARE_COLS = _TABLES.square_cols
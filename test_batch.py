@@ -0,0 +1,51 @@
+__author__ = "Ellen Whalen"
+"""Tests for the batch module."""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from board import Board, DIM
+from bench import random_positions
+from game import Game
+import batch
+import engine
+
+def test_from_states():
+    states = random_positions(20)
+    positions = batch.from_states(states)
+    assert positions.shape == (20, DIM, DIM)
+    assert positions.dtype == np.int8
+    my_board = Board.from_state(states[3])
+    for i in range(DIM):
+        for j in range(DIM):
+            assert positions[3, i, j] == {"X": batch.X_PIECE, "O": batch.O_PIECE, "": batch.EMPTY}[my_board.grid[i][j]]
+    assert [state[:2] for state in batch.to_states(positions)] == [state[:2] for state in states]
+
+def test_batch_matches_board():
+    states = random_positions(200, seed=3)
+    positions = batch.from_states(states)
+    counts = batch.square_line_counts(positions)
+    wins = batch.check_board(positions)
+    for n, state in enumerate(states):
+        my_board = Board.from_state(state)
+        for color in ("X", "O"):
+            assert batch.piece_counts(positions, color)[n] == my_board.count_total(color)
+            assert tuple(batch.shape(positions, color)[n]) == my_board.shape(color)
+            assert batch.evaluate(positions, color)[n] == engine.evaluate(my_board, color)
+        for i in range(DIM):
+            for j in range(DIM):
+                if my_board.grid[i][j] != "":
+                    expected = my_board.count_pieces(i, j)
+                    assert {key: counts[key][n, i, j] for key in expected} == expected
+        assert {key: wins[key][n] for key in wins} == Game(Board.from_state(state)).check_board()
+
+def test_batch_wins():
+    my_board = Board()
+    for i in range(1, 7):
+        my_board.move_piece(0, i, 6, i)
+    positions = batch.from_boards([Board(), my_board, Board.from_state((0, 0, "X"))])
+    assert list(batch.is_connected(positions, "X")) == [False, True, False]
+    assert list(batch.euler_number(positions, "X")) == [2, 1, 0]
+    # A color with no pieces scores 0 for being spread out.
+    assert batch.disconnection(positions, "X")[2] == 0
@@ -1,8 +1,10 @@
 __author__ = "Ellen Whalen"
 """Tests for the board class."""
 
+import pickle
 import pytest
-from board import Board
+from board import Board, DIM, encode_move, decode_move
+from cache import PositionCache
 
 def test_move_piece():
     my_board = Board()
@@ -64,3 +66,191 @@ def test_find_moves():
     assert moves == [(3, 1), (6, 4), (0, 4), (5, 6), (1, 2), (5, 2)]
    
 
+
+def test_bitboards():
+    my_board = Board()
+    assert my_board.x_bits == 0x7e0000000000007e
+    assert my_board.o_bits == 0x0081818181818100
+    # Writing through grid updates the bitboards, and reading it back gives the same strings as before.
+    my_board.grid[0][1] = ""
+    my_board.grid[3][3] = "X"
+    assert my_board.x_bits == 0x7e0000000800007c
+    assert my_board.grid[3][3] == "X"
+    assert my_board.grid[0] == ["", "", "X", "X", "X", "X", "X", ""]
+
+def test_line_counts():
+    # The line counts are kept up to date by move_piece instead of being recounted, so check them after a capture.
+    my_board = Board()
+    my_board.move_piece(0, 1, 1, 1)
+    my_board.move_piece(1, 0, 1, 1)
+    assert my_board.count_pieces(1, 1) == {"row_count": 2,
+                                           "col_count": 2,
+                                           "neg_diag_count": 1,
+                                           "pos_diag_count": 3}
+    my_board.grid[1][1] = ""
+    my_board.grid[1][2] = "X"
+    assert my_board.count_pieces(1, 2)["row_count"] == 2
+    assert my_board.count_pieces(1, 2)["col_count"] == 3
+
+def test_generate_moves():
+    my_board = Board()
+    moves = my_board.generate_moves("X")
+    # Every move for a color, in the same order as calling find_moves on each of its pieces in turn.
+    expected = []
+    for i in range(DIM):
+        for j in range(DIM):
+            if my_board.grid[i][j] == "X":
+                expected += [((i, j), move) for move in my_board.find_moves(i, j)]
+    assert [decode_move(move) for move in moves] == expected
+    assert len(moves) == 36
+    assert moves[0] == encode_move(1, 7)
+
+def test_make_unmake_move():
+    my_board = Board()
+    start = Board()
+    color = "X"
+    # Play a few moves, including captures, then take them all back.
+    for i in range(12):
+        moves = my_board.generate_moves(color)
+        my_board.make_move(moves[i * 7 % len(moves)])
+        color = "O" if color == "X" else "X"
+    assert my_board.x_bits != start.x_bits
+    for i in range(12):
+        my_board.unmake_move()
+    assert my_board.x_bits == start.x_bits
+    assert my_board.o_bits == start.o_bits
+    assert my_board._line_counts == start._line_counts
+    with pytest.raises(ValueError) as excinfo:
+        my_board.unmake_move()
+    assert str(excinfo.value) == "There is no move to take back."
+
+def test_zobrist_key():
+    my_board = Board()
+    other_board = Board()
+    start_key = my_board.key
+    # The same position reached in a different order has the same key.
+    my_board.move_piece(0, 1, 2, 1)
+    my_board.move_piece(1, 0, 1, 2)
+    my_board.move_piece(0, 6, 2, 6)
+    other_board.move_piece(0, 6, 2, 6)
+    other_board.move_piece(1, 0, 1, 2)
+    other_board.move_piece(0, 1, 2, 1)
+    assert my_board.key == other_board.key
+    assert my_board.turn == "O"
+    # Whose turn it is is part of the key.
+    my_board.make_move(encode_move(DIM + 7, 2 * DIM + 7))
+    assert my_board.turn == "X"
+    my_board.unmake_move()
+    assert my_board.key == other_board.key
+    assert my_board.key != start_key
+
+def test_legal_moves_cache():
+    my_cache = PositionCache(16)
+    my_board = Board(cache=my_cache)
+    assert my_board.legal_moves("X") == tuple(my_board.generate_moves("X"))
+    assert my_board.legal_moves("X") == tuple(my_board.generate_moves("X"))
+    assert my_cache.hits == 1
+    assert my_cache.misses == 1
+
+def test_is_connected():
+    my_board = Board()
+    assert my_board.is_connected("X") == False
+    assert my_board.is_connected("O") == False
+    for i in range(1, 7):
+        my_board.move_piece(0, i, 6, i)
+    assert my_board.is_connected("X") == True
+    # Diagonal neighbours count as connected, but pieces don't connect across the edge of the board.
+    for i in range(DIM):
+        for j in range(DIM):
+            my_board.grid[i][j] = ""
+    my_board.grid[2][7] = "X"
+    my_board.grid[3][0] = "X"
+    assert my_board.is_connected("X") == False
+    my_board.grid[3][0] = ""
+    my_board.grid[3][6] = "X"
+    assert my_board.is_connected("X") == True
+    assert my_board.is_connected("O") == False
+
+def test_shape():
+    my_board = Board()
+    # Each color starts as two separate groups, centred on the middle of the board.
+    assert my_board.euler_number("X") == 2
+    assert my_board.euler_number("O") == 2
+    assert my_board.centre_of_mass("X") == (3.5, 3.5)
+    moves = my_board.generate_moves("X")
+    my_board.make_move(moves[0])
+    my_board.make_move(my_board.generate_moves("O")[-1])
+    my_board.check_shape()
+    my_board.unmake_move()
+    my_board.unmake_move()
+    my_board.check_shape()
+    assert my_board.shape("X") == Board().shape("X")
+    for i in range(DIM):
+        for j in range(DIM):
+            my_board.grid[i][j] = ""
+    # A ring of pieces is one group with one hole.
+    for row, col in [(0, 0), (0, 1), (0, 2), (1, 0), (1, 2), (2, 0), (2, 1), (2, 2)]:
+        my_board.grid[row][col] = "X"
+    assert my_board.euler_number("X") == 0
+    assert my_board.centre_of_mass("X") == (1.0, 1.0)
+    assert my_board.concentration("X") == 1.5
+    my_board.grid[1][1] = "X"
+    assert my_board.euler_number("X") == 1
+    my_board.check_shape()
+
+def test_copy_and_serialize():
+    my_board = Board()
+    my_board.make_move(my_board.generate_moves("X")[3])
+    copied = my_board.copy()
+    assert copied.state() == my_board.state()
+    assert copied.key == my_board.key
+    assert copied.grid == my_board.grid
+    # The copy is separate from the original.
+    copied.make_move(copied.generate_moves("O")[0])
+    assert copied.state() != my_board.state()
+    copied.unmake_move()
+    assert copied.state() == my_board.state()
+    assert len(my_board.to_bytes()) == 17
+    assert Board.from_bytes(my_board.to_bytes()).state() == my_board.state()
+    assert pickle.loads(pickle.dumps(my_board)).key == my_board.key
+
+def test_fen():
+    assert Board().to_fen() == "1XXXXXX1/O6O/O6O/O6O/O6O/O6O/O6O/1XXXXXX1 X"
+    my_board = Board()
+    my_board.make_move(encode_move(1, 17))
+    assert my_board.to_fen() == "2XXXXX1/O6O/OX5O/O6O/O6O/O6O/O6O/1XXXXXX1 O"
+    assert Board.from_fen(my_board.to_fen()).state() == my_board.state()
+    for text in ("", "1XXXXXX1/O6O X", "9/O6O/O6O/O6O/O6O/O6O/O6O/1XXXXXX1 X",
+                 "1XXXXXX1/O6O/O6O/O6O/O6O/O6O/O6O/1XXXXXX1 Z"):
+        with pytest.raises(ValueError):
+            Board.from_fen(text)
+
+
+def test_board_sizes():
+    for size in (4, 6, 9, 12, 16):
+        my_board = Board(size=size)
+        assert my_board.size == size
+        assert len(my_board.grid) == size and len(my_board.grid[0]) == size
+        assert my_board.grid[0][1] == "X" and my_board.grid[size - 1][size - 2] == "X"
+        assert my_board.grid[1][0] == "O" and my_board.grid[size - 2][size - 1] == "O"
+        assert my_board.grid[0][0] == "" and my_board.count_total("X") == 2 * (size - 2)
+        assert my_board.count_pieces(0, 1)["row_count"] == size - 2
+        my_board.check_shape()
+    my_board = Board(size=12)
+    assert my_board.to_fen() == "1XXXXXXXXXX1/" + "O10O/" * 10 + "1XXXXXXXXXX1 X"
+    moves = my_board.generate_moves("X")
+    # Squares on a 12x12 board need 8 bits, so moves are packed 8 bits apart.
+    assert encode_move(1, 25, 12) in moves and my_board.tables.move_shift == 8
+    for move in moves:
+        my_board.make_move(move)
+        my_board.check_shape()
+        assert Board.from_fen(my_board.to_fen()).state() == my_board.state()
+        assert Board.from_bytes(my_board.to_bytes(), size=12).key == my_board.key
+        assert pickle.loads(pickle.dumps(my_board)).to_fen() == my_board.to_fen()
+        my_board.unmake_move()
+    assert my_board.state() == Board(size=12).state()
+    assert Board(size=8).state() == Board().state()
+    with pytest.raises(ValueError):
+        Board(size=3)
+    with pytest.raises(ValueError):
+        Board.from_state((1 << 64, 0, "X"))
@@ -0,0 +1,61 @@
+__author__ = "Ellen Whalen"
+"""Tests for the book module."""
+
+import pytest
+from board import Board, encode_move
+from book import BookBuilder, OpeningBook
+from engine import Engine
+from records import GameRecord
+
+def test_build_and_lookup(tmp_path):
+    path = str(tmp_path / "openings.book")
+    first = Board().generate_moves("X")[0]
+    second = Board().generate_moves("X")[1]
+    builder = BookBuilder(max_moves=2)
+    builder.add_record(GameRecord([first], "X"))
+    builder.add_record(GameRecord([first], "draw"))
+    builder.add_record(GameRecord([second], "O"))
+    # Unfinished games aren't added.
+    builder.add_record(GameRecord([second], None))
+    assert builder.write(path) == 2
+    with OpeningBook(path) as book:
+        assert len(book) == 2
+        assert sorted(book.lookup(Board().key)) == sorted([(first, 2, 3), (second, 1, 0)])
+        assert book.lookup(12345) == []
+        assert book.choose(Board()) == first
+        # After the book's one move, white's position isn't in it.
+        my_board = Board()
+        my_board.make_move(first)
+        assert book.choose(my_board) == 0
+        assert book.hits == 1
+        assert book.misses == 1
+
+def test_min_games(tmp_path):
+    path = str(tmp_path / "openings.book")
+    builder = BookBuilder()
+    move = Board().generate_moves("X")[0]
+    builder.add_analysis(Board(), move, weight=1)
+    assert builder.write(path, min_games=2) == 0
+    with OpeningBook(path) as book:
+        assert book.choose(Board()) == 0
+
+def test_engine_uses_book(tmp_path):
+    path = str(tmp_path / "openings.book")
+    move = Board().generate_moves("X")[5]
+    builder = BookBuilder()
+    builder.add_analysis(Board(), move)
+    # A move that isn't legal is never played, even if it's in the book.
+    builder.add(Board().key, encode_move(0, 1), 100, 200)
+    builder.write(path)
+    with OpeningBook(path) as book:
+        result = Engine(book=book).search(Board(), max_depth=3)
+        assert result.from_book
+        assert result.move == move
+        # Restricting the root moves skips the book.
+        assert not Engine(book=book).search(Board(), max_depth=1, root_moves=[move]).from_book
+
+def test_not_a_book(tmp_path):
+    path = tmp_path / "not.book"
+    path.write_bytes(b"hello, world")
+    with pytest.raises(ValueError):
+        OpeningBook(str(path))
@@ -0,0 +1,26 @@
+__author__ = "Ellen Whalen"
+"""Tests for the PositionCache class."""
+
+import pytest
+from cache import PositionCache
+
+def test_get_put():
+    my_cache = PositionCache(2)
+    assert my_cache.get(1) is None
+    my_cache.put(1, "a")
+    my_cache.put(2, "b")
+    assert my_cache.get(1) == "a"
+    # 2 is now the least recently used entry, so it's the one thrown out.
+    my_cache.put(3, "c")
+    assert 2 not in my_cache
+    assert my_cache.get(1) == "a"
+    assert my_cache.get(3) == "c"
+    assert my_cache.stats() == {"capacity": 2,
+                                "size": 2,
+                                "hits": 3,
+                                "misses": 1,
+                                "evictions": 1,
+                                "hit_rate": 0.75}
+    with pytest.raises(ValueError) as excinfo:
+        PositionCache(0)
+    assert str(excinfo.value) == "A PositionCache needs room for at least one entry."
@@ -0,0 +1,74 @@
+__author__ = "Ellen Whalen"
+"""Tests for the engine module."""
+
+from board import Board, DIM, encode_move
+import engine
+
+def empty_board() -> Board:
+    my_board = Board()
+    for i in range(DIM):
+        for j in range(DIM):
+            my_board.grid[i][j] = ""
+    return my_board
+
+def test_search():
+    my_board = Board()
+    key = my_board.key
+    result = engine.search(my_board, max_depth=3)
+    assert result.depth == 3
+    assert result.move in my_board.generate_moves("X")
+    assert result.nodes > 0
+    # Searching doesn't change the board.
+    assert my_board.key == key
+    assert my_board.turn == "X"
+
+def test_search_finds_win():
+    my_board = empty_board()
+    for row, col in [(6, 4), (7, 7), (4, 4)]:
+        my_board.grid[row][col] = "X"
+    for row, col in [(5, 1), (4, 2), (2, 7)]:
+        my_board.grid[row][col] = "O"
+    result = engine.search(my_board, "X", max_depth=4)
+    # Moving (7, 7) to (5, 5) joins up all three black pieces, and white can't undo that in one move.
+    assert result.move == encode_move(7 * DIM + 7, 5 * DIM + 5)
+    assert result.score > engine.WIN_THRESHOLD
+
+def test_search_budget():
+    my_board = Board()
+    result = engine.search(my_board, node_limit=2000)
+    # The first ply is always finished, and after that the search stops soon after the node limit.
+    assert result.depth >= 1
+    assert result.nodes < 2000 + 1024 + 36
+    # With no limits at all, search() still stops, after engine.DEFAULT_TIME_LIMIT seconds.
+    assert engine.default_budget(None, None, None) == (engine.MAX_DEPTH, engine.DEFAULT_TIME_LIMIT)
+    assert engine.default_budget(None, None, 500) == (engine.MAX_DEPTH, None)
+    assert engine.default_budget(3, None, None) == (3, None)
+
+def test_transposition_table():
+    table = engine.TranspositionTable(4)
+    table.store(5, 3, engine.EXACT, 10, 77)
+    assert table.probe(5) == (3, engine.EXACT, 10, 77)
+    assert table.probe(5 + 16) is None
+    # A shallower result for a different position in the same slot doesn't replace a deeper one.
+    table.store(5 + 16, 1, engine.EXACT, 0, 1)
+    assert table.probe(5) == (3, engine.EXACT, 10, 77)
+
+def test_evaluate():
+    my_board = Board()
+    # The start is the same for both colors.
+    assert engine.evaluate(my_board, "X") == 0
+    assert engine.evaluate(my_board, "O") == 0
+    # Joining up black's two groups is good for black.
+    for i in range(1, 7):
+        my_board.move_piece(0, i, 6, i)
+    assert engine.disconnection(my_board, "X") < engine.disconnection(Board(), "X")
+    assert engine.evaluate(my_board, "X") > 0
+    assert engine.evaluate(my_board, "O") == -engine.evaluate(my_board, "X")
+
+def test_search_board_sizes():
+    for size in (6, 10):
+        my_board = Board(size=size)
+        key = my_board.key
+        result = engine.search(my_board, max_depth=2)
+        assert result.move in my_board.generate_moves("X")
+        assert my_board.key == key
@@ -0,0 +1,101 @@
+__author__ = "Ellen Whalen"
+"""Tests for the game class."""
+
+import sys
+import pytest
+from board import Board, DIM
+from game import Game, X_WINS, DRAW
+
+def test_import_has_no_graphics():
+    # Importing the front-end shouldn't import graphics or open a window.
+    import lines_of_action
+    my_game = lines_of_action.LinesOfAction()
+    assert my_game.board.grid[0][1] == "X"
+    assert "graphics" not in sys.modules
+
+def test_play_move():
+    my_game = Game()
+    assert my_game.turn == "X"
+    my_game.play_move(0, 1, 2, 3)
+    assert my_game.turn == "O"
+    assert my_game.board.grid[2][3] == "X"
+    with pytest.raises(ValueError) as excinfo:
+        # It's white's turn now.
+        my_game.play_move(0, 2, 2, 2)
+    assert str(excinfo.value) == "That isn't a legal move."
+    with pytest.raises(ValueError) as excinfo:
+        my_game.play_move(1, 0, 5, 0)
+    assert str(excinfo.value) == "That isn't a legal move."
+    my_game.play_move(1, 0, 1, 2)
+    assert my_game.turn == "X"
+    assert my_game.history == [1 << 6 | 19, 8 << 6 | 10]
+
+def test_turn_from_board():
+    # A game picked up part way through starts with whoever's turn the board says it is.
+    my_game = Game()
+    my_game.play_move(0, 1, 2, 3)
+    other_game = Game(Board.from_state(my_game.board.state()))
+    assert other_game.turn == "O"
+    assert other_game.legal_moves() == my_game.legal_moves()
+    other_game.play_move(1, 0, 1, 2)
+    assert other_game.turn == "X"
+    assert other_game.board.turn == "X"
+
+def nearly_won_game() -> Game:
+    # Black has a row of pieces along the bottom and one more piece that can join them, and white has two pieces
+    # that can join up with each other.
+    my_game = Game()
+    for i in range(DIM):
+        for j in range(DIM):
+            my_game.board.grid[i][j] = ""
+    for j in range(1, 7):
+        my_game.board.grid[7][j] = "X"
+    my_game.board.grid[4][3] = "X"
+    my_game.board.grid[0][0] = "O"
+    my_game.board.grid[1][2] = "O"
+    return my_game
+
+def test_wins_checked_after_rounds():
+    my_game = nearly_won_game()
+    # Black connects, but the round isn't over until white has moved.
+    my_game.play_move(4, 3, 6, 3)
+    assert my_game.board.is_connected("X")
+    assert not my_game.is_over
+    my_game.play_move(1, 2, 1, 3)
+    assert my_game.result == X_WINS
+    with pytest.raises(ValueError) as excinfo:
+        my_game.play_move(7, 1, 6, 1)
+    assert str(excinfo.value) == "The game is already over."
+
+def test_draw():
+    my_game = nearly_won_game()
+    my_game.play_move(4, 3, 6, 3)
+    # White joins up too, so both colors are connected at the end of the round.
+    my_game.play_move(1, 2, 1, 1)
+    assert my_game.result == DRAW
+
+def test_move_map():
+    my_game = Game()
+    move_map = my_game.move_map()
+    assert len(move_map) == 12
+    assert move_map[(0, 6)] == {(0, 0), (2, 6), (2, 4)}
+    assert sum(len(moves) for moves in move_map.values()) == 36
+    # The map is worked out once per turn.
+    assert my_game.move_map() is move_map
+    my_game.play_move(0, 6, 2, 4)
+    assert (1, 0) in my_game.move_map()
+    assert (0, 1) not in my_game.move_map()
+
+def test_board_sizes():
+    # A game on a smaller board plays to the end just the same, recording moves packed for its size.
+    my_game = Game(size=6)
+    assert my_game.board.size == 6
+    while not my_game.is_over and len(my_game.history) < 200:
+        my_game.play(my_game.legal_moves()[0])
+    for move in my_game.history:
+        origin, destination = move >> 6, move & 63
+        assert origin < 36 and destination < 36
+    my_game = Game(size=10)
+    my_game.play_move(0, 1, 2, 1)
+    assert my_game.history == [(0 * 10 + 1) << 7 | 2 * 10 + 1]
+    assert my_game.move_map()[(1, 0)] == {(0, 1), (1, 2), (9, 0)}
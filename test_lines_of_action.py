@@ -1,6 +1,8 @@
 __author__ = "Ellen Whalen"
 """Tests for the lines_of_action class."""
 
+import sys
+import types
 from lines_of_action import LinesOfAction
 import pytest
 
@@ -59,3 +61,66 @@ def test_check_board():
     assert wins["x_win"] == True
     assert wins["o_win"] == False
 
+
+def test_no_move_map_on_computer_turn():
+    # The computer's search changes the board, so no move map may be worked out in the background during its turn.
+    my_game = LinesOfAction(computer_color="X")
+    my_game._prepare_turn()
+    assert my_game._move_map_future is None
+    my_game = LinesOfAction(computer_color="O")
+    my_game._prepare_turn()
+    assert my_game._move_map_future.result() == my_game.game.move_map()
+
+class _Shape:
+    """Stands in for a graphics shape, remembering what's been done to it."""
+    created = 0
+
+    def __init__(self, *args, **kwargs):
+        _Shape.created += 1
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args):
+            self.calls.append((name,) + args)
+        return call
+
+def _stub_graphics():
+    """A graphics module that draws nothing, so the front-end can be tested without a window."""
+    stub = types.ModuleType("graphics")
+    for name in ("GraphWin", "Point", "Rectangle", "Circle", "Line"):
+        setattr(stub, name, type(name, (_Shape,), {}))
+    return stub
+
+def test_redraw_only_changed_squares(monkeypatch):
+    monkeypatch.setitem(sys.modules, "graphics", _stub_graphics())
+    my_game = LinesOfAction()
+    my_game.draw_board()
+    circles = [circle for row in my_game._pieces for circle in row]
+    squares = [square for row in my_game._squares for square in row]
+    # Only the 24 pieces at the start are drawn.
+    assert sum(("draw", my_game.win) in circle.calls for circle in circles) == 24
+    created = _Shape.created
+    for move_number in range(6):
+        for shape in circles + squares:
+            shape.calls.clear()
+        before = my_game.board.copy()
+        move = my_game.game.legal_moves()[0]
+        my_game.game.play(move)
+        my_game.show_move()
+        changed = {(row, col) for row in range(8) for col in range(8)
+                   if before.grid[row][col] != my_game.board.grid[row][col]}
+        touched = {(row, col) for row in range(8) for col in range(8) if my_game._pieces[row][col].calls}
+        assert touched == changed
+        assert not any(square.calls for square in squares)
+    # Moving pieces recolours, draws and undraws the shapes there already, without making new ones.
+    assert _Shape.created == created
+    # Selecting and deselecting a piece only recolours the squares involved, and only when their colour changes.
+    moves = [(2, 1), (3, 1)]
+    my_game.select_piece(1, 1, moves)
+    assert [square for square in squares if square.calls] == \
+           [my_game._squares[1][1], my_game._squares[2][1], my_game._squares[3][1]]
+    my_game.select_piece(1, 1, moves)
+    assert all(len(square.calls) <= 1 for square in squares)
+    my_game.deselect_piece(1, 1, moves)
+    assert my_game._squares[1][1].calls[-1] == ("setFill", "mediumseagreen")
+    assert _Shape.created == created
@@ -0,0 +1,37 @@
+__author__ = "Ellen Whalen"
+"""Tests for the mcts module."""
+
+from board import Board
+import mcts
+
+def test_round_result():
+    my_board = Board()
+    assert mcts.round_result(my_board) is None
+    for i in range(1, 7):
+        my_board.move_piece(0, i, 6, i)
+    assert mcts.round_result(my_board) == mcts.X_WIN
+
+def test_playout():
+    my_board = Board()
+    key = my_board.key
+    player = mcts.MCTSPlayer(seed=3)
+    assert player.playout(my_board, "X") in (mcts.X_WIN, mcts.DRAW, mcts.O_WIN)
+    assert my_board.key == key
+
+def test_search_and_tree_reuse():
+    my_board = Board()
+    key = my_board.key
+    player = mcts.MCTSPlayer(batch_size=2, max_playout_length=40, seed=3)
+    result = player.search(my_board, playout_limit=120)
+    assert result.playouts >= 120
+    assert result.move in my_board.generate_moves("X")
+    assert my_board.key == key
+    # Play into a part of the tree that has already been searched, and check it's reused.
+    child = max(player.root.children, key=lambda node: node.visits)
+    grandchild = child.children[0]
+    my_board.make_move(child.move)
+    my_board.make_move(grandchild.move)
+    visits = grandchild.visits
+    player.search(my_board, playout_limit=10)
+    assert player.root is grandchild
+    assert player.root.visits >= visits + 10
@@ -0,0 +1,23 @@
+__author__ = "Ellen Whalen"
+"""Tests for the parallel module."""
+
+from board import Board
+import engine
+import parallel
+
+def test_split_moves():
+    assert parallel.split_moves([1, 2, 3, 4, 5], 2) == [[1, 3, 5], [2, 4]]
+    assert parallel.split_moves([1, 2], 4) == [[1], [2]]
+
+def test_parallel_search():
+    my_board = Board()
+    result = parallel.parallel_search(my_board, max_depth=2, workers=2)
+    # Splitting the root moves up doesn't change the best score at a fixed depth.
+    assert result.depth == 2
+    assert result.score == engine.search(my_board, max_depth=2).score
+    assert result.move in my_board.generate_moves("X")
+
+def test_parallel_search_sizes():
+    my_board = Board(size=10)
+    result = parallel.parallel_search(my_board, max_depth=1, workers=2)
+    assert result.move in my_board.generate_moves("X")
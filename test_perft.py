@@ -0,0 +1,23 @@
+__author__ = "Ellen Whalen"
+"""Tests for the perft module, which check move generation against known move counts."""
+
+from board import Board
+import perft
+
+def test_stored_positions():
+    for name, depth, expected, counted, seconds in perft.check_stored_positions(3):
+        assert counted == expected, name + " at depth " + str(depth)
+
+def test_divide():
+    my_board = Board()
+    counts = perft.divide(my_board, "X", 2)
+    assert len(counts) == 36
+    assert sum(counts.values()) == 1244
+    assert counts["g8-e6"] == 37
+
+def test_perft_passes():
+    # White's only piece is hemmed in by black pieces, so it passes and black moves again.
+    my_board = Board.from_state((1 << 1 | 1 << 8 | 1 << 9, 1, "O"))
+    assert my_board.generate_moves("O") == []
+    assert perft.perft(my_board, "O", 1) == 1
+    assert perft.perft(my_board, "O", 2) == perft.perft(my_board, "X", 1)
@@ -0,0 +1,36 @@
+__author__ = "Ellen Whalen"
+"""Tests for the ponder module."""
+
+import time
+from board import Board
+from engine import TranspositionTable, order_root_moves
+from ponder import Ponderer
+
+def test_ponder_hit():
+    my_board = Board()
+    ponderer = Ponderer(TranspositionTable(16), time_per_move=0.05, max_depth=2)
+    ponderer.start(my_board, "X")
+    assert ponderer.is_running
+    # Give it time to ponder a reply to the move it thinks is most likely.
+    time.sleep(0.5)
+    my_board.make_move(order_root_moves(my_board, "X")[0])
+    result = ponderer.take(my_board.key)
+    assert not ponderer.is_running
+    assert result is not None
+    assert result.move in my_board.generate_moves("O")
+    assert ponderer.hits == 1
+    assert ponderer.nodes > 0
+
+def test_ponder_miss():
+    my_board = Board()
+    key = my_board.key
+    ponderer = Ponderer(TranspositionTable(16), time_per_move=0.05, max_depth=2)
+    ponderer.start(my_board, "X")
+    # Pondering works on its own copy of the board.
+    assert my_board.key == key
+    assert ponderer.take(12345) is None
+    assert ponderer.misses == 1
+    assert ponderer.hit_rate() == 0.0
+    # Nothing has been pondered since, so this isn't a miss.
+    assert ponderer.take(12345) is None
+    assert ponderer.misses == 1
@@ -0,0 +1,107 @@
+__author__ = "Ellen Whalen"
+"""Tests for the profiling module."""
+
+import csv
+import json
+import sys
+import threading
+import time
+from board import Board
+from engine import Engine
+from game import Game
+import profiling
+
+def test_counters():
+    original = Board.__dict__["find_moves"]
+    profiling.reset()
+    profiling.enable()
+    try:
+        assert profiling.is_enabled()
+        my_board = Board()
+        my_board.find_moves(0, 1)
+        my_board.find_moves(1, 0)
+        my_board.count_pieces(0, 1)
+        visited = []
+        Game(my_board).dfs((0, 1), visited)
+        result = Engine().search(my_board, max_depth=2)
+    finally:
+        profiling.disable()
+    # Once disabled, the original methods are back, so the counters cost nothing.
+    assert not profiling.is_enabled()
+    assert Board.__dict__["find_moves"] is original
+    rows = profiling.snapshot()
+    assert rows["Board.find_moves"]["calls"] == 2
+    assert rows["Board.count_pieces"]["calls"] == 1
+    # Every call of a recursive method is counted: dfs is called on the first piece, then once from each side of the
+    # five joins between the six pieces along the top. Each search node is one call of _negamax.
+    assert rows["Game.dfs"]["calls"] == 1 + 2 * 5
+    assert rows["Engine._negamax"]["calls"] == result.nodes
+    assert rows["Engine.search"]["calls"] == 1
+    assert rows["Engine.search"]["seconds"] >= rows["Engine._negamax"]["seconds"] > 0
+    Board().find_moves(0, 1)
+    assert profiling.snapshot()["Board.find_moves"]["calls"] == 2
+    profiling.reset()
+    assert profiling.snapshot()["Board.find_moves"]["calls"] == 0
+
+class _Slow:
+    def wait(self, barrier: threading.Barrier):
+        barrier.wait()
+        time.sleep(0.1)
+
+    def tick(self):
+        pass
+
+def test_counters_threads():
+    # Calls running in two threads at once are both timed.
+    profiling.reset()
+    profiling.enable((("test_profiling", "_Slow", "wait"),))
+    try:
+        barrier = threading.Barrier(2)
+        threads = [threading.Thread(target=_Slow().wait, args=(barrier,)) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        profiling.disable()
+    row = profiling.snapshot()["_Slow.wait"]
+    assert row["calls"] == 2
+    assert row["seconds"] >= 0.19
+    # No calls are lost when several threads add to the same totals.
+    profiling.enable((("test_profiling", "_Slow", "tick"),))
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=lambda: [_Slow().tick() for i in range(20000)]) for j in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+        profiling.disable()
+    assert profiling.snapshot()["_Slow.tick"]["calls"] == 80000
+
+def test_dumps(tmp_path):
+    profiling.reset()
+    profiling.enable([("board", "Board", "generate_moves")])
+    try:
+        Board().generate_moves("X")
+    finally:
+        profiling.disable()
+    profiling.dump_json(tmp_path / "profile.json")
+    assert json.loads((tmp_path / "profile.json").read_text())["Board.generate_moves"]["calls"] == 1
+    profiling.dump_csv(tmp_path / "profile.csv")
+    with open(tmp_path / "profile.csv") as file:
+        rows = {row["name"]: row for row in csv.DictReader(file)}
+    assert rows["Board.generate_moves"]["calls"] == "1"
+
+def test_run_profiled(tmp_path):
+    def work():
+        return Engine().search(Board(), max_depth=2).move
+
+    for mode, name in (("counters", "counters.csv"), ("cprofile", "run.prof"), ("sampling", "samples.json")):
+        assert profiling.run_profiled(work, mode, str(tmp_path / name)) == work()
+        assert (tmp_path / name).stat().st_size > 0
+    assert not profiling.is_enabled()
+    assert json.loads((tmp_path / "samples.json").read_text())["samples"] >= 0
@@ -0,0 +1,49 @@
+__author__ = "Ellen Whalen"
+"""Tests for the records module."""
+
+import random
+from board import Board, encode_move
+from game import Game
+import records
+
+def random_game(seed: int) -> Game:
+    generator = random.Random(seed)
+    my_game = Game()
+    while not my_game.is_over and len(my_game.history) < 300:
+        my_game.play(generator.choice(my_game.legal_moves()))
+    return my_game
+
+def test_record_bytes():
+    my_game = random_game(0)
+    record = records.GameRecord.from_game(my_game, {"black": "random", "white": "random"})
+    data = record.to_bytes()
+    # Two bytes per move, plus the header and metadata.
+    assert len(data) == records.GAME_HEADER.size + len(b'{"black":"random","white":"random"}') + 2 * len(record)
+    assert records.read_record(data, 0) == (record, len(data))
+    # The last position replayed is the one the game ended on.
+    assert record.final_board().state() == my_game.board.state()
+
+def test_notation():
+    record = records.GameRecord([encode_move(1, 17), encode_move(8, 10)], "draw")
+    assert record.notation() == "b8-b6 a7-c7 draw"
+    assert records.parse_notation(record.notation()) == record
+
+def test_write_and_read(tmp_path):
+    path = str(tmp_path / "games.loa")
+    games = [random_game(seed) for seed in range(5)]
+    start = Board()
+    start.make_move(start.generate_moves("X")[0])
+    with records.GameWriter(path) as writer:
+        for my_game in games[:3]:
+            writer.write_game(my_game, {"seed": 1})
+    # A second writer appends to the same archive.
+    with records.GameWriter(path) as writer:
+        writer.write_game(games[3])
+        writer.write(records.GameRecord([], None, None, start.state()))
+    for use_mmap in (True, False):
+        read = list(records.read_games(path, use_mmap))
+        assert [record.moves for record in read[:4]] == [my_game.history for my_game in games[:4]]
+        assert [record.result for record in read[:4]] == [my_game.result for my_game in games[:4]]
+        assert read[0].metadata == {"seed": 1}
+        assert read[4].start == start.state()
+        assert read[4].final_board().state() == start.state()
@@ -0,0 +1,102 @@
+__author__ = "Ellen Whalen"
+"""Tests for the server and loadtest modules."""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import loadtest
+import server
+
+def run_with_server(test):
+    """Starts a server on a free port, runs test(server, connection) against it, and returns what it returned."""
+    async def run():
+        with ThreadPoolExecutor(2) as executor:
+            game_server = server.GameServer(executor)
+            await game_server.start("127.0.0.1", 0)
+            host, port = game_server.address[:2]
+            connection = await loadtest.Connection.open(host, port)
+            try:
+                return await test(game_server, connection)
+            finally:
+                await connection.close()
+                await game_server.close()
+    return asyncio.run(run())
+
+def test_human_against_engine():
+    async def test(game_server, connection):
+        state = await connection.request("new", black="human", white="random", seed=3)
+        assert state["turn"] == "X"
+        assert state["moves"] == []
+        assert "b8-b6" in state["legal"]
+        state = await connection.request("move", game=state["game"], move="b8-b6")
+        # The human's move and the engine's reply.
+        assert state["moves"][0] == "b8-b6"
+        assert len(state["moves"]) == 2
+        assert state["turn"] == "X"
+        assert (await connection.request("state", game=state["game"]))["fen"] == state["fen"]
+        try:
+            await connection.request("move", game=state["game"], move="a1-a1")
+            assert False
+        except ValueError as error:
+            assert "legal" in str(error)
+        await connection.request("close", game=state["game"])
+        assert game_server.games == {}
+    run_with_server(test)
+
+def test_engine_against_engine():
+    async def test(game_server, connection):
+        state = await connection.request("new", black="greedy", white="random", size=6, seed=1)
+        assert state["size"] == 6
+        assert state["result"] in ("X", "O", "draw")
+        assert "legal" not in state
+        stats = await connection.request("stats")
+        assert stats["finished"] == 1
+        assert stats["searches"] > 0
+    run_with_server(test)
+
+def test_same_seed_same_game():
+    async def test(game_server, connection):
+        games = []
+        for i in range(2):
+            state = await connection.request("new", black="random", white="mcts:playouts=20", size=6, seed=4)
+            games.append((state["moves"], state["fen"]))
+        return games
+    first, second = run_with_server(test)
+    assert first == second
+
+def test_bad_requests():
+    async def test(game_server, connection):
+        for line in (b"{not json\n", b"[1, 2]\n", b'{"op": "fly"}\n', b'{"op": "state", "game": 99}\n',
+                     b'{"op": "new", "black": "genius"}\n', b'{"op": "move"}\n',
+                     b'{"op": "new", "black": 5}\n', b'{"op": "new", "size": [8]}\n'):
+            reply = await game_server.handle_line(line)
+            assert not reply["ok"]
+            assert reply["error"]
+        state = await connection.request("new")
+        reply = await game_server.handle({"id": 7, "op": "move", "game": state["game"], "move": 5})
+        assert reply == {"id": 7, "ok": False, "error": "\"move\" has to be a string."}
+        await connection.request("close", game=state["game"])
+        # A game whose engine fails to move isn't kept.
+        reply = await game_server.handle({"op": "new", "black": "engine:book=/no/such/book"})
+        assert not reply["ok"]
+        assert game_server.games == {}
+        # The connection still works after a bad request.
+        assert (await connection.request("stats"))["games"] == 0
+    run_with_server(test)
+
+def test_percentile():
+    values = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+    assert loadtest.percentile(values, 0.5) == 5
+    assert loadtest.percentile(values, 0.9) == 9
+    assert loadtest.percentile(values, 1.0) == 10
+    assert loadtest.percentile([], 0.5) == 0.0
+
+def test_run_load_test():
+    async def test(game_server, connection):
+        host, port = game_server.address[:2]
+        return await loadtest.run_load_test(6, 3, white="random", size=6, host=host, port=port)
+    summary = run_with_server(test)
+    assert summary["games"] == 6
+    assert summary["moves"] > 0
+    assert summary["latency_ms"]["new"]["requests"] == 6
+    assert summary["latency_ms"]["close"]["requests"] == 6
+    assert summary["latency_ms"]["all"]["p50"] <= summary["latency_ms"]["all"]["p99"]
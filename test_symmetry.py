@@ -0,0 +1,76 @@
+__author__ = "Ellen Whalen"
+"""Tests for the symmetry module."""
+
+import pytest
+import random
+from board import Board, DIM, encode_move
+from bench import random_positions
+from book import BookBuilder, OpeningBook
+from records import GameRecord
+import symmetry
+
+def test_transform_bits():
+    generator = random.Random(0)
+    for i in range(100):
+        bits = generator.getrandbits(DIM * DIM)
+        for transform in symmetry.TRANSFORMS:
+            transformed = symmetry.transform_bits(bits, transform)
+            assert transformed.bit_count() == bits.bit_count()
+            assert symmetry.transform_bits(transformed, symmetry.inverse(transform)) == bits
+    # [0][1] mirrored across the columns is [0][6], and transposed is [1][0].
+    assert symmetry.transform_square(1, symmetry.MIRROR_COLS) == 6
+    assert symmetry.transform_square(1, symmetry.TRANSPOSE) == DIM
+
+def test_transforms_keep_the_rules():
+    for state in random_positions(50):
+        my_board = Board.from_state(state)
+        for transform in symmetry.TRANSFORMS:
+            other_board = Board.from_state(symmetry.transform_state(state, transform))
+            for color in ("X", "O"):
+                assert sorted(other_board.generate_moves(color)) == \
+                       sorted(symmetry.transform_moves(my_board.generate_moves(color), transform))
+                assert other_board.is_connected(color) == my_board.is_connected(color)
+
+def test_canonical_state():
+    state = random_positions(1, seed=5)[0]
+    canonical, transform, swapped = symmetry.canonical_state(state)
+    assert symmetry.transform_state(state, transform) == canonical
+    assert not swapped
+    for other in symmetry.TRANSFORMS:
+        other_board = Board.from_state(symmetry.transform_state(state, other))
+        assert symmetry.canonical_state(other_board.state())[0] == canonical
+        assert symmetry.canonical_key(other_board) == symmetry.canonical_key(Board.from_state(state))
+    # The start looks the same after half of the transforms, so mirror-image opening moves are one canonical move.
+    start = Board().state()
+    assert len(symmetry.canonical_transforms(start)) == 4
+    first = encode_move(1, 17)
+    assert symmetry.canonical_move(start, first) == \
+           symmetry.canonical_move(start, symmetry.transform_move(first, symmetry.MIRROR_COLS))
+    # Swapping the colors is only done when asked.
+    assert symmetry.canonical_state(start, with_colors=True)[0][2] in ("X", "O")
+    # Other sizes of board don't have these symmetries.
+    with pytest.raises(ValueError):
+        symmetry.canonical_key(Board(size=6))
+    with pytest.raises(ValueError):
+        symmetry.canonical_state(Board(size=10).state())
+
+def test_measure():
+    result = symmetry.measure(symmetry.search_tree_states(Board(), 1))
+    assert result["positions"] == 37
+    assert result["distinct_canonical"] < result["distinct"]
+    assert result["canonical_cache_hit_rate"] > result["cache_hit_rate"]
+
+def test_canonical_book(tmp_path):
+    path = str(tmp_path / "openings.book")
+    move = encode_move(1, 17)
+    builder = BookBuilder(canonical=True)
+    builder.add_record(GameRecord([move], "X"))
+    builder.add_record(GameRecord([symmetry.transform_move(move, symmetry.MIRROR_ROWS)], "X"))
+    builder.write(path)
+    with OpeningBook(path) as book:
+        assert book.is_canonical
+        # Both games played the same move, up to symmetry, so there's only one entry for it.
+        assert len(book) == 1
+        start = Board().state()
+        assert book.choose(Board()) in [symmetry.transform_move(move, transform) for transform in symmetry.TRANSFORMS
+                                        if symmetry.transform_state(start, transform) == start]
@@ -0,0 +1,53 @@
+__author__ = "Ellen Whalen"
+
+import pytest
+from box import Box
+from tables import DIM, LINE_TOTAL, MAX_DIM, MIN_DIM, MOVE_TABLE, NEIGHBOUR_MASKS, NEIGHBOURS, RAYS, SQUARE_COLS, \
+    SQUARE_LINES, SQUARE_ROWS, tables_for
+
+
+def test_neighbours():
+    # The table holds the same squares, in the same order, as a Box around each square (less the square itself).
+    for square in range(DIM * DIM):
+        row, col = divmod(square, DIM)
+        box = Box(row, col, DIM)
+        expected = [i * DIM + j for i in box.row_range() for j in box.col_range() if (i, j) != (row, col)]
+        assert list(NEIGHBOURS[square]) == expected
+        assert NEIGHBOUR_MASKS[square] == sum(1 << neighbour for neighbour in expected)
+        assert (SQUARE_ROWS[square], SQUARE_COLS[square]) == (row, col)
+    assert len(NEIGHBOURS[0]) == 3
+    assert len(NEIGHBOURS[1]) == 5
+    assert len(NEIGHBOURS[9]) == 8
+
+
+def test_rays():
+    # Square 0 is the top left corner: seven steps right, down and down-right, and none anywhere else.
+    assert [len(ray) for ray in RAYS[0]] == [7, 0, 7, 0, 7, 0, 0, 0]
+    assert RAYS[0][0][2] == (3, 0b110)
+    for square in range(DIM * DIM):
+        for direction, (line, ray) in enumerate(MOVE_TABLE[square]):
+            assert ray is RAYS[square][direction]
+            assert line == SQUARE_LINES[square][direction >> 1]
+            for destination, between in ray:
+                # Every square on a ray is on the same line as where it started.
+                assert SQUARE_LINES[destination][direction >> 1] == line
+    assert max(max(lines) for lines in SQUARE_LINES) == LINE_TOTAL - 1
+
+
+def test_tables_for():
+    # Each size is built once, and the module's constants are the 8x8 tables.
+    assert tables_for(DIM) is tables_for(DIM)
+    assert tables_for(DIM).move_table is MOVE_TABLE
+    assert tables_for(DIM).move_shift == 6
+    tables = tables_for(10)
+    assert tables.dim == 10 and tables.squares == 100 and tables.line_total == 58
+    assert tables.move_shift == 7 and tables.bitboard_bytes == 13
+    assert len(tables.neighbours[0]) == 3 and len(tables.neighbours[11]) == 8
+    # Bitboards wider than 64 bits work the same: the last square's rays run back up the board.
+    assert [destination for destination, between in tables.rays[99][3]][:2] == [89, 79]
+    # Every size has its own Zobrist keys, so positions on different sizes don't collide in a shared table.
+    keys = [set(tables_for(size).zobrist_x + tables_for(size).zobrist_o) for size in (6, 8, 9, 10)]
+    assert len(set.union(*keys)) == sum(len(size_keys) for size_keys in keys)
+    for size in (MIN_DIM - 1, MAX_DIM + 1):
+        with pytest.raises(ValueError):
+            tables_for(size)
@@ -0,0 +1,55 @@
+__author__ = "Ellen Whalen"
+"""Tests for the tournament module."""
+
+import json
+import pytest
+import records
+import tournament
+
+def test_parse_player():
+    assert tournament.parse_player("random") == ("random", {})
+    assert tournament.parse_player("engine:depth=3,time=0.5") == ("engine", {"depth": 3, "time": 0.5})
+    with pytest.raises(ValueError):
+        tournament.parse_player("genius")
+    with pytest.raises(ValueError):
+        tournament.parse_player("engine:speed=3")
+
+def test_play_game():
+    result = tournament.play_game("greedy", "random", seed=1)
+    assert result["result"] in ("X", "O", "draw")
+    assert result["moves"] == len(result["history"])
+    # The same seed plays the same game.
+    assert tournament.play_game("greedy", "random", seed=1)["history"] == result["history"]
+
+def test_wilson_interval():
+    low, high = tournament.wilson_interval(50, 100)
+    assert low < 0.5 < high
+    assert tournament.wilson_interval(0, 10)[0] == 0.0
+    assert tournament.wilson_interval(0, 0) == (0.0, 1.0)
+
+def test_run_tournament(tmp_path):
+    results_path = str(tmp_path / "results.jsonl")
+    record_path = str(tmp_path / "games.loa")
+    summary = tournament.run_tournament("greedy", "random", 6, workers=2, results_path=results_path,
+                                        record_path=record_path)
+    assert summary["games"] == 6
+    assert summary["first"]["wins"] + summary["second"]["wins"] + summary["draws"] == 6
+    with open(results_path) as file:
+        lines = [json.loads(line) for line in file]
+    assert len(lines) == 6
+    # Each player plays black in half of the games.
+    assert sorted(line["black"] for line in lines) == ["greedy"] * 3 + ["random"] * 3
+    assert [record.metadata["seed"] for record in records.read_games(record_path)] == [line["seed"] for line in lines]
+
+def test_summarize():
+    results = [{"black": "random", "white": "random", "result": "X", "moves": 10, "first_color": "X"},
+               {"black": "random", "white": "random", "result": "X", "moves": 20, "first_color": "O"},
+               {"black": "random", "white": "random", "result": None, "moves": 30, "first_color": "X"}]
+    summary = tournament.summarize(results, "random", "random", 2.0, 1)
+    # The same player on both sides is still told apart by which color it played.
+    assert summary["first"]["wins"] == 1
+    assert summary["second"]["wins"] == 1
+    assert summary["draws"] == 1
+    assert summary["unfinished"] == 1
+    assert summary["average_moves"] == 20
+    assert summary["games_per_second"] == 1.5
@@ -0,0 +1,226 @@
+__author__ = "Ellen Whalen"
+"""Headless self-play: plays games between two computer players on a pool of processes, streams each result to
+disk as it finishes, and reports how fast the games went and how well each player did."""
+
+import argparse
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from board import Board
+from book import OpeningBook
+from engine import Engine, order_root_moves
+from game import DRAW, Game
+from mcts import MCTSPlayer
+from records import GameRecord, GameWriter
+
+PLAYER_KINDS = ("random", "greedy", "engine", "mcts")
+
+# Opening books already mapped by this process, by path, so each worker maps each book once.
+_books = {}
+
+
+def parse_player(spec: str) -> tuple:
+    """Reads a player spec like "random", "greedy", "engine:depth=3", "engine:time=0.1" or "mcts:playouts=500" into
+    (kind, options). "engine" on its own searches to depth 2, and "mcts" on its own runs 500 playouts. An engine
+    can also take an opening book file, like "engine:depth=3,book=openings.book"."""
+    kind, _, rest = spec.partition(":")
+    if kind not in PLAYER_KINDS:
+        raise ValueError(f"\"{kind}\" isn't a kind of player; try one of {', '.join(PLAYER_KINDS)}.")
+    options = {}
+    for option in rest.split(",") if rest else []:
+        name, _, value = option.partition("=")
+        if name not in ("depth", "time", "playouts", "book"):
+            raise ValueError(f"\"{name}\" isn't a player option.")
+        if name == "book":
+            options[name] = value
+        elif name == "time":
+            options[name] = float(value)
+        else:
+            options[name] = int(value)
+    return kind, options
+
+
+class Player:
+    """Picks moves for one side of a game, as described by a player spec (see parse_player)."""
+
+    def __init__(self, spec: str, seed: int = None):
+        self._spec = spec
+        self._kind, self._options = parse_player(spec)
+        self._random = random.Random(seed)
+        self._engine = None
+        if self._kind == "engine":
+            book = None
+            if "book" in self._options:
+                path = self._options["book"]
+                if path not in _books:
+                    _books[path] = OpeningBook(path)
+                book = _books[path]
+            self._engine = Engine(book=book)
+        self._mcts = MCTSPlayer(seed=seed) if self._kind == "mcts" else None
+
+    @property
+    def spec(self):
+        return self._spec
+
+    def reseed(self, seed: int):
+        """Makes the next move's random choices depend only on seed. An engine keeps its tables, which only make
+        its searches quicker."""
+        self._random.seed(seed)
+        if self._mcts is not None:
+            self._mcts.reseed(seed)
+
+    def choose(self, game: Game) -> int:
+        """Picks a move for the color whose turn it is."""
+        return self.choose_move(game.board)
+
+    def choose_move(self, board: Board) -> int:
+        """Picks a move for the board's side to move, which is whose turn it is in the game it belongs to."""
+        if self._kind == "random":
+            return self._random.choice(board.legal_moves(board.turn))
+        if self._kind == "greedy":
+            return order_root_moves(board, board.turn)[0]
+        if self._kind == "engine":
+            if "depth" not in self._options and "time" not in self._options:
+                return self._engine.search(board, board.turn, max_depth=2).move
+            return self._engine.search(board, board.turn, self._options.get("depth", 64),
+                                       self._options.get("time")).move
+        return self._mcts.search(board, board.turn, playout_limit=self._options.get("playouts", 500)).move
+
+
+def play_game(black: str, white: str, seed: int, opening_moves: int = 2, max_moves: int = 300) -> dict:
+    """Plays one game between two player specs. The first opening_moves moves are random, seeded by seed, so that
+    games between the same players differ. A game that runs past max_moves moves is stopped and counts as a draw.
+    The win and draw rules are Game's, so a round that leaves both colors connected is a draw."""
+    start = time.perf_counter()
+    generator = random.Random(seed)
+    players = {"X": Player(black, seed), "O": Player(white, seed + 1)}
+    game = Game()
+    while not game.is_over and len(game.history) < max_moves:
+        if len(game.history) < opening_moves:
+            game.play(generator.choice(game.legal_moves()))
+        else:
+            game.play(players[game.turn].choose(game))
+    return {"seed": seed,
+            "black": black,
+            "white": white,
+            "result": game.result,
+            "moves": len(game.history),
+            "seconds": time.perf_counter() - start,
+            "history": game.history}
+
+
+def wilson_interval(successes: float, trials: int, z: float = 1.96) -> tuple:
+    """The Wilson score interval for a rate: about 95% sure to hold the true rate with the default z."""
+    if trials == 0:
+        return 0.0, 1.0
+    rate = successes / trials
+    middle = (rate + z * z / (2 * trials)) / (1 + z * z / trials)
+    half_width = z * math.sqrt(rate * (1 - rate) / trials + z * z / (4 * trials * trials)) / (1 + z * z / trials)
+    return max(0.0, middle - half_width), min(1.0, middle + half_width)
+
+
+def summarize(results: list[dict], first: str, second: str, elapsed: float, workers: int) -> dict:
+    """Works out throughput and each player's win rate from the game results. first and second are the two player
+    specs, which took turns playing black; each result's "first_color" says which color first played."""
+    games = len(results)
+    wins = {"first": 0, "second": 0}
+    draws = 0
+    unfinished = 0
+    for result in results:
+        if result["result"] is None:
+            unfinished += 1
+            draws += 1
+        elif result["result"] == DRAW:
+            draws += 1
+        else:
+            wins["first" if result["result"] == result["first_color"] else "second"] += 1
+    summary = {"games": games,
+               "seconds": elapsed,
+               "games_per_second": games / elapsed if elapsed > 0 else 0.0,
+               "games_per_second_per_worker": games / elapsed / workers if elapsed > 0 else 0.0,
+               "average_moves": sum(result["moves"] for result in results) / games if games else 0.0,
+               "draws": draws,
+               "unfinished": unfinished,
+               "draw_rate": draws / games if games else 0.0,
+               "draw_interval": wilson_interval(draws, games)}
+    for name, spec in (("first", first), ("second", second)):
+        summary[name] = {"player": spec,
+                         "wins": wins[name],
+                         "win_rate": wins[name] / games if games else 0.0,
+                         "win_interval": wilson_interval(wins[name], games),
+                         "score": (wins[name] + draws / 2) / games if games else 0.0}
+    return summary
+
+
+def run_tournament(first: str, second: str, games: int, workers: int = None, seed: int = 0,
+                   results_path: str = None, record_path: str = None, opening_moves: int = 2,
+                   max_moves: int = 300) -> dict:
+    """Plays games between two player specs on a pool of worker processes, swapping colors every game. As each game
+    finishes its result is appended to results_path as a line of JSON, and the game itself to the game archive at
+    record_path (see records). Returns the summary from summarize."""
+    workers = workers or os.cpu_count() or 1
+    results = []
+    results_file = open(results_path, "a") if results_path is not None else None
+    writer = GameWriter(record_path) if record_path is not None else None
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(workers) as executor:
+            futures = {}
+            for n in range(games):
+                black, white = (first, second) if n % 2 == 0 else (second, first)
+                future = executor.submit(play_game, black, white, seed + 2 * n, opening_moves, max_moves)
+                futures[future] = "X" if n % 2 == 0 else "O"
+            for future in as_completed(futures):
+                result = future.result()
+                result["first_color"] = futures[future]
+                history = result.pop("history")
+                results.append(result)
+                if results_file is not None:
+                    results_file.write(json.dumps(result) + "\n")
+                    results_file.flush()
+                if writer is not None:
+                    writer.write(GameRecord(history, result["result"],
+                                            {"black": result["black"], "white": result["white"],
+                                             "seed": result["seed"]}))
+    finally:
+        if results_file is not None:
+            results_file.close()
+        if writer is not None:
+            writer.close()
+    return summarize(results, first, second, time.perf_counter() - start, workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play games between two computer players without graphics.")
+    parser.add_argument("first", help="a player: random, greedy, engine:depth=N, engine:time=S or mcts:playouts=N")
+    parser.add_argument("second", help="the other player, in the same form")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--results", default=None, help="append each game's result to this file as JSON lines")
+    parser.add_argument("--record", default=None, help="append each game to this game archive")
+    parser.add_argument("--opening-moves", type=int, default=2, help="random moves at the start of every game")
+    parser.add_argument("--max-moves", type=int, default=300, help="stop a game as a draw after this many moves")
+    args = parser.parse_args()
+    for spec in (args.first, args.second):
+        parse_player(spec)
+    summary = run_tournament(args.first, args.second, args.games, args.workers, args.seed, args.results,
+                             args.record, args.opening_moves, args.max_moves)
+    print(f"{summary['games']} games in {summary['seconds']:.1f}s: {summary['games_per_second']:.2f} games/s, "
+          f"{summary['games_per_second_per_worker']:.2f} games/s per worker, "
+          f"{summary['average_moves']:.1f} moves a game")
+    for name in ("first", "second"):
+        player = summary[name]
+        low, high = player["win_interval"]
+        print(f"{player['player']:<20} wins {player['wins']:>5} ({player['win_rate']:.1%}, 95% CI {low:.1%}-{high:.1%})"
+              f", score {player['score']:.3f}")
+    low, high = summary["draw_interval"]
+    print(f"{'draws':<20}      {summary['draws']:>5} ({summary['draw_rate']:.1%}, 95% CI {low:.1%}-{high:.1%}), "
+          f"{summary['unfinished']} stopped at --max-moves")
+
+
+if __name__ == "__main__":
+    main()